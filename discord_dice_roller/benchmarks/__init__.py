@@ -0,0 +1,33 @@
+"""Benchmarks for our hot paths, to run with `python -m benchmarks.<name>` from this folder"""
+
+# Built-in
+import time
+
+
+# --------------------------------------------------------------------------------
+# > Utilities
+# --------------------------------------------------------------------------------
+def measure(func, repeat):
+    """
+    Calls the function several times and measures the average duration of a call
+    :param callable func: The function to call, without arguments
+    :param int repeat: How many times we call it
+    :return: The average duration of a call, in seconds
+    :rtype: float
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def format_duration(seconds):
+    """
+    :param float seconds: A duration in seconds
+    :return: The duration in the most readable unit
+    :rtype: str
+    """
+    for unit, factor in [("s", 1), ("ms", 1e3), ("µs", 1e6)]:
+        if seconds * factor >= 1:
+            return f"{seconds * factor:.2f}{unit}"
+    return f"{seconds * 1e9:.0f}ns"
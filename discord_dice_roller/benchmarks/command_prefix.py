@@ -0,0 +1,51 @@
+"""
+Measures the per-message cost of `get_command_prefix` for several guild counts
+Usage: python -m benchmarks.command_prefix [guild_count]*
+"""
+
+# Built-in
+import sys
+from types import SimpleNamespace
+
+# Application
+from utils.settings import get_command_prefix, set_guild_prefix
+
+# Local
+from . import format_duration, measure
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+DEFAULT_SIZES = [100, 10000, 1000000]
+REPEAT = 200000
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def run(sizes):
+    """
+    Fills the prefix index and measures the lookup for a known guild, an unknown guild, and a DM
+    :param [int] sizes: The number of guilds with a custom prefix
+    """
+    indexed_count = 0
+    for size in sorted(sizes):
+        for guild_id in range(indexed_count, size):
+            set_guild_prefix(str(guild_id), "$")
+        indexed_count = max(indexed_count, size)
+        messages = {
+            "known guild": SimpleNamespace(guild=SimpleNamespace(id=size // 2)),
+            "unknown guild": SimpleNamespace(guild=SimpleNamespace(id=-1)),
+            "DM": SimpleNamespace(guild=None),
+        }
+        for name, message in messages.items():
+            duration = measure(lambda: get_command_prefix(None, message), REPEAT)
+            print(f"{size:>10} guilds   {name:<15}{format_duration(duration)}/message")
+
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    arg_sizes = [int(arg) for arg in sys.argv[1:]]
+    run(arg_sizes or DEFAULT_SIZES)
@@ -0,0 +1,77 @@
+"""
+Compares rolling one Die object at a time with the batched dice pool
+Usage: python -m benchmarks.dice_engine [dice_count]*
+"""
+
+# Built-in
+import sys
+
+# Application
+from utils.dice_engine import DicePool, numpy, sort_values, total
+from utils.dice_roll import Die
+
+# Local
+from . import format_duration, measure
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+DEFAULT_SIZES = [1, 100, 10000]
+SIDES = 6
+MAX_GROUP_SIZE = 9999999  # Largest `N` of a `NdS` group accepted by the parser
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def roll_dice_objects(size, keep):
+    """
+    The previous engine: one Die per die, rolled and sorted as python objects
+    :param int size: Number of dice
+    :param int keep: Number of highest dice to keep
+    :return: The total of the kept dice
+    :rtype: int
+    """
+    dice = [Die(SIDES) for _ in range(size)]
+    for die in dice:
+        die.roll()
+    dice.sort(key=lambda x: x.value, reverse=True)
+    return sum([die.value for die in dice[:keep]])
+
+
+def roll_dice_pool(size, keep):
+    """
+    The batched engine, with groups capped like the parser caps them
+    :param int size: Number of dice
+    :param int keep: Number of highest dice to keep
+    :return: The total of the kept dice
+    :rtype: int
+    """
+    pool = DicePool()
+    for start in range(0, size, MAX_GROUP_SIZE):
+        pool.add(min(MAX_GROUP_SIZE, size - start), SIDES)
+    pool.roll()
+    return total(sort_values(pool.values, reverse=True)[:keep])
+
+
+def run(sizes):
+    """
+    Measures a roll with "keep high" on each engine
+    :param [int] sizes: The number of dice to roll
+    """
+    print(f"NumPy: {'available' if numpy is not None else 'not installed'}")
+    engines = {"die objects": roll_dice_objects, "dice pool": roll_dice_pool}
+    for size in sizes:
+        keep = max(1, size // 2)
+        repeat = max(10, 100000 // size)
+        for name, engine in engines.items():
+            duration = measure(lambda: engine(size, keep), repeat)
+            print(f"{size:>8} dice   {name:<14}{format_duration(duration)}/roll")
+
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    arg_sizes = [int(arg) for arg in sys.argv[1:]]
+    run(arg_sizes or DEFAULT_SIZES)
@@ -0,0 +1,112 @@
+"""
+Compares the single-pass tokenizer with the previous sequential regex parser
+Usage: python -m benchmarks.instruction_parsing
+"""
+
+# Built-in
+import re
+
+# Application
+from utils.dice_roll import (
+    CHECK_REGEX,
+    COMPLEX_ACTION_REGEX,
+    DICE_REGEX,
+    MODIFIER_REGEX,
+    SIMPLE_ACTION_REGEX,
+    parse_instruction,
+)
+
+# Local
+from . import format_duration, measure
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+REPEAT = 20000
+INPUTS = {
+    "realistic": [
+        ["1d20", "adv", "+5"],
+        ["8d6"],
+        ["4d6", "kh3"],
+        ["1d20", "-1", ">=15"],
+        ["2d8", "1d6", "crit", "+4"],
+    ],
+    "invalid": [
+        ["1d1000"],
+        ["kh1000"],
+        ["roll", "1d20"],
+        ["+0"],
+        ["=>10"],
+    ],
+    "adversarial": [
+        ["1" * 5000],
+        ["1d" + "9" * 5000],
+        ["+" + "9" * 5000],
+        [">=" + "9" * 5000],
+        ["adv" * 2000],
+    ],
+}
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def parse_instruction_sequentially(instruction):
+    """
+    The previous parser, trying each regex in turn
+    :param str instruction: The user's instruction, like "1d6" or "adv"
+    :return: The matching token, or None if the instruction is invalid
+    :rtype: tuple or None
+    """
+    match = re.fullmatch(DICE_REGEX, instruction)
+    if match is not None:
+        return "dice", int(match.group("qty")), int(match.group("sides"))
+    match = re.fullmatch(SIMPLE_ACTION_REGEX, instruction)
+    if match is not None:
+        return "action", instruction, 0
+    match = re.fullmatch(COMPLEX_ACTION_REGEX, instruction)
+    if match is not None:
+        return "action", match.group("action"), int(match.group("value"))
+    match = re.fullmatch(MODIFIER_REGEX, instruction)
+    if match is not None:
+        return "modifier", int(instruction)
+    match = re.fullmatch(CHECK_REGEX, instruction)
+    if match is not None:
+        return "check", match.group("comparator"), int(match.group("value"))
+    return None
+
+
+def parse_all(parser, instructions_list):
+    """
+    :param callable parser: Function converting an instruction into a token
+    :param [[str]] instructions_list: Several lists of instructions
+    :return: The tokens of every instruction
+    :rtype: [tuple]
+    """
+    return [
+        parser(instruction)
+        for instructions in instructions_list
+        for instruction in instructions
+    ]
+
+
+def run():
+    """Checks that both parsers agree, then measures them on each input category"""
+    parsers = {
+        "sequential": parse_instruction_sequentially,
+        "tokenizer": parse_instruction,
+    }
+    for category, instructions_list in INPUTS.items():
+        expected = parse_all(parse_instruction_sequentially, instructions_list)
+        if parse_all(parse_instruction, instructions_list) != expected:
+            raise AssertionError(f"The parsers disagree on the {category} inputs")
+        for name, parser in parsers.items():
+            duration = measure(lambda: parse_all(parser, instructions_list), REPEAT)
+            print(f"{category:<12}{name:<12}{format_duration(duration)}/batch")
+
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    run()
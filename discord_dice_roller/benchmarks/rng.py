@@ -0,0 +1,42 @@
+"""
+Measures the throughput of each RNG backend, for single dice and for large groups
+Usage: python -m benchmarks.rng
+"""
+
+# Application
+from utils.rng import RNG_BACKENDS, create_rng
+
+# Local
+from . import measure
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+SCENARIOS = [
+    ("1d20 one by one", lambda rng: rng.randint(1, 20), 1, 100000),
+    ("100d6 batch", lambda rng: rng.roll(100, 6), 100, 2000),
+    ("10000d6 batch", lambda rng: rng.roll(10000, 6), 10000, 50),
+]
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def run():
+    """Prints the number of dice rolled per second, for each backend and scenario"""
+    for name in RNG_BACKENDS:
+        try:
+            rng = create_rng(name)
+        except RuntimeError as error:
+            print(f"{name:<10}skipped: {error}")
+            continue
+        for label, func, dice_count, repeat in SCENARIOS:
+            duration = measure(lambda: func(rng), repeat)
+            print(f"{name:<10}{label:<18}{dice_count / duration:>14,.0f} dice/s")
+
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,83 @@
+"""
+Compares the per-update cost of the JSON, sharded JSON, and SQLite settings backends
+Usage: python -m benchmarks.settings_storage [entity_count]*
+"""
+
+# Built-in
+import json
+import os
+import sys
+import tempfile
+
+# Application
+from utils.json_storage import (
+    JSONFileCache,
+    JSONStorage,
+    ShardedJSONStorage,
+    split_json_file,
+)
+from utils.sqlite_storage import SQLiteStorage
+
+# Local
+from . import format_duration, measure
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+DEFAULT_SIZES = [10000, 100000, 1000000]
+SHARD_COUNT = 4096
+USER_VALUE = {"verbose": True}
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def create_storages(folder, size):
+    """
+    Creates every storage, each filled with `size` users
+    :param str folder: Folder where the files will be created
+    :param int size: Number of users to create
+    :return: The settings filepath and the storages per name
+    :rtype: str, dict
+    """
+    filepath = os.path.join(folder, "user_settings.json")
+    content = {str(i): USER_VALUE for i in range(size)}
+    with open(filepath, "w") as f:
+        json.dump(content, f, indent=2)
+    split_json_file(filepath, SHARD_COUNT)
+    sqlite_storage = SQLiteStorage(os.path.join(folder, "settings.sqlite3"))
+    sqlite_storage.update_many(filepath, content.items())
+    storages = {
+        "json": JSONStorage(JSONFileCache()),
+        "sharded": ShardedJSONStorage(SHARD_COUNT, cache=JSONFileCache()),
+        "sqlite": sqlite_storage,
+    }
+    return filepath, storages
+
+
+def run(sizes):
+    """
+    Measures an update on an existing user for each backend and size
+    :param [int] sizes: The number of users in the settings
+    """
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            filepath, storages = create_storages(folder, size)
+            key = str(size // 2)
+            repeat = max(3, 100000 // size)
+            for name, storage in storages.items():
+                storage.get(filepath, key)  # Warm-up (fills the JSON cache)
+                duration = measure(
+                    lambda: storage.update(filepath, key, USER_VALUE), repeat
+                )
+                print(f"{name:<8}{size:>10} users   {format_duration(duration)}/update")
+            for storage in storages.values():
+                storage.close()
+
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    arg_sizes = [int(arg) for arg in sys.argv[1:]]
+    run(arg_sizes or DEFAULT_SIZES)
@@ -0,0 +1,256 @@
+"""
+Runs every hot path of a command at several data sizes, offline, and compares the results
+with a stored baseline. Exits with an error if a case got slower than the threshold allows.
+Usage: python -m benchmarks.suite [--output FILE] [--baseline FILE] [--save] [--threshold RATIO]
+"""
+
+# Built-in
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# Application
+from utils import async_settings, settings
+from utils.dice_roll import DiceRoll, create_roll_plan
+from utils.json_storage import JSONFileCache, JSONStorage
+from utils.renderer import render_dice_roll
+from utils.rng import get_default_rng_backend
+
+# Local
+from . import format_duration, measure
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+DICE_SIZES = [1, 100, 10000]
+USER_SIZES = [1000, 100000]
+GUILD_SIZES = [100, 100000]
+# Each case is measured several times, and only its fastest round is kept
+ROUNDS = 5
+# Rough time budget of a round, used to pick the number of calls
+ROUND_DURATION = 0.05
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+USER_SETTINGS = {"fair": False, "verbose": True}
+
+
+# --------------------------------------------------------------------------------
+# > Cases
+# --------------------------------------------------------------------------------
+def get_dice_cases():
+    """
+    :return: The parsing, rolling, and rendering cases, per number of dice
+    :rtype: [(str, callable)]
+    """
+    cases = []
+    for size in DICE_SIZES:
+        instructions = [f"{size}d6", f"kh{max(1, size // 2)}", "+3", ">=10"]
+        plan = create_roll_plan(instructions)
+        rolled = DiceRoll(instructions, USER_SETTINGS, plan)
+        rolled.roll()
+        cases += [
+            (f"parse/{size}d6", lambda i=instructions: create_roll_plan(i)),
+            (f"roll/{size}d6", lambda i=instructions, p=plan: _roll(i, p)),
+            (f"render/{size}d6", lambda r=rolled: render_dice_roll(r)),
+        ]
+    return cases
+
+
+def get_command_prefix_cases():
+    """
+    :return: The prefix lookup cases, per number of guilds with a custom prefix
+    :rtype: [(str, callable)]
+    """
+    cases = []
+    indexed_count = 0
+    for size in GUILD_SIZES:
+        for guild_id in range(indexed_count, size):
+            settings.set_guild_prefix(str(guild_id), "$")
+        indexed_count = size
+        message = SimpleNamespace(guild=SimpleNamespace(id=size // 2))
+        cases.append(
+            (
+                f"get_command_prefix/{size}guilds",
+                lambda m=message: settings.get_command_prefix(None, m),
+            )
+        )
+    return cases
+
+
+def get_settings_cases(folder, loop):
+    """
+    Creates one user settings file per size, and points the settings module at it
+    before each call, so that both the sync and async APIs use it
+    :param str folder: Folder where the files will be created
+    :param AbstractEventLoop loop: The loop running the async calls
+    :return: The `get_user_settings` and `update_key` cases, per number of users
+    :rtype: [(str, callable)]
+    """
+    cases = []
+    for size in USER_SIZES:
+        filepath = os.path.join(folder, f"user_settings_{size}.json")
+        with open(filepath, "w") as f:
+            json.dump({str(i): USER_SETTINGS for i in range(size)}, f, indent=2)
+        key = str(size // 2)
+        cases += [
+            (
+                f"get_user_settings/{size}users",
+                lambda p=filepath, k=key: _get_user_settings(loop, p, k),
+            ),
+            (
+                f"update_key/{size}users",
+                lambda p=filepath, k=key: settings.update_key(p, k, USER_SETTINGS),
+            ),
+        ]
+    return cases
+
+
+# --------------------------------------------------------------------------------
+# > Suite
+# --------------------------------------------------------------------------------
+def run_suite():
+    """
+    Measures every case, using a temporary settings storage
+    :return: The average duration of a call per case, in seconds
+    :rtype: dict
+    """
+    results = {}
+    previous_filepath = settings.USER_SETTINGS_FILEPATH
+    loop = asyncio.new_event_loop()
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            settings.set_storage(JSONStorage(JSONFileCache()))
+            cases = get_dice_cases() + get_command_prefix_cases()
+            cases += get_settings_cases(folder, loop)
+            for name, func in cases:
+                results[name] = measure_case(func)
+                print(f"{name:<36}{format_duration(results[name])}/call")
+            settings.close_storage()
+    finally:
+        settings.USER_SETTINGS_FILEPATH = previous_filepath
+        async_settings.shutdown_executor()
+        loop.close()
+    return results
+
+
+def measure_case(func):
+    """
+    Calibrates the number of calls on a first run, then keeps the fastest of ROUNDS rounds
+    :param callable func: The function to call, without arguments
+    :return: The average duration of a call, in seconds
+    :rtype: float
+    """
+    first_duration = measure(func, 1)
+    repeat = max(1, int(ROUND_DURATION / max(first_duration, 1e-9)))
+    return min(measure(func, repeat) for _ in range(ROUNDS))
+
+
+def compare(results, baseline, threshold):
+    """
+    :param dict results: The new duration per case
+    :param dict baseline: The reference duration per case
+    :param float threshold: The allowed slowdown, like 0.25 for +25%
+    :return: The description of each case slower than allowed
+    :rtype: [str]
+    """
+    regressions = []
+    for name, duration in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        ratio = duration / reference
+        print(f"{name:<36}{ratio:>8.2f}x")
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{name}: {format_duration(reference)} -> {format_duration(duration)}"
+            )
+    return regressions
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _roll(instructions, plan):
+    """
+    :param [str] instructions: The user's instructions
+    :param RollPlan plan: Their compiled plan
+    :return: A newly rolled DiceRoll
+    :rtype: DiceRoll
+    """
+    dice_roll = DiceRoll(instructions, USER_SETTINGS, plan)
+    dice_roll.roll()
+    return dice_roll
+
+
+def _get_user_settings(loop, filepath, user_id):
+    """
+    Runs the async `get_user_settings` on a given file, through the settings thread pool
+    :param AbstractEventLoop loop: The loop running the call
+    :param str filepath: The user settings file to read
+    :param str user_id: The user to fetch
+    :return: The user's settings
+    :rtype: dict
+    """
+    settings.USER_SETTINGS_FILEPATH = filepath
+    return loop.run_until_complete(async_settings.get_user_settings(user_id))
+
+
+def _get_environment():
+    """
+    :return: What the durations depend on, besides the code itself
+    :rtype: dict
+    """
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "rng_backend": get_default_rng_backend(),
+    }
+
+
+def _parse_args():
+    """
+    :return: The parsed command line arguments
+    :rtype: Namespace
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks our hot paths")
+    parser.add_argument("--output", help="Where to write the results as JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save", action="store_true", help="Overwrite the baseline with the results"
+    )
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    return parser.parse_args()
+
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    args = _parse_args()
+    report = {"environment": _get_environment(), "results": run_suite()}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline_report = json.load(f)
+        if baseline_report["environment"] != report["environment"]:
+            print(f"Warning: the baseline ran on {baseline_report['environment']}")
+        failures = compare(
+            report["results"], baseline_report["results"], args.threshold
+        )
+        if failures:
+            print(f"{len(failures)} case(s) slower than +{args.threshold:.0%}:")
+            print("\n".join(failures))
+            sys.exit(1)
+    else:
+        print(f"No baseline found at {args.baseline}, use --save to create it")
@@ -3,5 +3,6 @@
 # Local
 from .dice_rolling import DiceRollingCog
 from .guild_config import GuildConfigCog
+from .statistics import StatisticsCog
 from .user_config import UserConfigCog
 from .utility import UtilityCog
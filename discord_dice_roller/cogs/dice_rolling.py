@@ -4,10 +4,14 @@
 from discord.ext import commands
 
 # Application
+from utils.async_settings import get_user_profile, get_user_settings
 from utils.cog import ImprovedCog
 from utils.dice_roll import DiceRoll
 from utils.embed import create_warning_embed
-from utils.settings import get_user_settings, get_user_shortcuts
+from utils.metrics import track_phase
+from utils.offload import roll_and_render
+from utils.roll_history import get_last_roll, set_last_roll
+from utils.shortcuts import create_shortcut_dice_roll
 
 
 # --------------------------------------------------------------------------------
@@ -21,8 +25,6 @@ class DiceRollingCog(ImprovedCog):
         > use       Shows the current shortcuts for the user
     """
 
-    last_roll_per_user = {}
-
     # ----------------------------------------
     # roll
     # ----------------------------------------
@@ -31,12 +33,14 @@ class DiceRollingCog(ImprovedCog):
         """Rolls the dice using the provided instructions"""
         self.log_command_call("roll", ctx.message)
         user_id = str(ctx.message.author.id)
-        user_settings = get_user_settings(user_id)
-        dice_roll = DiceRoll(args, user_settings)
-        embed_output = dice_roll.roll()
+        user_settings = await get_user_settings(user_id)
+        with track_phase("parse"):
+            dice_roll = DiceRoll(args, user_settings)
         if dice_roll.is_valid:
-            self.last_roll_per_user[user_id] = dice_roll
-        await ctx.send(embed=embed_output)
+            self.charge_dice(ctx, dice_roll)
+            set_last_roll(user_id, dice_roll)
+        embed_output = await roll_and_render(dice_roll)
+        await self.send(ctx, embed=embed_output)
 
     @roll.error
     async def roll_error(self, ctx, error):
@@ -51,14 +55,21 @@ class DiceRollingCog(ImprovedCog):
         """Rolls the dice using the player's last VALID instructions"""
         self.log_command_call("reroll", ctx.message)
         user_id = str(ctx.message.author.id)
-        last_dice_roll = self.last_roll_per_user.get(user_id, None)
-        if last_dice_roll is None:
+        last_roll = get_last_roll(user_id)
+        if last_roll is None:
+            # Maybe a roll from before the last restart
+            user_profile = await get_user_profile(user_id, load_history=True)
+            last_roll = user_profile.last_roll
+        if last_roll is None:
             description = "You have yet to send one valid `!roll` command"
             embed_output = create_warning_embed(description=description)
         else:
-            dice_roll = last_dice_roll.copy()
-            embed_output = dice_roll.roll()
-        await ctx.send(embed=embed_output)
+            with track_phase("parse"):
+                dice_roll = DiceRoll(last_roll.instructions, last_roll.settings)
+            if dice_roll.is_valid:
+                self.charge_dice(ctx, dice_roll)
+            embed_output = await roll_and_render(dice_roll)
+        await self.send(ctx, embed=embed_output)
 
     @reroll.error
     async def reroll_error(self, ctx, error):
@@ -73,19 +84,20 @@ class DiceRollingCog(ImprovedCog):
         """Rolls the dice using a user's shortcut and maybe additional instructions"""
         self.log_command_call("use", ctx.message)
         user_id = str(ctx.message.author.id)
-        user_shortcuts = get_user_shortcuts(user_id)
-        if name not in user_shortcuts:
+        user_profile = await get_user_profile(user_id)
+        if name not in user_profile.shortcuts:
             description = f"Found no shortcut with the name `{name}` in your settings"
             embed = create_warning_embed(description=description)
         else:
-            shortcut_instructions = user_shortcuts[name].split(" ")
-            instructions = shortcut_instructions + list(args)
-            user_settings = get_user_settings(user_id)
-            dice_roll = DiceRoll(instructions, user_settings)
-            embed = dice_roll.roll()
+            with track_phase("parse"):
+                dice_roll = create_shortcut_dice_roll(
+                    user_profile.shortcuts[name], args, user_profile.settings
+                )
             if dice_roll.is_valid:
-                self.last_roll_per_user[user_id] = dice_roll
-        await ctx.send(embed=embed)
+                self.charge_dice(ctx, dice_roll)
+                set_last_roll(user_id, dice_roll)
+            embed = await roll_and_render(dice_roll)
+        await self.send(ctx, embed=embed)
 
     @use.error
     async def use_error(self, ctx, error):
@@ -1,12 +1,16 @@
 """Cog allowing guilds to customize their settings"""
 
+# Built-in
+import re
+
 # Third-party
 from discord.ext import commands
 
 # Application
+from utils.async_settings import modify_guild_settings
 from utils.cog import ImprovedCog
-from utils.embed import create_embed
-from utils.settings import get_command_prefix, get_guild_settings, update_guild_settings
+from utils.embed import create_embed, create_error_embed
+from utils.settings import get_command_prefix, get_guild_rate_limits
 
 
 # --------------------------------------------------------------------------------
@@ -17,6 +21,7 @@ class GuildConfigCog(ImprovedCog):
     Allows administrators to customize some settings for their guild
     Commands:
         > setprefix     Changes prefix for this bot on this guild. Only usable by admins.
+        > setratelimit  Shows or changes the rate limits on this guild. Only usable by admins.
     Events:
         > on_message    On mentioned-first, returns the current prefix for this bot on this guild
     """
@@ -30,18 +35,73 @@ class GuildConfigCog(ImprovedCog):
         """Changes prefix for this bot on this guild. Only usable by admins."""
         self.log_command_call("setprefix", ctx.message)
         guild_id = str(ctx.guild.id)
-        settings = get_guild_settings(guild_id)
-        settings["prefix"] = prefix
-        update_guild_settings(guild_id, settings)
+        await modify_guild_settings(
+            guild_id, lambda settings: ({**settings, "prefix": prefix}, None)
+        )
         description = f"From now on, I'll respond to the `{prefix}` command prefix"
         embed = create_embed(title="Settings updated!", description=description)
-        await ctx.send(embed=embed)
+        await self.send(ctx, embed=embed)
 
     @setprefix.error
     async def setprefix_error(self, ctx, error):
         """Base error handler for the `setprefix` command"""
         await self.log_error_and_apologize(ctx, error)
 
+    # ----------------------------------------
+    # setratelimit
+    # ----------------------------------------
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def setratelimit(self, ctx, *args):
+        """Shows or changes the rate limits on this guild. Only usable by admins."""
+        self.log_command_call("setratelimit", ctx.message)
+        updates, errors = self.parse_rate_limit_args(args)
+        if len(errors) > 0:
+            description = "\n".join(errors)
+            embed = create_error_embed(description=description)
+        else:
+            guild_id = str(ctx.guild.id)
+            if len(updates.keys()) > 0:
+                await modify_guild_settings(
+                    guild_id, lambda settings: ({**settings, **updates}, None)
+                )
+            rate_limits = get_guild_rate_limits(ctx.guild.id)
+            description = "\n".join(
+                [
+                    f"{name}: `{value or 'disabled'}`"
+                    for name, value in rate_limits.items()
+                ]
+            )
+            embed = create_embed(
+                title="Rate limits (points per minute):", description=description
+            )
+        await self.send(ctx, embed=embed)
+
+    @setratelimit.error
+    async def setratelimit_error(self, ctx, error):
+        """Base error handler for the `setratelimit` command"""
+        await self.log_error_and_apologize(ctx, error)
+
+    @staticmethod
+    def parse_rate_limit_args(args):
+        """
+        Maps each `user=N` or `guild=N` argument to its rate limit, or adds an error
+        :param [str] args: Extra instructions given by the admin
+        :return: The new rate limits and the error list
+        :rtype: dict, [str]
+        """
+        errors = []
+        updates = {}
+        for arg in args:
+            match = re.fullmatch(r"(?P<scope>user|guild)=(?P<value>\d+)", arg)
+            if match is None:
+                message = f"[Instruction] This instruction is invalid: `{arg}`"
+                errors.append(message)
+                continue
+            name = f"{match.group('scope')}_rate_limit"
+            updates[name] = int(match.group("value"))
+        return updates, errors
+
     # ----------------------------------------
     # on_message
     # ----------------------------------------
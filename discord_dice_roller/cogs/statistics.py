@@ -0,0 +1,178 @@
+"""Commands giving statistics about roll instructions"""
+
+# Built-in
+import asyncio
+import re
+
+# Third-party
+from discord.ext import commands
+
+# Application
+from utils.cog import ImprovedCog
+from utils.dice_roll import generate_discord_markdown_string, get_roll_plan
+from utils.embed import create_embed, create_error_embed
+from utils.metrics import track_phase
+from utils.probability import MAX_ODDS_COST, estimate_odds_cost, get_odds
+from utils.simulation import get_dice_count, get_simulation_limits, simulate, summarize
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+COUNT_REGEX = re.compile(r"n=(?P<count>\d{1,9})")
+DEFAULT_SIMULATION_COUNT = 10000
+
+
+# --------------------------------------------------------------------------------
+# > Cog
+# --------------------------------------------------------------------------------
+class StatisticsCog(ImprovedCog):
+    """
+    Provides commands to study roll instructions without rolling them
+        > odds      Computes the exact odds of the provided instructions
+        > simulate  Rolls the provided instructions many times and shows the distribution
+    """
+
+    # ----------------------------------------
+    # odds
+    # ----------------------------------------
+    @commands.command()
+    async def odds(self, ctx, *args):
+        """Computes the exact odds of the provided instructions"""
+        self.log_command_call("odds", ctx.message)
+        plan = get_roll_plan(args)
+        if not plan.is_valid:
+            embed = create_error_embed(description="\n".join(plan.errors))
+        elif estimate_odds_cost(plan) > MAX_ODDS_COST:
+            description = "This roll is too complex to compute its exact odds"
+            embed = create_error_embed(description=description)
+        else:
+            loop = asyncio.get_event_loop()
+            with track_phase("compute"):
+                odds = await loop.run_in_executor(None, get_odds, plan)
+            embed = self._create_odds_embed(odds)
+        await self.send(ctx, embed=embed)
+
+    @odds.error
+    async def odds_error(self, ctx, error):
+        """Base error handler for the `odds` command"""
+        await self.log_error_and_apologize(ctx, error)
+
+    # ----------------------------------------
+    # simulate
+    # ----------------------------------------
+    @commands.command()
+    async def simulate(self, ctx, *args):
+        """Rolls the provided instructions many times and shows the distribution"""
+        self.log_command_call("simulate", ctx.message)
+        count = DEFAULT_SIMULATION_COUNT
+        instructions = []
+        for arg in args:
+            match = COUNT_REGEX.fullmatch(arg)
+            if match is not None:
+                count = int(match.group("count"))
+            else:
+                instructions.append(arg)
+        plan = get_roll_plan(instructions)
+        errors = list(plan.errors)
+        if plan.is_valid:
+            errors.extend(self._validate_simulation_count(plan, count))
+        if len(errors) > 0:
+            embed = create_error_embed(description="\n".join(errors))
+        else:
+            with track_phase("compute"):
+                simulation = await simulate(plan, count)
+            embed = self._create_simulation_embed(simulation)
+        await self.send(ctx, embed=embed)
+
+    @simulate.error
+    async def simulate_error(self, ctx, error):
+        """Base error handler for the `simulate` command"""
+        await self.log_error_and_apologize(ctx, error)
+
+    # ----------------------------------------
+    # Helpers
+    # ----------------------------------------
+    @staticmethod
+    def _create_odds_embed(odds):
+        """
+        :param Odds odds: The computed odds of the instructions
+        :return: The embed with the check probability, the mean, and the percentiles
+        :rtype: Embed
+        """
+        if odds.success is not None:
+            title = f"{odds.success:.2%} chance of success"
+        else:
+            title = f"You will roll {odds.mean:.2f} on average"
+        embed = create_embed(title=title)
+        distribution = odds.distribution
+        lowest = distribution.offset
+        highest = distribution.offset + len(distribution.weights) - 1
+        lines = [
+            f"[Mean]({odds.mean:.2f})",
+            f"[Range]({lowest} to {highest})",
+        ]
+        lines.extend(
+            [f"[{p}th percentile]({value})" for p, value in odds.percentiles.items()]
+        )
+        embed.add_field(
+            name="Distribution",
+            value=generate_discord_markdown_string(lines),
+            inline=False,
+        )
+        return embed
+
+    @staticmethod
+    def _create_simulation_embed(simulation):
+        """
+        :param Simulation simulation: The results of the simulation
+        :return: The embed with the mean, percentiles, and histogram of the totals
+        :rtype: Embed
+        """
+        if simulation.count == 0:
+            description = "The simulation ran out of time before finishing any roll"
+            return create_error_embed(description=description)
+        mean, percentiles, histogram = summarize(simulation)
+        if simulation.successes is not None:
+            success_rate = simulation.successes / simulation.count
+            title = f"{success_rate:.2%} of successes over {simulation.count} rolls"
+        else:
+            title = f"Simulated {simulation.count} rolls"
+        embed = create_embed(title=title)
+        lines = [f"[Mean]({mean:.2f})"]
+        lines.extend(
+            [f"[{p}th percentile]({value})" for p, value in percentiles.items()]
+        )
+        embed.add_field(
+            name="Results",
+            value=generate_discord_markdown_string(lines),
+            inline=False,
+        )
+        embed.add_field(
+            name="Histogram",
+            value="\n".join(["```"] + histogram + ["```"]),
+            inline=False,
+        )
+        if simulation.timed_out:
+            embed.set_footer(
+                text=f"Stopped after {simulation.count} of the {simulation.requested} "
+                "requested rolls, because of the time limit"
+            )
+        return embed
+
+    @staticmethod
+    def _validate_simulation_count(plan, count):
+        """
+        :param RollPlan plan: A valid roll plan
+        :param int count: The requested number of rolls
+        :return: The list of error messages
+        :rtype: [str]
+        """
+        errors = []
+        limits = get_simulation_limits()
+        if count < 1 or count > limits["max_count"]:
+            message = f"[Simulation] The number of rolls must be between 1 and `{limits['max_count']}`"
+            errors.append(message)
+        elif count * get_dice_count(plan) > limits["max_dice"]:
+            message = f"[Simulation] Cannot roll more than `{limits['max_dice']}` dice in total"
+            errors.append(message)
+        return errors
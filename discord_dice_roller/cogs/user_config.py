@@ -1,6 +1,5 @@
 """Cog allowing users to customize their settings"""
 
-
 # Built-in
 import re
 
@@ -8,24 +7,20 @@ import re
 from discord.ext import commands
 
 # Application
+from utils.async_settings import (
+    get_user_shortcuts,
+    modify_user_settings,
+    modify_user_shortcuts,
+)
 from utils.cog import ImprovedCog
 from utils.dice_roll import (
-    CHECK_REGEX,
-    COMPLEX_ACTION_REGEX,
-    DICE_REGEX,
-    MODIFIER_REGEX,
-    SIMPLE_ACTION_REGEX,
     DiceRoll,
     generate_discord_markdown_string,
+    is_roll_instruction,
 )
 from utils.embed import create_embed, create_error_embed, create_warning_embed
-from utils.settings import (
-    DEFAULT_USER_SETTINGS,
-    get_user_settings,
-    get_user_shortcuts,
-    update_user_settings,
-    update_user_shortcuts,
-)
+from utils.settings import DEFAULT_USER_SETTINGS
+from utils.shortcuts import create_shortcut, get_shortcut_text
 
 
 # --------------------------------------------------------------------------------
@@ -54,16 +49,21 @@ class UserConfigCog(ImprovedCog):
         """Deletes an existing shortcut for the user"""
         self.log_command_call("remove", ctx.message)
         user_id = str(ctx.message.author.id)
-        user_shortcuts = get_user_shortcuts(user_id)
-        if name not in user_shortcuts.keys():
+
+        def _remove(user_shortcuts):
+            if name not in user_shortcuts.keys():
+                return None, False
+            del user_shortcuts[name]
+            return user_shortcuts, True
+
+        removed = await modify_user_shortcuts(user_id, _remove)
+        if not removed:
             description = f"Found no shortcut with the name `{name}` in your settings"
             embed = create_warning_embed(description=description)
         else:
-            del user_shortcuts[name]
-            update_user_shortcuts(user_id, user_shortcuts)
             description = f"The `{name}` shortcut has been removed successfully"
             embed = create_embed(title="Settings updated!", description=description)
-        await ctx.send(embed=embed)
+        await self.send(ctx, embed=embed)
 
     @remove.error
     async def remove_error(self, ctx, error):
@@ -78,15 +78,17 @@ class UserConfigCog(ImprovedCog):
         """Deletes all the shortcuts of the user"""
         self.log_command_call("removeall", ctx.message)
         user_id = str(ctx.message.author.id)
-        user_shortcuts = get_user_shortcuts(user_id)
-        if len(user_shortcuts.keys()) == 0:
+        removed = await modify_user_shortcuts(
+            user_id,
+            lambda user_shortcuts: ({}, True) if user_shortcuts else (None, False),
+        )
+        if not removed:
             description = "Looks like you have no existing shortcuts!"
             embed = create_warning_embed(description=description)
         else:
-            update_user_shortcuts(user_id, {})
             description = "All your shortcuts have been removed"
             embed = create_embed(title="Settings updated!", description=description)
-        await ctx.send(embed=embed)
+        await self.send(ctx, embed=embed)
 
     @removeall.error
     async def removeall_error(self, ctx, error):
@@ -100,37 +102,53 @@ class UserConfigCog(ImprovedCog):
     async def save(self, ctx, name, *args):
         """Creates a shortcut for a group of roll instructions"""
         self.log_command_call("save", ctx.message)
-        errors = self._validate_set_instructions(name, *args)
+        errors, dice_roll = self._validate_set_instructions(name, *args)
         if len(errors) > 0:
             description = "\n".join(errors)
             embed = create_error_embed(description=description)
         else:
             user_id = str(ctx.message.author.id)
-            user_shortcuts = get_user_shortcuts(user_id)
-            _max = (
-                self.MAX_SHORTCUTS
-                if name not in user_shortcuts
-                else self.MAX_SHORTCUTS + 1
+            shortcut = create_shortcut(dice_roll)
+            instructions_as_string = shortcut["instructions"]
+            saved = await modify_user_shortcuts(
+                user_id,
+                lambda user_shortcuts: self._save_shortcut(
+                    user_shortcuts, name, shortcut
+                ),
             )
-            if len(user_shortcuts.items()) > _max:
+            if not saved:
                 description = f"Cannot have more than `{self.MAX_SHORTCUTS}` shortcuts. \
                     \nPlease remove some using the `remove` command"
                 embed = create_error_embed(description=description)
             else:
-                instructions_as_string = " ".join(args)
-                user_shortcuts[name] = instructions_as_string
-                update_user_shortcuts(user_id, user_shortcuts)
                 description = (
                     f"The `{name}` shortcut now points to `{instructions_as_string}`"
                 )
                 embed = create_embed(title="Settings updated!", description=description)
-        await ctx.send(embed=embed)
+        await self.send(ctx, embed=embed)
 
     @save.error
     async def save_error(self, ctx, error):
         """Base error handler for the `save` command"""
         await self.log_error_and_apologize(ctx, error)
 
+    def _save_shortcut(self, user_shortcuts, name, shortcut):
+        """
+        Adds or replaces the shortcut, unless the user has too many of them
+        :param dict user_shortcuts: The current shortcuts of the user
+        :param str name: Name of the shortcut
+        :param dict shortcut: The validated instructions and their plan
+        :return: The new shortcuts (None if unchanged) and whether it was saved
+        :rtype: dict or None, bool
+        """
+        _max = (
+            self.MAX_SHORTCUTS if name not in user_shortcuts else self.MAX_SHORTCUTS + 1
+        )
+        if len(user_shortcuts.items()) > _max:
+            return None, False
+        user_shortcuts[name] = shortcut
+        return user_shortcuts, True
+
     @staticmethod
     def _validate_set_instructions(name, *args):
         """
@@ -138,23 +156,15 @@ class UserConfigCog(ImprovedCog):
         If not, append errors to the list
         :param str name: Name of the shortcut
         :param [str] args: Supposedly DiceRoll instructions
-        :return: The list of error messages
-        :rtype: [str]
+        :return: The list of error messages, and the DiceRoll if instructions were given
+        :rtype: [str], DiceRoll or None
         """
         errors = []
-        for regex in [
-            CHECK_REGEX,
-            COMPLEX_ACTION_REGEX,
-            DICE_REGEX,
-            MODIFIER_REGEX,
-            SIMPLE_ACTION_REGEX,
-        ]:
-            match = re.fullmatch(regex, name)
-            if match is not None:
-                errors.append(
-                    "[Shortcut] Cannot use an actual roll instruction as a shortcut"
-                )
-                break
+        dice_roll = None
+        if is_roll_instruction(name):
+            errors.append(
+                "[Shortcut] Cannot use an actual roll instruction as a shortcut"
+            )
         if len(args) == 0:
             errors.append(
                 "[DiceRoll] Please provide instructions after your shortcut name"
@@ -162,7 +172,7 @@ class UserConfigCog(ImprovedCog):
         else:
             dice_roll = DiceRoll(args, {})
             errors.extend(dice_roll.errors)
-        return errors
+        return errors, dice_roll
 
     # ----------------------------------------
     # show
@@ -171,17 +181,19 @@ class UserConfigCog(ImprovedCog):
     async def show(self, ctx):
         """Shows the current shortcuts for the user"""
         self.log_command_call("show", ctx.message)
-        shortcuts = get_user_shortcuts(str(ctx.message.author.id))
+        shortcuts = await get_user_shortcuts(str(ctx.message.author.id))
         if len(shortcuts.keys()) == 0:
             description = "Looks like you have no existing shortcuts!"
             embed = create_warning_embed(description=description)
         else:
-            description = "\n".join([f"{k}: {v}" for k, v in shortcuts.items()])
+            description = "\n".join(
+                [f"{k}: {get_shortcut_text(v)}" for k, v in shortcuts.items()]
+            )
             description = generate_discord_markdown_string([description])
             embed = create_embed(
                 title="Here are your shortcuts:", description=description
             )
-        await ctx.send(embed=embed)
+        await self.send(ctx, embed=embed)
 
     @show.error
     async def show_error(self, ctx, error):
@@ -202,12 +214,15 @@ class UserConfigCog(ImprovedCog):
             embed = create_error_embed(description=description)
         else:
             user_id = str(ctx.message.author.id)
-            user_custom_settings = get_user_settings(user_id)
-            # Maybe update settings
-            if len(new_settings.keys()) > 0:
+
+            def _update(user_custom_settings):
+                if len(new_settings.keys()) == 0:
+                    return None, user_custom_settings
                 new_user_settings = {**user_custom_settings, **new_settings}
-                update_user_settings(user_id, new_user_settings)
-            # No need to re-fetch if updated
+                return new_user_settings, new_user_settings
+
+            # Maybe update settings, in the same round trip as the read
+            user_custom_settings = await modify_user_settings(user_id, _update)
             user_settings = {
                 **DEFAULT_USER_SETTINGS,
                 **user_custom_settings,
@@ -217,7 +232,7 @@ class UserConfigCog(ImprovedCog):
             embed = create_embed(
                 title="Your current settings are:", description=description
             )
-        await ctx.send(embed=embed)
+        await self.send(ctx, embed=embed)
 
     @settings.error
     async def settings_error(self, ctx, error):
@@ -230,7 +245,10 @@ class UserConfigCog(ImprovedCog):
         :return: Dict of option name to their regex values and their converter
         :rtype: dict
         """
-        return {"verbose": ("True|False", self.verbose_converter)}
+        return {
+            "verbose": ("True|False", self.verbose_converter),
+            "fair": ("True|False", self.verbose_converter),
+        }
 
     @staticmethod
     def verbose_converter(value):
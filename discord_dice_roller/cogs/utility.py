@@ -1,13 +1,11 @@
 """Cog for utility commands like clean up or about"""
 
-# Built-in
-import time
-
 # Third-party
 from discord.ext import commands
 
 # Application
 from utils.cog import ImprovedCog
+from utils.deletion import get_deletion_scheduler
 from utils.embed import create_embed, create_error_embed
 
 # --------------------------------------------------------------------------------
@@ -19,6 +17,10 @@ reroll                           Rolls the dice using the same settings as the u
 roll [instruction]*              Rolls the dice using the provided instructions
 use [shortcut] ?[instruction]*   Rolls the dice using a user's shortcut and maybe additional instructions
 
+# Statistics
+odds [instruction]*              Computes the exact odds of the instructions, like "odds 1d20 adv +5 >=15"
+simulate [instruction]* ?n=[qty] Rolls the instructions N times (10000 by default) and shows the distribution
+
 # Shortcut management
 remove [shortcut]                Removes one specific shortcut for the user
 removeall                        Removes all of the user's shortcuts
@@ -34,6 +36,7 @@ ping                             Simply checks if the bot is up and running
 
 # Settings
 setprefix [value]                Change the command prefix at the guild/server level. Needs admin privileges
+setratelimit ?[user|guild=N]*    Shows or changes the points per minute of each user and of the guild. Needs admin privileges
 settings ?[name=value]*          Shows the user current settings and allows editing on the fly
 ```"""
 
@@ -44,6 +47,8 @@ For more details, checkout those links:
 - [Settings](https://jordan-kowal.github.io/discord-dice-roller/#settings)
 """
 
+AUTO_DESTRUCT_TIMER = 5
+
 ABOUT_TEXT = """
 Author: **Jordan Kowal**
 Version: **`v1.0.0`**
@@ -71,7 +76,7 @@ class UtilityCog(ImprovedCog):
         """Provides a recap of the bot information"""
         self.log_command_call("about", ctx.message)
         embed = create_embed(description=ABOUT_TEXT)
-        await ctx.send(embed=embed)
+        await self.send(ctx, embed=embed)
 
     @about.error
     async def about_error(self, ctx, error):
@@ -85,9 +90,9 @@ class UtilityCog(ImprovedCog):
     async def help(self, ctx):
         """Checks if the bot is up"""
         self.log_command_call("help", ctx.message)
-        await ctx.send(HELP_TEXT)
+        await self.send(ctx, HELP_TEXT)
         embed_output = create_embed(description=MORE_INFO_TEXT)
-        await ctx.send(embed=embed_output)
+        await self.send(ctx, embed=embed_output)
 
     @help.error
     async def help_error(self, ctx, error):
@@ -102,7 +107,7 @@ class UtilityCog(ImprovedCog):
         """Checks if the bot is up"""
         self.log_command_call("ping", ctx.message)
         embed_output = create_embed(description="pong")
-        await ctx.send(embed=embed_output)
+        await self.send(ctx, embed=embed_output)
 
     @ping.error
     async def ping_error(self, ctx, error):
@@ -119,26 +124,25 @@ class UtilityCog(ImprovedCog):
         error = self._validate_clear_args(limit)
         if error is not None:
             error_embed = create_error_embed(description=error)
-            await ctx.send(embed=error_embed)
+            await self.send(ctx, embed=error_embed)
         else:
             limit = int(limit) + 1  # To account for THIS command call
             await ctx.channel.purge(
                 limit=limit, check=lambda msg: self._should_delete(msg, ctx)
             )
             # Send some feedback
-            auto_destruct_timer = 5
             feedback_embed = create_embed(
                 title="Purge recap",
                 description=f"Check the last {limit-1} message for deletion",
             )
             feedback_embed.set_footer(
-                text=f"This message will auto-destruct in {auto_destruct_timer} seconds"
+                text=f"This message will auto-destruct in {AUTO_DESTRUCT_TIMER} seconds"
+            )
+            message = await self.send(ctx, embed=feedback_embed)
+            # Then we delete the call and our feedback, without blocking the bot
+            get_deletion_scheduler().schedule(
+                [ctx.message, message], AUTO_DESTRUCT_TIMER
             )
-            message = await ctx.send(embed=feedback_embed)
-            # Then we delete the call and our feedback
-            time.sleep(auto_destruct_timer)
-            await ctx.message.delete()
-            await message.delete()
 
     @clear.error
     async def clear_error(self, ctx, error):
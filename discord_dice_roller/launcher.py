@@ -0,0 +1,196 @@
+"""
+Runs the bot as several processes (clusters) of shards, watched by a supervisor
+Clusters share the settings storage, which must be SQLite when there are more than one
+Each cluster writes its own logs, reroll history, and metrics, suffixed by its id
+Usage: python launcher.py [--clusters N] [--shards N|auto] [--fake-gateway]
+"""
+
+# Built-in
+import argparse
+import asyncio
+import logging
+import os
+import signal
+
+# Third-party
+from dotenv import load_dotenv
+
+# Application
+import utils.logging
+from main import create_bot, run_bot, setup_process
+from scripts.fake_gateway import FakeGateway
+from utils import settings
+from utils.cluster import (
+    HEALTH_INTERVAL,
+    HEALTH_TIMEOUT,
+    IDENTIFY_INTERVAL,
+    ClusterSupervisor,
+    fetch_recommended_shard_count,
+    report_health,
+    set_api_url,
+    split_shards,
+)
+from utils.logging import setup_logging, stop_logging
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+FAKE_GATEWAY_PORT = 8080
+FAKE_GUILD_COUNT = 1000
+
+
+# --------------------------------------------------------------------------------
+# > Cluster process
+# --------------------------------------------------------------------------------
+def run_cluster(cluster_id, shard_ids, shard_count, connection, identify_throttle):
+    """
+    Entry point of a cluster process: runs the bot for its shards until it stops
+    :param int cluster_id: Index of the cluster, used to suffix its files and ports
+    :param [int] shard_ids: The shards it handles
+    :param int shard_count: The total number of shards
+    :param Connection connection: The pipe to report its health to the supervisor
+    :param IdentifyThrottle identify_throttle: Spaces the IDENTIFY of every cluster
+    """
+    load_dotenv()
+    configure_cluster(cluster_id)
+    setup_process()
+    bot = create_bot(shard_ids, shard_count, identify_throttle)
+    interval = float(os.getenv("CLUSTER_HEALTH_INTERVAL", HEALTH_INTERVAL))
+    bot.loop.create_task(report_health(bot, connection, interval))
+    run_bot(bot)
+
+
+def configure_cluster(cluster_id):
+    """
+    Gives the cluster its own files and ports, as they cannot be shared between processes
+    :param int cluster_id: Index of the cluster
+    """
+    utils.logging.LOG_FILE = get_cluster_path(utils.logging.LOG_FILE, cluster_id)
+    settings.ROLL_HISTORY_FILEPATH = get_cluster_path(
+        settings.ROLL_HISTORY_FILEPATH, cluster_id
+    )
+    if os.getenv("METRICS_PORT"):
+        os.environ["METRICS_PORT"] = str(int(os.environ["METRICS_PORT"]) + cluster_id)
+    if os.getenv("METRICS_FILE"):
+        os.environ["METRICS_FILE"] = get_cluster_path(
+            os.environ["METRICS_FILE"], cluster_id
+        )
+
+
+def get_cluster_path(filepath, cluster_id):
+    """
+    :param str filepath: A file path, like "console.log"
+    :param int cluster_id: Index of the cluster
+    :return: The path suffixed with the cluster id, like "console.cluster-0.log"
+    :rtype: str
+    """
+    root, extension = os.path.splitext(filepath)
+    return f"{root}.cluster-{cluster_id}{extension}"
+
+
+# --------------------------------------------------------------------------------
+# > Supervisor process
+# --------------------------------------------------------------------------------
+def launch(cluster_count, shard_count):
+    """
+    Starts the clusters and watches them until SIGINT or SIGTERM
+    :param int cluster_count: The number of processes, capped to the number of shards
+    :param int shard_count: The total number of shards
+    """
+    cluster_count = len(split_shards(shard_count, cluster_count))
+    if cluster_count > 1 and os.getenv("SETTINGS_BACKEND", "json") != "sqlite":
+        raise ValueError(
+            "Clusters share the settings storage, so SETTINGS_BACKEND must be 'sqlite'"
+        )
+    # Each cluster has its own simulation pool, so the cores are split between them
+    if not os.getenv("SIMULATION_PROCESSES"):
+        processes = max(1, (os.cpu_count() or 1) // cluster_count)
+        os.environ["SIMULATION_PROCESSES"] = str(processes)
+    supervisor = ClusterSupervisor(
+        run_cluster,
+        shard_count,
+        cluster_count,
+        health_timeout=float(os.getenv("CLUSTER_HEALTH_TIMEOUT", HEALTH_TIMEOUT)),
+        identify_interval=float(
+            os.getenv("CLUSTER_IDENTIFY_INTERVAL", IDENTIFY_INTERVAL)
+        ),
+    )
+    signal.signal(signal.SIGTERM, lambda *_args: supervisor.stop())
+    logging.info(
+        f"Launching {len(supervisor.clusters)} clusters for {shard_count} shards"
+    )
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        pass
+    logging.info("Every cluster has stopped")
+
+
+def start_fake_gateway(shard_count):
+    """
+    Starts a local fake gateway and points the bot at it
+    :param int shard_count: The shard count the gateway recommends
+    """
+    gateway = FakeGateway(
+        port=FAKE_GATEWAY_PORT,
+        shard_count=shard_count,
+        guild_count=FAKE_GUILD_COUNT,
+        identify_interval=float(
+            os.getenv("CLUSTER_IDENTIFY_INTERVAL", IDENTIFY_INTERVAL)
+        ),
+    )
+    gateway.start_in_thread()
+    os.environ["DISCORD_API_URL"] = gateway.api_url
+    os.environ.setdefault("DISCORD_TOKEN", "fake-token")
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _parse_args():
+    """
+    :return: The parsed command line arguments
+    :rtype: Namespace
+    """
+    parser = argparse.ArgumentParser(description="Runs the bot as clusters of shards")
+    parser.add_argument(
+        "--clusters",
+        type=int,
+        default=int(os.getenv("CLUSTER_COUNT") or os.cpu_count() or 1),
+        help="Number of processes (defaults to the CPU count)",
+    )
+    parser.add_argument(
+        "--shards",
+        default=os.getenv("SHARD_COUNT") or "auto",
+        help="Total number of shards, or 'auto' to use the count recommended by Discord",
+    )
+    parser.add_argument(
+        "--fake-gateway",
+        action="store_true",
+        help="Connects to a local fake gateway instead of Discord",
+    )
+    return parser.parse_args()
+
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    load_dotenv()
+    setup_logging()
+    args = _parse_args()
+    try:
+        if args.fake_gateway:
+            fake_shard_count = 4 if args.shards == "auto" else int(args.shards)
+            start_fake_gateway(fake_shard_count)
+        if os.getenv("DISCORD_API_URL"):
+            set_api_url(os.getenv("DISCORD_API_URL"))
+        if args.shards == "auto":
+            loop = asyncio.get_event_loop()
+            token = os.getenv("DISCORD_TOKEN")
+            shards = loop.run_until_complete(fetch_recommended_shard_count(token))
+        else:
+            shards = int(args.shards)
+        launch(args.clusters, shards)
+    finally:
+        stop_logging()
@@ -9,23 +9,115 @@ from discord.ext import commands
 from dotenv import load_dotenv
 
 # Application
-from cogs import DiceRollingCog, GuildConfigCog, UserConfigCog, UtilityCog
-from utils.logging import setup_logging
-from utils.settings import get_command_prefix, init_settings_files
+from cogs import (
+    DiceRollingCog,
+    GuildConfigCog,
+    StatisticsCog,
+    UserConfigCog,
+    UtilityCog,
+)
+from utils.async_settings import get_round_trip_stats, shutdown_executor
+from utils.cluster import ClusterBot, set_api_url
+from utils.deletion import get_deletion_stats
+from utils.dice_roll import get_roll_plan_cache_stats
+from utils.logging import get_logging_stats, setup_logging, stop_logging
+from utils.metrics import register_stats, run_metrics_exporter
+from utils.offload import get_offload_stats, shutdown_roll_pool
+from utils.rate_limit import get_rate_limit_stats
+from utils.roll_history import close_roll_history_log, get_roll_history_stats
+from utils.settings import (
+    build_guild_settings_index,
+    close_storage,
+    get_cache_stats,
+    get_command_prefix,
+    get_flush_stats,
+    init_settings_files,
+)
+from utils.simulation import shutdown_process_pool
 
 # --------------------------------------------------------------------------------
-# > Main
+# > Constants
 # --------------------------------------------------------------------------------
-if __name__ == "__main__":
-    # Env setup
+COG_CLASSES = [
+    DiceRollingCog,
+    GuildConfigCog,
+    StatisticsCog,
+    UserConfigCog,
+    UtilityCog,
+]
+
+
+# --------------------------------------------------------------------------------
+# > Setup
+# --------------------------------------------------------------------------------
+def setup_process():
+    """Setups the logs, the settings storage, and the metrics of the current process"""
     random.seed()
     load_dotenv()
     setup_logging()
     init_settings_files()
-    # Bot setup
-    bot = commands.Bot(command_prefix=get_command_prefix, help_command=None)
-    for cog_class in [DiceRollingCog, GuildConfigCog, UserConfigCog, UtilityCog]:
+    build_guild_settings_index()
+    register_stats("settings_cache", get_cache_stats)
+    register_stats("settings_flush", get_flush_stats)
+    register_stats("round_trips", get_round_trip_stats, label="command")
+    register_stats("roll_plan_cache", get_roll_plan_cache_stats)
+    register_stats("roll_history", get_roll_history_stats)
+    register_stats("deletion", get_deletion_stats)
+    register_stats("logging", get_logging_stats)
+    register_stats("rate_limit", get_rate_limit_stats)
+    register_stats("roll_offload", get_offload_stats)
+
+
+def create_bot(shard_ids=None, shard_count=None, identify_throttle=None):
+    """
+    Creates the bot with all our cogs
+    It is an AutoShardedBot if a shard count is provided, or set in the SHARD_COUNT env
+    variable ("auto" to use the count recommended by Discord)
+    :param [int] shard_ids: The shards handled by this process (defaults to all of them)
+    :param int shard_count: The total number of shards
+    :param IdentifyThrottle identify_throttle: Spaces the IDENTIFY with the other processes
+    :return: The bot, with its cogs
+    :rtype: Bot or ClusterBot
+    """
+    api_url = os.getenv("DISCORD_API_URL")
+    if api_url:
+        set_api_url(api_url)
+    options = {"command_prefix": get_command_prefix, "help_command": None}
+    shard_count = shard_count or os.getenv("SHARD_COUNT")
+    if not shard_count:
+        bot = commands.Bot(**options)
+    else:
+        bot = ClusterBot(
+            shard_ids=shard_ids,
+            shard_count=None if shard_count == "auto" else int(shard_count),
+            identify_throttle=identify_throttle,
+            **options,
+        )
+    for cog_class in COG_CLASSES:
         bot.add_cog(cog_class(bot))
-    # Execute
-    TOKEN = os.getenv("DISCORD_TOKEN")
-    bot.run(TOKEN)
+    return bot
+
+
+def run_bot(bot):
+    """
+    Runs the bot and our background tasks until it stops, then releases our resources
+    :param Bot bot: The bot to run
+    """
+    bot.loop.create_task(run_metrics_exporter())
+    try:
+        bot.run(os.getenv("DISCORD_TOKEN"))
+    finally:
+        shutdown_executor()
+        close_storage()
+        close_roll_history_log()
+        shutdown_process_pool()
+        shutdown_roll_pool()
+        stop_logging()
+
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    setup_process()
+    run_bot(create_bot())
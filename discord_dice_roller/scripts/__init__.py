@@ -0,0 +1 @@
+"""One-shot maintenance scripts, to run with `python -m scripts.<name>` from this folder"""
@@ -0,0 +1,282 @@
+"""
+Local stand-in for the Discord API and gateway, to exercise the launcher without Discord
+It answers the login and gateway HTTP calls, then READY and GUILD_CREATE for each shard,
+and logs a warning whenever 2 IDENTIFY are closer than Discord would allow
+Usage: python -m scripts.fake_gateway [--port PORT] [--shards N] [--guilds N] [--identify-interval S]
+Then run the launcher with DISCORD_API_URL=http://127.0.0.1:PORT/api/v7
+"""
+
+# Built-in
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+
+# Third-party
+from aiohttp import WSMsgType, web
+
+# Application
+from utils.logging import setup_logging
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+API_PREFIX = "/api/v7"
+BOT_USER = {
+    "id": "100000000000000000",
+    "username": "DiceRoller",
+    "discriminator": "0000",
+    "avatar": None,
+    "bot": True,
+}
+HEARTBEAT_INTERVAL = 41250  # In milliseconds, like Discord
+IDENTIFY_INTERVAL = 5
+# Opcodes
+DISPATCH = 0
+HEARTBEAT = 1
+IDENTIFY = 2
+RESUME = 6
+INVALID_SESSION = 9
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+
+# --------------------------------------------------------------------------------
+# > Gateway
+# --------------------------------------------------------------------------------
+class FakeGateway:
+    """Serves the HTTP routes and the gateway websocket of a bot in `guild_count` guilds"""
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=8080,
+        shard_count=4,
+        guild_count=100,
+        identify_interval=IDENTIFY_INTERVAL,
+    ):
+        """
+        :param str host: The host to listen on
+        :param int port: The port to listen on
+        :param int shard_count: The shard count recommended by GET /gateway/bot
+        :param int guild_count: The number of guilds, spread over the shards like Discord does
+        :param float identify_interval: Min number of seconds expected between 2 IDENTIFY
+        """
+        self.host = host
+        self.port = port
+        self.shard_count = shard_count
+        self.guild_count = guild_count
+        self.identify_interval = identify_interval
+        self._sessions = itertools.count()
+        self._last_identify = None
+        self._runner = None
+        self.stats = {"identify": 0, "identify_too_soon": 0, "connections": 0}
+        # Monotonic time and shard id of each IDENTIFY, in order
+        self.identifies = []
+
+    @property
+    def api_url(self):
+        """
+        :return: The URL to set as DISCORD_API_URL
+        :rtype: str
+        """
+        return f"http://{self.host}:{self.port}{API_PREFIX}"
+
+    async def start(self):
+        """Starts listening"""
+        app = web.Application()
+        app.router.add_get(f"{API_PREFIX}/users/@me", self._get_user)
+        app.router.add_get(f"{API_PREFIX}/gateway", self._get_gateway)
+        app.router.add_get(f"{API_PREFIX}/gateway/bot", self._get_gateway)
+        app.router.add_get("/gateway", self._serve_gateway)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.info(f"Fake gateway listening on {self.api_url}")
+
+    async def stop(self):
+        """Closes every connection"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self):
+        """Runs the gateway in a daemon thread, with its own event loop"""
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def _run():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=_run, name="fake-gateway", daemon=True).start()
+        started.wait()
+
+    # ----------------------------------------
+    # HTTP
+    # ----------------------------------------
+    async def _get_user(self, _request):
+        """
+        :return: The bot user, as GET /users/@me
+        :rtype: Response
+        """
+        return _json_response(BOT_USER)
+
+    async def _get_gateway(self, _request):
+        """
+        :return: The gateway URL and recommended shard count, as GET /gateway/bot
+        :rtype: Response
+        """
+        return _json_response(
+            {
+                "url": f"ws://{self.host}:{self.port}/gateway",
+                "shards": self.shard_count,
+                "session_start_limit": {
+                    "total": 1000,
+                    "remaining": 1000,
+                    "reset_after": 0,
+                    "max_concurrency": 1,
+                },
+            }
+        )
+
+    # ----------------------------------------
+    # Gateway
+    # ----------------------------------------
+    async def _serve_gateway(self, request):
+        """
+        Handles a shard connection until it closes
+        :param Request request: The websocket upgrade request
+        :return: The websocket response
+        :rtype: WebSocketResponse
+        """
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.stats["connections"] += 1
+        sequence = itertools.count(1)
+        await ws.send_json(
+            {"op": HELLO, "d": {"heartbeat_interval": HEARTBEAT_INTERVAL}}
+        )
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                break
+            payload = json.loads(message.data)
+            op = payload["op"]
+            if op == HEARTBEAT:
+                await ws.send_json({"op": HEARTBEAT_ACK})
+            elif op == IDENTIFY:
+                shard_id, shard_count = payload["d"].get("shard", [0, 1])
+                self._record_identify(shard_id)
+                for event, data in self._get_startup_events(shard_id, shard_count):
+                    await ws.send_json(
+                        {"op": DISPATCH, "s": next(sequence), "t": event, "d": data}
+                    )
+            elif op == RESUME:
+                await ws.send_json({"op": INVALID_SESSION, "d": False})
+        return ws
+
+    def _record_identify(self, shard_id):
+        """
+        Counts the IDENTIFY, and warns if it came sooner than Discord allows
+        :param int shard_id: The shard identifying itself
+        """
+        now = time.monotonic()
+        self.stats["identify"] += 1
+        self.identifies.append((now, shard_id))
+        if self._last_identify is not None:
+            elapsed = now - self._last_identify
+            if elapsed < self.identify_interval:
+                self.stats["identify_too_soon"] += 1
+                logging.warning(
+                    f"Shard {shard_id} identified {elapsed:.2f}s after the previous one"
+                )
+        self._last_identify = now
+
+    def _get_startup_events(self, shard_id, shard_count):
+        """
+        :param int shard_id: The shard that identified itself
+        :param int shard_count: The total number of shards of the bot
+        :return: The READY event then one GUILD_CREATE per guild of the shard
+        :rtype: [(str, dict)]
+        """
+        guild_ids = [
+            str(index << 22)
+            for index in range(1, self.guild_count + 1)
+            if index % shard_count == shard_id
+        ]
+        ready = {
+            "v": 6,
+            "user": BOT_USER,
+            "guilds": [{"id": guild_id, "unavailable": True} for guild_id in guild_ids],
+            "session_id": f"session-{next(self._sessions)}",
+            "shard": [shard_id, shard_count],
+            "private_channels": [],
+            "relationships": [],
+        }
+        events = [("READY", ready)]
+        for guild_id in guild_ids:
+            guild = {
+                "id": guild_id,
+                "name": f"Guild {guild_id}",
+                "owner_id": BOT_USER["id"],
+                "member_count": 1,
+                "large": False,
+                "unavailable": False,
+                "roles": [],
+                "emojis": [],
+                "channels": [],
+                "members": [],
+                "features": [],
+            }
+            events.append(("GUILD_CREATE", guild))
+        return events
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _json_response(data):
+    """
+    :param dict data: The payload
+    :return: A JSON response, without the charset that discord.py does not expect
+    :rtype: Response
+    """
+    return web.Response(body=json.dumps(data).encode(), content_type="application/json")
+
+
+def _parse_args():
+    """
+    :return: The parsed command line arguments
+    :rtype: Namespace
+    """
+    parser = argparse.ArgumentParser(description="Fakes the Discord gateway locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--identify-interval", type=float, default=IDENTIFY_INTERVAL)
+    return parser.parse_args()
+
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    setup_logging()
+    args = _parse_args()
+    gateway = FakeGateway(
+        args.host, args.port, args.shards, args.guilds, args.identify_interval
+    )
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(gateway.start())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(gateway.stop())
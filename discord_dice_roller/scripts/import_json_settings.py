@@ -0,0 +1,21 @@
+"""Imports the existing JSON settings files into the SQLite database"""
+
+# Built-in
+import logging
+
+# Application
+from utils.logging import setup_logging
+from utils.settings import SETTINGS_FILEPATHS, SQLITE_FILEPATH
+from utils.sqlite_storage import SQLiteStorage, import_json_files
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    setup_logging()
+    storage = SQLiteStorage(SQLITE_FILEPATH)
+    storage.init_files(SETTINGS_FILEPATHS)
+    imported = import_json_files(storage, SETTINGS_FILEPATHS)
+    for filepath, count in imported.items():
+        logging.info(f"Imported {count} entries from {filepath}")
+    storage.close()
@@ -0,0 +1,20 @@
+"""Splits the monolithic JSON settings files into the sharded layout"""
+
+# Built-in
+import logging
+import os
+
+# Application
+from utils.json_storage import split_json_file
+from utils.logging import setup_logging
+from utils.settings import DEFAULT_SHARD_COUNT, SETTINGS_FILEPATHS
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+if __name__ == "__main__":
+    setup_logging()
+    shard_count = int(os.getenv("SETTINGS_SHARDS", DEFAULT_SHARD_COUNT))
+    for filepath in SETTINGS_FILEPATHS:
+        count = split_json_file(filepath, shard_count)
+        logging.info(f"Migrated {count} entries from {filepath}")
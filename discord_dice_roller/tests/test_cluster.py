@@ -0,0 +1,180 @@
+"""Tests of the shard split and of the cluster supervisor, against the fake gateway"""
+
+# Built-in
+import os
+import socket
+import threading
+import time
+
+# Third-party
+import pytest
+
+# Application
+from scripts.fake_gateway import FakeGateway
+from utils.cluster import (
+    ClusterBot,
+    ClusterSupervisor,
+    report_health,
+    set_api_url,
+    split_shards,
+)
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+SHARD_COUNT = 4
+CLUSTER_COUNT = 2
+# Shorter than Discord's, to keep the test fast
+IDENTIFY_INTERVAL = 0.5
+HEALTH_INTERVAL = 0.2
+HEALTH_TIMEOUT = 10
+WAIT_TIMEOUT = 30
+
+
+# --------------------------------------------------------------------------------
+# > Shard split
+# --------------------------------------------------------------------------------
+@pytest.mark.parametrize(
+    "shard_count, cluster_count", [(1, 1), (4, 2), (10, 3), (16, 16), (7, 1)]
+)
+def test_split_shards_covers_every_shard_once(shard_count, cluster_count):
+    """Every shard is in a single cluster, and clusters are contiguous ranges"""
+    clusters = split_shards(shard_count, cluster_count)
+    assert len(clusters) == cluster_count
+    assert [shard for shards in clusters for shard in shards] == list(
+        range(shard_count)
+    )
+
+
+def test_split_shards_balances_the_clusters():
+    """Cluster sizes differ by 1 at most"""
+    clusters = split_shards(10, 3)
+    assert clusters == [[0, 1, 2], [3, 4, 5], [6, 7, 8, 9]]
+
+
+@pytest.mark.parametrize("cluster_count", [2, 8])
+def test_split_shards_caps_the_cluster_count(cluster_count):
+    """There are never more clusters than shards, nor empty clusters"""
+    clusters = split_shards(2, cluster_count)
+    assert clusters == [[0], [1]]
+
+
+def test_split_shards_has_at_least_one_cluster():
+    """A cluster count of 0 still runs every shard"""
+    assert split_shards(3, 0) == [[0, 1, 2]]
+
+
+# --------------------------------------------------------------------------------
+# > Supervisor
+# --------------------------------------------------------------------------------
+def run_test_cluster(cluster_id, shard_ids, shard_count, connection, throttle):
+    """
+    Cluster process of the test: a bare ClusterBot, without our cogs and settings
+    :param int cluster_id: Index of the cluster
+    :param [int] shard_ids: The shards it handles
+    :param int shard_count: The total number of shards
+    :param Connection connection: The pipe to report its health to the supervisor
+    :param IdentifyThrottle throttle: Spaces the IDENTIFY of every cluster
+    """
+    set_api_url(os.environ["DISCORD_API_URL"])
+    bot = ClusterBot(
+        command_prefix="!",
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+        identify_throttle=throttle,
+        guild_ready_timeout=0.1,
+    )
+    bot.loop.create_task(report_health(bot, connection, HEALTH_INTERVAL))
+    bot.run("fake-token")
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """
+    :return: A fake gateway running in a thread, used by the spawned clusters
+    :rtype: FakeGateway
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    fake_gateway = FakeGateway(
+        port=port,
+        shard_count=SHARD_COUNT,
+        guild_count=20,
+        identify_interval=IDENTIFY_INTERVAL,
+    )
+    fake_gateway.start_in_thread()
+    # Spawned processes inherit the environment
+    monkeypatch.setenv("DISCORD_API_URL", fake_gateway.api_url)
+    return fake_gateway
+
+
+@pytest.fixture
+def supervisor(gateway):
+    """
+    :return: A supervisor running 2 clusters in a thread, stopped after the test
+    :rtype: ClusterSupervisor
+    """
+    cluster_supervisor = ClusterSupervisor(
+        run_test_cluster,
+        SHARD_COUNT,
+        CLUSTER_COUNT,
+        health_timeout=HEALTH_TIMEOUT,
+        identify_interval=IDENTIFY_INTERVAL,
+    )
+    thread = threading.Thread(target=cluster_supervisor.run, daemon=True)
+    thread.start()
+    yield cluster_supervisor
+    cluster_supervisor.stop()
+    thread.join(WAIT_TIMEOUT)
+    assert not thread.is_alive()
+
+
+def test_supervisor_spaces_identify(gateway, supervisor):
+    """Every shard of every cluster identifies, IDENTIFY_INTERVAL apart"""
+    _wait_for(lambda: _all_ready(supervisor))
+    assert sorted(shard for _time, shard in gateway.identifies) == list(
+        range(SHARD_COUNT)
+    )
+    times = [identify_time for identify_time, _shard in gateway.identifies]
+    gaps = [after - before for before, after in zip(times, times[1:])]
+    # Small tolerance for the delivery of the websocket messages
+    assert min(gaps) >= IDENTIFY_INTERVAL * 0.9
+
+
+def test_supervisor_restarts_killed_cluster(gateway, supervisor):
+    """A killed cluster is started again, and its shards identify again"""
+    _wait_for(lambda: _all_ready(supervisor))
+    cluster = supervisor.clusters[0]
+    killed_pid = cluster.process.pid
+    cluster.process.kill()
+    identify_count = SHARD_COUNT + len(cluster.shard_ids)
+    _wait_for(lambda: gateway.stats["identify"] == identify_count)
+    _wait_for(lambda: cluster.health.get("ready", False))
+    assert cluster.restarts == 1
+    assert cluster.process.pid != killed_pid
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _all_ready(cluster_supervisor):
+    """
+    :param ClusterSupervisor cluster_supervisor: The running supervisor
+    :return: Whether every cluster reported being ready
+    :rtype: bool
+    """
+    return all(
+        cluster.health.get("ready", False) for cluster in cluster_supervisor.clusters
+    )
+
+
+def _wait_for(condition):
+    """
+    Polls the condition until it is true, or fails the test after WAIT_TIMEOUT
+    :param callable condition: Returns whether to stop waiting
+    """
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for the clusters"
+        time.sleep(0.1)
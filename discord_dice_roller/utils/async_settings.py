@@ -0,0 +1,271 @@
+"""
+Non-blocking access to our settings, for use within the discord event loop
+Storage work runs in a bounded thread pool and read-modify-write are guarded by per-key locks
+"""
+
+# Built-in
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+# Local
+from . import settings
+from .metrics import record_phase
+from .settings import (
+    GUILD_SETTINGS_FILEPATH,
+    USER_SETTINGS_FILEPATH,
+    USER_SHORTCUTS_FILEPATH,
+)
+
+# --------------------------------------------------------------------------------
+# > Executor
+# --------------------------------------------------------------------------------
+_executor = None
+
+
+def get_executor():
+    """
+    :return: The thread pool for settings I/O, created on first use from the env variables
+    :rtype: ThreadPoolExecutor
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SETTINGS_THREADS", 4)),
+            thread_name_prefix="settings",
+        )
+    return _executor
+
+
+def shutdown_executor():
+    """Waits for the pending settings I/O and stops the thread pool"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run_in_executor(func, *args):
+    """
+    Runs a blocking settings function in our thread pool
+    :param callable func: The synchronous function to call
+    :param args: The arguments of the function
+    :return: The result of the function
+    """
+    _count_round_trip()
+    loop = asyncio.get_event_loop()
+    start = time.perf_counter()
+    try:
+        return await loop.run_in_executor(
+            get_executor(), functools.partial(func, *args)
+        )
+    finally:
+        record_phase("storage", time.perf_counter() - start)
+
+
+# --------------------------------------------------------------------------------
+# > Round trips
+# --------------------------------------------------------------------------------
+_current_command = contextvars.ContextVar("current_command", default=None)
+_round_trip_stats = {}
+
+
+def start_round_trip_tracking(command_name):
+    """
+    Starts counting the storage round trips of the current command
+    Each command runs in its own task, so the counter is isolated through a contextvar
+    :param str command_name: Name of the command being executed
+    """
+    _current_command.set([command_name, 0])
+
+
+def stop_round_trip_tracking():
+    """Stops counting for the current command and records its round trips"""
+    tracker = _current_command.get()
+    if tracker is None:
+        return
+    _current_command.set(None)
+    command_name, round_trips = tracker
+    stats = _round_trip_stats.setdefault(
+        command_name, {"commands": 0, "round_trips": 0, "max_round_trips": 0}
+    )
+    stats["commands"] += 1
+    stats["round_trips"] += round_trips
+    stats["max_round_trips"] = max(stats["max_round_trips"], round_trips)
+
+
+def get_round_trip_stats():
+    """
+    :return: The number of commands and storage round trips per command name
+    :rtype: dict
+    """
+    return {
+        command_name: {
+            **stats,
+            "avg_round_trips": stats["round_trips"] / stats["commands"],
+        }
+        for command_name, stats in _round_trip_stats.items()
+    }
+
+
+def _count_round_trip():
+    """Increments the round trip counter of the current command, if tracked"""
+    tracker = _current_command.get()
+    if tracker is not None:
+        tracker[1] += 1
+
+
+# --------------------------------------------------------------------------------
+# > Locks
+# --------------------------------------------------------------------------------
+_key_locks = {}
+
+
+@asynccontextmanager
+async def lock_key(filepath, key):
+    """
+    Prevents concurrent read-modify-write on the same key within the event loop
+    Across processes, the SQLite storage runs each `modify_key` in one transaction
+    Locks are created on demand and dropped once nobody is using them
+    :param str filepath: The path to the settings file
+    :param str key: The user/guild id
+    """
+    lock_id = (filepath, key)
+    lock, users = _key_locks.get(lock_id, (None, 0))
+    if lock is None:
+        lock = asyncio.Lock()
+    _key_locks[lock_id] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, users = _key_locks[lock_id]
+        if users <= 1:
+            del _key_locks[lock_id]
+        else:
+            _key_locks[lock_id] = (lock, users - 1)
+
+
+def lock_user_shortcuts(user_id):
+    """
+    :param str user_id: The discord user id as string
+    :return: The context manager locking the user's shortcuts
+    """
+    return lock_key(USER_SHORTCUTS_FILEPATH, user_id)
+
+
+def lock_user_settings(user_id):
+    """
+    :param str user_id: The discord user id as string
+    :return: The context manager locking the user's settings
+    """
+    return lock_key(USER_SETTINGS_FILEPATH, user_id)
+
+
+def lock_guild_settings(guild_id):
+    """
+    :param str guild_id: The discord guild/server id
+    :return: The context manager locking the guild's settings
+    """
+    return lock_key(GUILD_SETTINGS_FILEPATH, guild_id)
+
+
+# --------------------------------------------------------------------------------
+# > Settings API
+# --------------------------------------------------------------------------------
+async def get_user_profile(user_id, load_history=False):
+    """
+    :param str user_id: The discord user id as string
+    :param bool load_history: Whether to look for the last roll in the persisted history
+    :return: The user's settings, shortcuts, and last roll, in a single round trip
+    :rtype: UserProfile
+    """
+    return await run_in_executor(settings.get_user_profile, user_id, load_history)
+
+
+async def get_user_shortcuts(user_id):
+    """
+    :param str user_id: The discord user id as string
+    :return: The user's shortcuts
+    :rtype: dict
+    """
+    return await run_in_executor(settings.get_user_shortcuts, user_id)
+
+
+async def update_user_shortcuts(user_id, user_data):
+    """
+    :param str user_id: The discord user id
+    :param dict user_data: The new shortcuts for the user
+    """
+    await run_in_executor(settings.update_user_shortcuts, user_id, user_data)
+
+
+async def modify_user_shortcuts(user_id, modifier):
+    """
+    Reads, modifies, and saves the user's shortcuts in a single round trip
+    :param str user_id: The discord user id
+    :param callable modifier: Receives the shortcuts, returns (new_shortcuts, result)
+    :return: The result returned by the modifier
+    """
+    async with lock_user_shortcuts(user_id):
+        return await run_in_executor(settings.modify_user_shortcuts, user_id, modifier)
+
+
+async def get_user_settings(user_id):
+    """
+    :param str user_id: The discord user id as string
+    :return: The user's settings
+    :rtype: dict
+    """
+    return await run_in_executor(settings.get_user_settings, user_id)
+
+
+async def update_user_settings(user_id, user_data):
+    """
+    :param str user_id: The discord user id
+    :param dict user_data: The new settings for the user
+    """
+    await run_in_executor(settings.update_user_settings, user_id, user_data)
+
+
+async def modify_user_settings(user_id, modifier):
+    """
+    Reads, modifies, and saves the user's settings in a single round trip
+    :param str user_id: The discord user id
+    :param callable modifier: Receives the settings, returns (new_settings, result)
+    :return: The result returned by the modifier
+    """
+    async with lock_user_settings(user_id):
+        return await run_in_executor(settings.modify_user_settings, user_id, modifier)
+
+
+async def get_guild_settings(guild_id):
+    """
+    :param str guild_id: The discord guild/server id
+    :return: The guild's settings
+    :rtype: dict
+    """
+    return await run_in_executor(settings.get_guild_settings, guild_id)
+
+
+async def update_guild_settings(guild_id, guild_data):
+    """
+    :param str guild_id: The discord guild/server id
+    :param dict guild_data: The new settings for the guild
+    """
+    await run_in_executor(settings.update_guild_settings, guild_id, guild_data)
+
+
+async def modify_guild_settings(guild_id, modifier):
+    """
+    Reads, modifies, and saves the guild's settings in a single round trip
+    :param str guild_id: The discord guild/server id
+    :param callable modifier: Receives the settings, returns (new_settings, result)
+    :return: The result returned by the modifier
+    """
+    async with lock_guild_settings(guild_id):
+        return await run_in_executor(settings.modify_guild_settings, guild_id, modifier)
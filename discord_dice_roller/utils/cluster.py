@@ -0,0 +1,348 @@
+"""
+Runs the shards of the bot in several processes, called clusters, watched by a supervisor
+Each cluster is an AutoShardedBot handling a contiguous range of shards, which reports
+its health to the parent process through a pipe. Clusters that exit or stop reporting
+are terminated and restarted, and every IDENTIFY is spaced across the processes.
+"""
+
+# Built-in
+import asyncio
+import logging
+import math
+import multiprocessing
+import time
+from multiprocessing.connection import wait
+
+# Third-party
+from discord.ext import commands
+from discord.http import HTTPClient, Route
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+# Discord only accepts one IDENTIFY every 5 seconds per bot, whatever the process
+IDENTIFY_INTERVAL = 5
+HEALTH_INTERVAL = 5
+HEALTH_TIMEOUT = 30
+# Delay before restarting a failed cluster, doubled after each consecutive failure
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 60
+# Time given to a terminated cluster to flush its settings before being killed
+STOP_TIMEOUT = 10
+
+
+# --------------------------------------------------------------------------------
+# > Child side
+# --------------------------------------------------------------------------------
+class IdentifyThrottle:
+    """Hands out IDENTIFY slots to the shards of every cluster, through shared memory"""
+
+    def __init__(self, context, interval=IDENTIFY_INTERVAL):
+        """
+        Initializes the shared lock and next available slot
+        :param BaseContext context: The multiprocessing context of the clusters
+        :param float interval: Min number of seconds between 2 IDENTIFY
+        """
+        self.interval = interval
+        self._lock = context.Lock()
+        self._next_slot = context.Value("d", 0, lock=False)
+
+    def reserve(self):
+        """
+        Books the next slot. The lock is only held for the booking, not the wait,
+        so a cluster killed while waiting cannot block the others.
+        :return: Seconds to wait before sending the IDENTIFY
+        :rtype: float
+        """
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + self.interval
+        return slot - now
+
+
+class ClusterBot(commands.AutoShardedBot):
+    """AutoShardedBot whose IDENTIFY can be spaced with the other clusters"""
+
+    def __init__(self, *args, identify_throttle=None, **kwargs):
+        """:param IdentifyThrottle identify_throttle: Shared by every cluster, if any"""
+        super().__init__(*args, **kwargs)
+        self.identify_throttle = identify_throttle
+
+    async def before_identify_hook(self, shard_id, *, initial=False):
+        """
+        Waits for a slot of the shared throttle, or for the default delay without one
+        :param int shard_id: The shard about to IDENTIFY
+        :param bool initial: Whether it is the first shard of the process
+        """
+        if self.identify_throttle is None:
+            await super().before_identify_hook(shard_id, initial=initial)
+            return
+        await asyncio.sleep(self.identify_throttle.reserve())
+
+
+def get_cluster_health(bot):
+    """
+    :param ClusterBot bot: The running bot
+    :return: The state of the bot, as reported to the supervisor
+    :rtype: dict
+    """
+    return {
+        "time": time.time(),
+        "ready": bot.is_ready(),
+        "guilds": len(bot.guilds),
+        "latencies": {
+            shard_id: latency
+            for shard_id, latency in bot.latencies
+            if not math.isnan(latency) and not math.isinf(latency)
+        },
+    }
+
+
+async def report_health(bot, connection, interval=HEALTH_INTERVAL):
+    """
+    Sends the health of the bot to the supervisor until cancelled
+    The reports come from the event loop, so a blocked loop stops them too
+    Closes the bot if the supervisor is gone, so clusters are never orphaned
+    :param ClusterBot bot: The running bot
+    :param Connection connection: The child end of the pipe
+    :param float interval: Number of seconds between 2 reports
+    """
+    while True:
+        try:
+            connection.send(get_cluster_health(bot))
+        except OSError:
+            logging.error("Lost the connection to the supervisor, stopping")
+            await bot.close()
+            return
+        await asyncio.sleep(interval)
+
+
+# --------------------------------------------------------------------------------
+# > Parent side
+# --------------------------------------------------------------------------------
+class Cluster:
+    """A range of shards, and the process currently running them"""
+
+    def __init__(self, cluster_id, shard_ids):
+        """
+        :param int cluster_id: Index of the cluster
+        :param [int] shard_ids: The shards it handles
+        """
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.process = None
+        self.connection = None
+        self.last_report = None
+        self.health = {}
+        self.failures = 0
+        self.restarts = 0
+        self.restart_at = 0
+
+
+class ClusterSupervisor:
+    """
+    Starts one process per cluster, and restarts those that exit or stop reporting
+    `run` blocks until `stop` is called (from a signal handler for instance)
+    """
+
+    def __init__(
+        self,
+        target,
+        shard_count,
+        cluster_count,
+        health_timeout=HEALTH_TIMEOUT,
+        identify_interval=IDENTIFY_INTERVAL,
+    ):
+        """
+        Splits the shards into clusters, without starting them
+        :param callable target: Runs a cluster, with (cluster_id, shard_ids, shard_count,
+            connection, identify_throttle) as arguments. Must be picklable.
+        :param int shard_count: The total number of shards
+        :param int cluster_count: The number of processes to split them into
+        :param float health_timeout: Seconds without report before a cluster is restarted
+        :param float identify_interval: Min number of seconds between 2 IDENTIFY
+        """
+        self.target = target
+        self.shard_count = shard_count
+        self.health_timeout = health_timeout
+        # "spawn" so that children never inherit the parent's threads or sockets
+        self.context = multiprocessing.get_context("spawn")
+        self.identify_throttle = IdentifyThrottle(self.context, identify_interval)
+        self.clusters = [
+            Cluster(cluster_id, shard_ids)
+            for cluster_id, shard_ids in enumerate(
+                split_shards(shard_count, cluster_count)
+            )
+        ]
+        self._stopping = False
+
+    def run(self):
+        """Starts every cluster, then watches them until stopped"""
+        for cluster in self.clusters:
+            self._start(cluster)
+        try:
+            while not self._stopping:
+                self._receive_reports(timeout=1)
+                now = time.monotonic()
+                for cluster in self.clusters:
+                    self._check(cluster, now)
+        finally:
+            for cluster in self.clusters:
+                self._terminate(cluster)
+
+    def stop(self):
+        """Makes `run` terminate the clusters and return"""
+        self._stopping = True
+
+    # ----------------------------------------
+    # Helpers
+    # ----------------------------------------
+    def _start(self, cluster):
+        """
+        Starts a new process for the cluster
+        :param Cluster cluster: The cluster to start
+        """
+        parent_connection, child_connection = self.context.Pipe(duplex=False)
+        cluster.process = self.context.Process(
+            target=self.target,
+            args=(
+                cluster.cluster_id,
+                cluster.shard_ids,
+                self.shard_count,
+                child_connection,
+                self.identify_throttle,
+            ),
+            name=f"cluster-{cluster.cluster_id}",
+        )
+        cluster.process.start()
+        child_connection.close()
+        cluster.connection = parent_connection
+        cluster.last_report = time.monotonic()
+        cluster.health = {}
+        logging.info(
+            f"Started cluster {cluster.cluster_id} (pid {cluster.process.pid}) "
+            f"with shards {cluster.shard_ids[0]}-{cluster.shard_ids[-1]}"
+        )
+
+    def _receive_reports(self, timeout):
+        """
+        Reads the pending health reports, waiting at most `timeout` for the first one
+        :param float timeout: Max number of seconds to wait
+        """
+        connections = {
+            cluster.connection: cluster
+            for cluster in self.clusters
+            if cluster.connection is not None
+        }
+        if len(connections) == 0:
+            time.sleep(timeout)
+            return
+        for connection in wait(list(connections), timeout):
+            cluster = connections[connection]
+            try:
+                health = connection.recv()
+            except (EOFError, OSError):
+                # The process exited, `_check` will restart it
+                connection.close()
+                cluster.connection = None
+                continue
+            if health["ready"] and not cluster.health.get("ready", False):
+                logging.info(
+                    f"Cluster {cluster.cluster_id} is ready with {health['guilds']} guilds"
+                )
+                cluster.failures = 0
+            cluster.health = health
+            cluster.last_report = time.monotonic()
+
+    def _check(self, cluster, now):
+        """
+        Restarts the cluster if it exited or stopped reporting
+        :param Cluster cluster: The cluster to check
+        :param float now: The current monotonic time
+        """
+        if cluster.process is None:
+            if now >= cluster.restart_at:
+                cluster.restarts += 1
+                self._start(cluster)
+            return
+        if not cluster.process.is_alive():
+            reason = f"exited with code {cluster.process.exitcode}"
+        elif now - cluster.last_report > self.health_timeout:
+            reason = f"sent no report for {now - cluster.last_report:.0f}s"
+            # Its loop is stuck, so it could not handle a SIGTERM anyway
+            cluster.process.kill()
+        else:
+            return
+        self._terminate(cluster)
+        delay = min(RESTART_DELAY * 2**cluster.failures, MAX_RESTART_DELAY)
+        cluster.failures += 1
+        cluster.restart_at = now + delay
+        logging.error(
+            f"Cluster {cluster.cluster_id} {reason}, restarting it in {delay}s"
+        )
+
+    @staticmethod
+    def _terminate(cluster):
+        """
+        Stops the process of the cluster, gracefully first
+        :param Cluster cluster: The cluster to stop
+        """
+        process = cluster.process
+        if process is None:
+            return
+        if process.is_alive():
+            process.terminate()
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+        process.join()
+        if cluster.connection is not None:
+            cluster.connection.close()
+        cluster.process = None
+        cluster.connection = None
+
+
+# --------------------------------------------------------------------------------
+# > Utilities
+# --------------------------------------------------------------------------------
+def split_shards(shard_count, cluster_count):
+    """
+    :param int shard_count: The total number of shards
+    :param int cluster_count: The number of clusters, capped to the number of shards
+    :return: The contiguous shard ids of each cluster, with sizes differing by 1 at most
+    :rtype: [[int]]
+    """
+    cluster_count = max(1, min(cluster_count, shard_count))
+    return [
+        list(
+            range(
+                cluster_id * shard_count // cluster_count,
+                (cluster_id + 1) * shard_count // cluster_count,
+            )
+        )
+        for cluster_id in range(cluster_count)
+    ]
+
+
+def set_api_url(api_url):
+    """
+    Points every Discord HTTP call at another server, like our fake gateway
+    :param str api_url: The base URL of the API, like "http://127.0.0.1:8080/api/v7"
+    """
+    Route.BASE = api_url.rstrip("/")
+
+
+async def fetch_recommended_shard_count(token):
+    """
+    :param str token: The token of the bot
+    :return: The number of shards Discord recommends for our guild count
+    :rtype: int
+    """
+    http = HTTPClient()
+    try:
+        await http.static_login(token, bot=True)
+        shard_count, _gateway = await http.get_bot_gateway()
+    finally:
+        await http.close()
+    return shard_count
@@ -2,13 +2,22 @@
 
 # Built-in
 import logging
+import math
 
 # Third-party
 from discord.ext import commands
 
 # Local
-from .embed import create_error_embed
-from .settings import get_command_prefix
+from .async_settings import start_round_trip_tracking, stop_round_trip_tracking
+from .embed import create_error_embed, create_warning_embed
+from .metrics import (
+    record_command_error,
+    start_command_timer,
+    stop_command_timer,
+    track_phase,
+)
+from .rate_limit import RateLimited, get_command_cost, get_dice_cost, get_rate_limiter
+from .settings import get_command_prefix, get_guild_rate_limits
 
 
 # --------------------------------------------------------------------------------
@@ -26,14 +35,42 @@ class ImprovedCog(commands.Cog):
         """
         self.bot = bot
 
+    async def cog_before_invoke(self, ctx):
+        """
+        Called before every command of the cog: spends the command points,
+        then starts counting storage round trips and timing the command
+        :param Context ctx: The command call context
+        :raises RateLimited: If the user or guild has run out of points
+        """
+        cost = get_command_cost(ctx.command.qualified_name)
+        retry_after = get_rate_limiter().acquire(self.get_rate_limits(ctx), cost)
+        if retry_after > 0:
+            raise RateLimited(retry_after)
+        start_round_trip_tracking(ctx.command.qualified_name)
+        start_command_timer(ctx.command.qualified_name)
+
+    async def cog_after_invoke(self, ctx):
+        """
+        Called after every command of the cog, even on failure: records the round trips
+        and the duration of the command
+        :param Context ctx: The command call context
+        """
+        stop_round_trip_tracking()
+        stop_command_timer()
+
     async def log_error_and_apologize(self, ctx, error):
         """
         Logs the error and sends the default error message as embed
         :param ctx:
         :param error:
         """
+        if isinstance(error, RateLimited):
+            await self.send_rate_limit_warning(ctx, error)
+            return
         message = f"Command '{ctx.command}': {error} "
         logging.error(message)
+        if ctx.command is not None:
+            record_command_error(ctx.command.qualified_name)
         prefix = get_command_prefix(self.bot, ctx.message)
         description = """
             Did you forget a required arguments in your command?
@@ -48,18 +85,76 @@ class ImprovedCog(commands.Cog):
         )
         await ctx.send(embed=embed)
 
+    def charge_dice(self, ctx, dice_roll):
+        """
+        Spends the points of the dice, which are only known once the roll is parsed
+        Only call it for valid rolls: invalid ones are never rolled, and their dice
+        count could be anything the user typed
+        :param Context ctx: The command call context
+        :param DiceRoll dice_roll: The parsed and valid DiceRoll
+        """
+        cost = get_dice_cost(len(dice_roll.dice))
+        get_rate_limiter().charge(self.get_rate_limits(ctx), cost)
+
+    @staticmethod
+    def get_rate_limits(ctx):
+        """
+        :param Context ctx: The command call context
+        :return: The limit of the user bucket, and of the guild bucket (if not a DM)
+        :rtype: dict
+        """
+        guild = ctx.guild
+        rate_limits = get_guild_rate_limits(guild.id if guild is not None else None)
+        limits = {("user", ctx.message.author.id): rate_limits["user_rate_limit"]}
+        if guild is not None:
+            limits[("guild", guild.id)] = rate_limits["guild_rate_limit"]
+        return limits
+
+    async def send_rate_limit_warning(self, ctx, error):
+        """
+        Tells the user to slow down
+        :param Context ctx: The command call context
+        :param RateLimited error: The error raised before the command
+        """
+        logging.info(f"Command '{ctx.command}' throttled for {ctx.message.author.id}")
+        description = (
+            "You are sending commands too fast. "
+            f"Please try again in {math.ceil(error.retry_after)} seconds."
+        )
+        embed = create_warning_embed(title="Slow down!", description=description)
+        await self.send(ctx, embed=embed)
+
+    @staticmethod
+    async def send(ctx, *args, **kwargs):
+        """
+        Sends a message in the context channel, timed as the "send" phase of the command
+        :param Context ctx: The command call context
+        :param args: The positional arguments of `ctx.send`
+        :param kwargs: The keyword arguments of `ctx.send`, like `embed`
+        :return: The sent message
+        :rtype: Message
+        """
+        with track_phase("send"):
+            return await ctx.send(*args, **kwargs)
+
     @staticmethod
     def log_command_call(name, message):
         """
         Logs the command call in the console and log file
+        The message is only formatted if the record is not sampled out (LOG_COMMAND_SAMPLE_RATE)
         Does not crash in case of failure
         :param str name: Name of the command
         :param Message message: The discord message that triggered the call
         :return:
         """
         try:
+            user_id = message.author.id
             logging.info(
-                f"User {message.author.id} triggered '{name}' with: {message.content}"
+                "User %s triggered '%s' with: %s",
+                user_id,
+                name,
+                message.content,
+                extra={"command_call": True, "command": name, "user_id": user_id},
             )
         except Exception:
             pass
@@ -0,0 +1,197 @@
+"""
+Deletes messages after a delay without blocking the event loop
+Pending messages are kept in a single heap, watched by a single asyncio timer,
+and the ones due at the same time are deleted in bulk, channel per channel
+"""
+
+# Built-in
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import defaultdict
+
+# Third-party
+from discord import HTTPException
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+# Discord only bulk deletes between 2 and 100 messages at once
+BULK_DELETE_MIN = 2
+BULK_DELETE_MAX = 100
+# Messages due within this many seconds are deleted together, to batch them
+BATCH_WINDOW = 0.25
+# Messages scheduled above this amount are dropped instead of queued
+MAX_PENDING_DELETIONS = 10000
+
+
+# --------------------------------------------------------------------------------
+# > Scheduler
+# --------------------------------------------------------------------------------
+class DeletionScheduler:
+    """
+    Queues messages for a delayed deletion
+    At most one timer is armed (for the earliest message) and one deletion task runs at a time,
+    so a burst of `schedule` calls never piles up coroutines
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_DELETIONS):
+        """
+        Initializes an empty queue and its counters
+        :param int max_pending: Max number of messages waiting for their deletion
+        """
+        self.max_pending = max_pending
+        self._pending = []  # Heap of (due time, sequence, message)
+        self._sequence = itertools.count()
+        self._timer = None
+        self._timer_due = None
+        self._task = None
+        self._stats = {
+            "scheduled": 0,
+            "deleted": 0,
+            "failed": 0,
+            "dropped": 0,
+            "bulk_deletes": 0,
+            "total_latency": 0,
+            "max_latency": 0,
+        }
+
+    @property
+    def stats(self):
+        """
+        :return: The queue depth, the deletion counters, and how late the deletions were
+        :rtype: dict
+        """
+        processed = self._stats["deleted"] + self._stats["failed"]
+        avg_latency = self._stats["total_latency"] / processed if processed else 0
+        return {
+            **self._stats,
+            "pending": len(self._pending),
+            "avg_latency": avg_latency,
+        }
+
+    def schedule(self, messages, delay):
+        """
+        Queues the messages for deletion. Must be called from the event loop.
+        :param [Message] messages: The messages to delete
+        :param float delay: Number of seconds to wait before deleting them
+        """
+        loop = asyncio.get_event_loop()
+        due = loop.time() + delay
+        for message in messages:
+            if len(self._pending) >= self.max_pending:
+                self._stats["dropped"] += 1
+                continue
+            heapq.heappush(self._pending, (due, next(self._sequence), message))
+            self._stats["scheduled"] += 1
+        self._arm_timer(loop)
+
+    def cancel(self):
+        """Stops the timer and forgets the pending messages"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending.clear()
+
+    # ----------------------------------------
+    # Helpers
+    # ----------------------------------------
+    def _arm_timer(self, loop):
+        """
+        Makes sure a timer fires for the earliest pending message
+        While a deletion task runs, it re-arms the timer itself once done
+        :param AbstractEventLoop loop: The running event loop
+        """
+        if len(self._pending) == 0 or self._task is not None:
+            return
+        due = self._pending[0][0]
+        if self._timer is not None:
+            if self._timer_due <= due:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(due, self._on_timer)
+        self._timer_due = due
+
+    def _on_timer(self):
+        """Starts the deletion task for the messages that are due"""
+        self._timer = None
+        self._task = asyncio.ensure_future(self._delete_due_messages())
+
+    async def _delete_due_messages(self):
+        """Pops every message due in the BATCH_WINDOW and deletes them, grouped per channel"""
+        loop = asyncio.get_event_loop()
+        try:
+            limit = loop.time() + BATCH_WINDOW
+            messages_per_channel = defaultdict(list)
+            due_times = {}
+            while len(self._pending) > 0 and self._pending[0][0] <= limit:
+                due, _sequence, message = heapq.heappop(self._pending)
+                messages_per_channel[message.channel.id].append(message)
+                due_times[message.id] = due
+            for messages in messages_per_channel.values():
+                await self._delete_messages(messages)
+                done = loop.time()
+                for message in messages:
+                    latency = max(done - due_times[message.id], 0)
+                    self._stats["total_latency"] += latency
+                    self._stats["max_latency"] = max(
+                        self._stats["max_latency"], latency
+                    )
+        finally:
+            self._task = None
+            self._arm_timer(loop)
+
+    async def _delete_messages(self, messages):
+        """
+        Deletes messages from the same channel, in bulk when the channel allows it
+        Falls back to one call per message if the bulk deletion is refused
+        :param [Message] messages: Messages from a single channel
+        """
+        channel = messages[0].channel
+        remaining = messages
+        if len(messages) >= BULK_DELETE_MIN and hasattr(channel, "delete_messages"):
+            remaining = []
+            for start in range(0, len(messages), BULK_DELETE_MAX):
+                chunk = messages[start : start + BULK_DELETE_MAX]
+                if len(chunk) < BULK_DELETE_MIN:
+                    remaining.extend(chunk)
+                    continue
+                try:
+                    await channel.delete_messages(chunk)
+                    self._stats["deleted"] += len(chunk)
+                    self._stats["bulk_deletes"] += 1
+                except HTTPException:
+                    remaining.extend(chunk)
+        for message in remaining:
+            try:
+                await message.delete()
+                self._stats["deleted"] += 1
+            except HTTPException as error:
+                self._stats["failed"] += 1
+                logging.debug(f"Could not delete the message {message.id}: {error}")
+
+
+# --------------------------------------------------------------------------------
+# > Shared scheduler
+# --------------------------------------------------------------------------------
+_scheduler = None
+
+
+def get_deletion_scheduler():
+    """
+    :return: The process-wide deletion scheduler, created on first use
+    :rtype: DeletionScheduler
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = DeletionScheduler()
+    return _scheduler
+
+
+def get_deletion_stats():
+    """
+    :return: The queue depth and counters of the shared deletion scheduler
+    :rtype: dict
+    """
+    return get_deletion_scheduler().stats
@@ -0,0 +1,282 @@
+"""
+Array-backed dice pools, used by DiceRoll to roll large amounts of dice
+Each `NdS` group is sampled in one batched call to the RNG, vectorized if NumPy is installed
+Huge groups are stored as a histogram (number of dice per face) instead of one value per die
+"""
+
+# Built-in
+import os
+from collections import Counter
+
+try:
+    # Third-party
+    import numpy
+except ImportError:
+    numpy = None
+
+# Local
+from .rng import get_rng
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+# Histograms with more faces than this are summarized instead of listed
+MAX_LISTED_FACES = 20
+
+
+# --------------------------------------------------------------------------------
+# > Limits
+# --------------------------------------------------------------------------------
+_limits = None
+
+
+def get_dice_limits():
+    """
+    :return: The max number of dice in a roll, and the group size from which we use histograms
+    :rtype: dict
+    """
+    global _limits
+    if _limits is None:
+        _limits = {
+            "max_dice": int(os.getenv("DICE_MAX_COUNT", 1000000)),
+            "histogram_min_dice": int(os.getenv("DICE_HISTOGRAM_THRESHOLD", 1000)),
+        }
+    return _limits
+
+
+# --------------------------------------------------------------------------------
+# > Sampling
+# --------------------------------------------------------------------------------
+def sample(qty, sides, rng=None):
+    """
+    Rolls several dice of the same size in a single call
+    :param int qty: Number of dice to roll
+    :param int sides: Number of sides of each die
+    :param RandomSource rng: The generator to use (defaults to the shared one)
+    :return: The value of each die, or their histogram for huge groups
+    :rtype: list or numpy.ndarray or FaceCounts
+    """
+    rng = rng or get_rng()
+    if qty >= get_dice_limits()["histogram_min_dice"]:
+        return FaceCounts(rng.face_counts(qty, sides))
+    return rng.roll(qty, sides)
+
+
+# --------------------------------------------------------------------------------
+# > Array helpers
+# --------------------------------------------------------------------------------
+def concatenate(arrays):
+    """
+    :param [list or numpy.ndarray or FaceCounts] arrays: Several arrays of values
+    :return: A single array with all the values (a histogram if any of them is one)
+    :rtype: list or numpy.ndarray or FaceCounts
+    """
+    if len(arrays) == 1:
+        return arrays[0]
+    if any(isinstance(a, FaceCounts) for a in arrays):
+        return FaceCounts.merge(arrays)
+    if numpy is not None and any(isinstance(a, numpy.ndarray) for a in arrays):
+        return numpy.concatenate(arrays)
+    return [value for array in arrays for value in array]
+
+
+def sort_values(values, reverse=False):
+    """
+    :param list or numpy.ndarray or FaceCounts values: The values to sort
+    :param bool reverse: Whether to sort from highest to lowest
+    :return: The sorted values
+    :rtype: list or numpy.ndarray or FaceCounts
+    """
+    if isinstance(values, FaceCounts):
+        return FaceCounts(values.counts, descending=reverse)
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        values = numpy.sort(values)
+        return values[::-1] if reverse else values
+    return sorted(values, reverse=reverse)
+
+
+def total(values):
+    """
+    :param list or numpy.ndarray or FaceCounts values: The values to add up
+    :return: The sum of the values
+    :rtype: int
+    """
+    if isinstance(values, FaceCounts):
+        return values.total()
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return int(values.sum())
+    return sum(values)
+
+
+def to_list(values):
+    """
+    :param list or numpy.ndarray values: The values to convert
+    :return: The values as python ints
+    :rtype: [int]
+    """
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return values.tolist()
+    return list(values)
+
+
+def format_values(values):
+    """
+    :param list or numpy.ndarray or FaceCounts values: The values to display
+    :return: The values separated by commas, or the dice per face for histograms
+    :rtype: str
+    """
+    if not isinstance(values, FaceCounts):
+        return ", ".join([str(v) for v in to_list(values)])
+    faces = [(face, count) for face, count in values.items() if count > 0]
+    if len(faces) > MAX_LISTED_FACES:
+        return f"{len(values)} dice, {values.total() / len(values):.2f} on average"
+    return ", ".join([f"{face}x{count}" for face, count in faces])
+
+
+# --------------------------------------------------------------------------------
+# > Histogram
+# --------------------------------------------------------------------------------
+class FaceCounts:
+    """
+    Dice stored as the number of dice showing each face, sorted by value
+    Totals and slices cost O(sides) no matter how many dice there are
+    """
+
+    def __init__(self, counts, descending=False):
+        """
+        Creates the histogram
+        :param [int] counts: The number of dice per face, starting from the face 1
+        :param bool descending: Whether slices start from the highest dice
+        """
+        self.counts = counts
+        self.descending = descending
+        self._size = sum(counts)
+
+    def __len__(self):
+        """
+        :return: The number of dice
+        :rtype: int
+        """
+        return self._size
+
+    def __getitem__(self, item):
+        """
+        Selects the dice like a slice of the sorted values would
+        :param slice item: A slice without step, like `[:3]` or `[3:]`
+        :return: The selected dice
+        :rtype: FaceCounts
+        """
+        if not isinstance(item, slice) or item.step is not None:
+            raise TypeError("FaceCounts only support slices without step")
+        start, stop, _step = item.indices(self._size)
+        counts = [0] * len(self.counts)
+        position = 0
+        for face, count in self.items():
+            low, high = max(position, start), min(position + count, stop)
+            if high > low:
+                counts[face - 1] = high - low
+            position += count
+        return FaceCounts(counts, self.descending)
+
+    def items(self):
+        """
+        :return: The (face, count) pairs, in the sorting order
+        :rtype: iterator
+        """
+        pairs = enumerate(self.counts, start=1)
+        return reversed(list(pairs)) if self.descending else pairs
+
+    def total(self):
+        """
+        :return: The sum of all the dice
+        :rtype: int
+        """
+        return sum(face * count for face, count in enumerate(self.counts, start=1))
+
+    @classmethod
+    def merge(cls, arrays):
+        """
+        :param [list or numpy.ndarray or FaceCounts] arrays: Several arrays of values
+        :return: The histogram of all the values
+        :rtype: FaceCounts
+        """
+        counts = []
+        for array in arrays:
+            if isinstance(array, FaceCounts):
+                array_counts = array.counts
+            else:
+                counter = Counter(to_list(array))
+                array_counts = [
+                    counter[f] for f in range(1, max(counter, default=0) + 1)
+                ]
+            if len(array_counts) > len(counts):
+                counts.extend([0] * (len(array_counts) - len(counts)))
+            for index, count in enumerate(array_counts):
+                counts[index] += count
+        return FaceCounts(counts)
+
+
+# --------------------------------------------------------------------------------
+# > Dice pool
+# --------------------------------------------------------------------------------
+class DicePool:
+    """The dice of a DiceRoll, stored as one (qty, sides, values) entry per `NdS` group"""
+
+    def __init__(self):
+        """Creates an empty pool"""
+        self.groups = []
+
+    def __len__(self):
+        """
+        :return: The total number of dice in the pool
+        :rtype: int
+        """
+        return sum(qty for qty, _sides, _values in self.groups)
+
+    @property
+    def sides(self):
+        """
+        :return: The distinct die sizes in the pool
+        :rtype: {int}
+        """
+        return {sides for _qty, sides, _values in self.groups}
+
+    @property
+    def values(self):
+        """
+        :return: The value of every die, in the order they were added
+        :rtype: list or numpy.ndarray
+        """
+        return concatenate([values for _qty, _sides, values in self.groups])
+
+    def add(self, qty, sides):
+        """
+        Adds an `NdS` group of unrolled dice
+        :param int qty: Number of dice
+        :param int sides: Number of sides of each die
+        """
+        self.groups.append((qty, sides, None))
+
+    def roll(self, rng=None):
+        """
+        Rolls each group in a single batched call
+        :param RandomSource rng: The generator to use (defaults to the shared one)
+        :return: The sum of all the dice
+        :rtype: int
+        """
+        self.groups = [
+            (qty, sides, sample(qty, sides, rng)) for qty, sides, _ in self.groups
+        ]
+        return sum(total(values) for _qty, _sides, values in self.groups)
+
+    def values_per_sides(self):
+        """
+        :return: The values of the dice grouped by die size, in order of appearance
+        :rtype: dict
+        """
+        arrays_per_sides = {}
+        for _qty, sides, values in self.groups:
+            arrays_per_sides.setdefault(sides, []).append(values)
+        return {
+            sides: concatenate(arrays) for sides, arrays in arrays_per_sides.items()
+        }
@@ -1,24 +1,38 @@
 """Utilities shared across the whole cog"""
 
 # Built-in
-import random
+import functools
 import re
-
-# Third-party
-from discord import Color
+from collections import namedtuple
 
 # Local
-from .embed import create_embed, create_error_embed
+from .dice_engine import DicePool, get_dice_limits, sort_values, total
+from .rng import FAIR_RNG_BACKEND, get_rng
 from .settings import DEFAULT_USER_SETTINGS
 
 # --------------------------------------------------------------------------------
 # > Constants
 # --------------------------------------------------------------------------------
-DICE_REGEX = re.compile(r"(?P<qty>[1-9]\d{0,2})d(?P<sides>[1-9]\d{0,2})")
+DICE_REGEX = re.compile(r"(?P<qty>[1-9]\d{0,6})d(?P<sides>[1-9]\d{0,2})")
 SIMPLE_ACTION_REGEX = re.compile(r"adv|dis|crit")
-COMPLEX_ACTION_REGEX = re.compile(r"(?P<action>dl|dh|kl|kh)(?P<value>[1-9]\d{0,2})")
+COMPLEX_ACTION_REGEX = re.compile(r"(?P<action>dl|dh|kl|kh)(?P<value>[1-9]\d{0,6})")
 CHECK_REGEX = re.compile(r"(?P<comparator>=|!=|>|<|>=|<=)(?P<value>[1-9]\d{0,4})")
 MODIFIER_REGEX = re.compile(r"[-+][1-9]\d{0,4}")
+# All of the above in one regex. The alternatives are tried in the same order as
+# the regexes above, and the outer group of the matching one gives the token kind.
+TOKEN_REGEX = re.compile(
+    r"(?P<dice>(?P<qty>[1-9]\d{0,6})d(?P<sides>[1-9]\d{0,2}))"
+    r"|(?P<simple_action>adv|dis|crit)"
+    r"|(?P<complex_action>(?P<action>dl|dh|kl|kh)(?P<action_value>[1-9]\d{0,6}))"
+    r"|(?P<modifier>[-+][1-9]\d{0,4})"
+    r"|(?P<check>(?P<comparator>=|!=|>|<|>=|<=)(?P<check_value>[1-9]\d{0,4}))"
+)
+# Bump whenever the parsing or the tokens change, to invalidate the saved roll plans
+ENGINE_VERSION = 2
+ROLL_PLAN_CACHE_SIZE = 1024
+# Costs used by `DiceRoll.estimate_cost`, relative to rolling one listed die
+GROUP_COST = 100
+VERBOSE_DIE_COST = 10
 
 
 # --------------------------------------------------------------------------------
@@ -35,23 +49,61 @@ def generate_discord_markdown_string(lines):
     return "\n".join(output)
 
 
+def parse_instruction(instruction):
+    """
+    Converts an instruction into a token, a tuple that only contains JSON-friendly values:
+        ("dice", qty, sides)
+        ("action", name, value)
+        ("modifier", value)
+        ("check", comparator, value)
+    :param str instruction: The user's instruction, like "1d6" or "adv"
+    :return: The matching token, or None if the instruction is invalid
+    :rtype: tuple or None
+    """
+    match = TOKEN_REGEX.fullmatch(instruction)
+    if match is None:
+        return None
+    kind = match.lastgroup
+    if kind == "dice":
+        return "dice", int(match.group("qty")), int(match.group("sides"))
+    if kind == "simple_action":
+        return "action", instruction, 0
+    if kind == "complex_action":
+        return "action", match.group("action"), int(match.group("action_value"))
+    if kind == "modifier":
+        return "modifier", int(instruction)
+    return "check", match.group("comparator"), int(match.group("check_value"))
+
+
+def is_roll_instruction(text):
+    """
+    :param str text: Any text, like a shortcut name
+    :return: Whether the text would be understood as a roll instruction
+    :rtype: bool
+    """
+    return TOKEN_REGEX.fullmatch(text) is not None
+
+
 class Die:
     """A die you can roll"""
 
-    def __init__(self, sides):
+    def __init__(self, sides, value=None):
         """
         Creates a die of N sides that can be rolled
         :param int sides: Number of sides the die have
+        :param int value: The value of the die, if already rolled
         """
         self.sides = sides
-        self.value = None
+        self.value = value
 
-    def roll(self):
+    def roll(self, rng=None):
         """
+        :param RandomSource rng: The generator to use (defaults to the shared one)
         :return: Rolls the die and returns the value
         :rtype: int
         """
-        self.value = random.randint(1, self.sides)
+        rng = rng or get_rng()
+        self.value = rng.randint(1, self.sides)
         return self.value
 
     def copy(self):
@@ -83,13 +135,6 @@ class RollComponent:
         """Should update the `dice_roll.total`"""
         NotImplemented()
 
-    def update_embed(self, embed):
-        """
-        Should add a field and content to an existing embed
-        :param Embed embed: An existing discord Embed message
-        """
-        NotImplemented()
-
 
 # --------------------------------------------------------------------------------
 # > Modifier Component
@@ -116,24 +161,6 @@ class RollModifier(RollComponent):
         """Updates the DiceRoll total by adding the modifier value"""
         self.dice_roll.total += self.value
 
-    def update_embed(self, embed):
-        """
-        Adds a field which indicates the new total after the modifier was applied
-        :param Embed embed: The embed massage to update
-        """
-        if not self.dice_roll.settings["verbose"]:
-            return
-        sign = "+" if self.value > 0 else "-"
-        abs_value = abs(self.value)
-        previous_total = self.dice_roll.total - self.value
-        message = f"# {previous_total} {sign} {abs_value} = {self.dice_roll.total}"
-        text = generate_discord_markdown_string([message])
-        embed.add_field(
-            name=f"Modifier {sign}{abs_value}",
-            value=text,
-            inline=False,
-        )
-
 
 # --------------------------------------------------------------------------------
 # > Check Component
@@ -161,20 +188,6 @@ class RollCheck(RollComponent):
         """Compares the DiceRoll total to the provided value, using the comparator"""
         self.success = eval(f"{self.dice_roll.total} {self.comparator} {self.value}")
 
-    def update_embed(self, embed):
-        """
-        Updates the title and color of the message based on the check results
-        :param Embed embed: The embed message to update
-        """
-        if self.success:
-            color = Color.green()
-            title = f"Success with {self.dice_roll.total}!"
-        else:
-            color = Color.orange()
-            title = f"Failure with {self.dice_roll.total}!"
-        embed.title = title
-        embed.color = color
-
 
 # --------------------------------------------------------------------------------
 # > Action Component
@@ -222,8 +235,7 @@ class BaseAction(RollComponent):
 
     def _validate_one_die_type(self):
         """Adds an error if we have several dice types"""
-        dice_sides = {die.sides for die in self.dice_roll.dice}
-        if len(dice_sides) > 1:
+        if len(self.dice_roll.dice.sides) > 1:
             message = f"[Action] `{self.name}` action cannot be used with dice of different sizes."
             self.errors.append(message)
 
@@ -248,30 +260,14 @@ class Advantage(BaseAction):
 
     def apply(self):
         """Copies the existing die, re-rolls it, and keeps it if it's better"""
-        self.existing_die = self.dice_roll.dice[0]
+        (sides,) = self.dice_roll.dice.sides
+        # The only die, whether its values are a list, an array, or a histogram
+        self.existing_die = Die(sides, total(self.dice_roll.dice.values))
         self.die = self.existing_die.copy()
-        self.die.roll()
+        self.die.roll(self.dice_roll.rng)
         if self.die.value > self.existing_die.value:
             self.dice_roll.total = self.die.value
 
-    def update_embed(self, embed):
-        """
-        Adds a field with the action result
-        :param Embed embed: Embed message to update
-        """
-        if not self.dice_roll.settings["verbose"]:
-            return
-        if self.die.value > self.existing_die.value:
-            result = f"Rolled {self.die.value} and kept it!"
-        else:
-            result = f"Rolled {self.die.value} and discarded it!"
-        text = generate_discord_markdown_string([result])
-        embed.add_field(
-            name=self.name,
-            value=text,
-            inline=False,
-        )
-
 
 class Disadvantage(BaseAction):
     """Action to roll a second die and keep the worse one"""
@@ -293,30 +289,14 @@ class Disadvantage(BaseAction):
 
     def apply(self):
         """Copies the existing die, re-rolls it, and keeps it if it's worse"""
-        self.existing_die = self.dice_roll.dice[0]
+        (sides,) = self.dice_roll.dice.sides
+        # The only die, whether its values are a list, an array, or a histogram
+        self.existing_die = Die(sides, total(self.dice_roll.dice.values))
         self.die = self.existing_die.copy()
-        self.die.roll()
+        self.die.roll(self.dice_roll.rng)
         if self.die.value < self.existing_die.value:
             self.dice_roll.total = self.die.value
 
-    def update_embed(self, embed):
-        """
-        Adds a field with the action result
-        :param Embed embed: Embed message to update
-        """
-        if not self.dice_roll.settings["verbose"]:
-            return
-        if self.die.value < self.existing_die.value:
-            result = f"Rolled {self.die.value} and kept it!"
-        else:
-            result = f"Rolled {self.die.value} and discarded it!"
-        text = generate_discord_markdown_string([result])
-        embed.add_field(
-            name=self.name,
-            value=text,
-            inline=False,
-        )
-
 
 class CriticalHit(BaseAction):
     """Action to make a critical hit and double your dice/damage output"""
@@ -333,24 +313,6 @@ class CriticalHit(BaseAction):
         self.dice_roll.total *= 2
         self.after_total = self.dice_roll.total
 
-    def update_embed(self, embed):
-        """
-        Adds a field indicating the new total
-        :param Embed embed: Embed message to update
-        """
-        if not self.dice_roll.settings["verbose"]:
-            return
-        messages = [
-            "All your dice scores are multiplied by 2",
-            f"# {self.before_total} x 2 = {self.after_total}",
-        ]
-        text = generate_discord_markdown_string(messages)
-        embed.add_field(
-            name=self.name,
-            value=text,
-            inline=False,
-        )
-
 
 class KeepDropAction(BaseAction):
     """Action to keep or drop dice"""
@@ -364,8 +326,8 @@ class KeepDropAction(BaseAction):
         :param bool high: Whether the remaining dice are the highest (or lowest)
         """
         super().__init__(dice_roll)
-        self.remaining_dice = []
-        self.discarded_dice = []
+        self.remaining_values = []
+        self.discarded_values = []
         self.amount = amount
         self.keep = keep
         self.high = high
@@ -381,51 +343,29 @@ class KeepDropAction(BaseAction):
         Keeps/drops the dice by splitting them into `remaining` and `discarded`
         Then updates the total by add the `remaining` only
         """
-        dice = self.dice_roll.dice.copy()
-        dice.sort(key=lambda x: x.value, reverse=self.high)
+        values = sort_values(self.dice_roll.dice.values, reverse=self.high)
         if self.keep:
             # Keep High
             if self.high:
-                self.remaining_dice = dice[: self.amount]
-                self.discarded_dice = dice[self.amount :]
+                self.remaining_values = values[: self.amount]
+                self.discarded_values = values[self.amount :]
             # Keep Low
             else:
-                self.remaining_dice = dice[self.amount :]
-                self.discarded_dice = dice[: self.amount]
+                self.remaining_values = values[self.amount :]
+                self.discarded_values = values[: self.amount]
         else:
             # Drop High
             if self.high:
-                self.remaining_dice = dice[self.amount :]
-                self.discarded_dice = dice[: self.amount]
+                self.remaining_values = values[self.amount :]
+                self.discarded_values = values[: self.amount]
             # Drop Low
             else:
-                self.remaining_dice = dice[: self.amount]
-                self.discarded_dice = dice[self.amount :]
+                self.remaining_values = values[: self.amount]
+                self.discarded_values = values[self.amount :]
         self.before_total = self.dice_roll.total
-        self.dice_roll.total = sum([die.value for die in self.remaining_dice])
+        self.dice_roll.total = total(self.remaining_values)
         self.after_total = self.dice_roll.total
 
-    def update_embed(self, embed):
-        """
-        Adds a field which list the discarded and remaining dice
-        :param Embed embed: The embed message to update
-        """
-        if not self.dice_roll.settings["verbose"]:
-            return
-        remaining_values = [str(die.value) for die in self.remaining_dice]
-        discarded_values = [str(die.value) for die in self.discarded_dice]
-        messages = [
-            f"[Discarded dice]({', '.join(discarded_values)})",
-            f"[Remaining dice]({', '.join(remaining_values)})",
-            f"Went down from {self.before_total} to {self.after_total}",
-        ]
-        text = generate_discord_markdown_string(messages)
-        embed.add_field(
-            name=self.name,
-            value=text,
-            inline=False,
-        )
-
     def _compute_name(self):
         """
         :return: Computes and returns the action name based on its attributes
@@ -449,18 +389,29 @@ class KeepDropAction(BaseAction):
 # > Dice Roll
 # --------------------------------------------------------------------------------
 class DiceRoll:
-    """The state and action of rolling dice with various options"""
+    """
+    The state and result of rolling dice with various options
+    The parsing and validation are done once by its RollPlan, which can be shared
+    """
 
-    def __init__(self, instructions, settings):
+    def __init__(self, instructions, settings, plan=None, rng=None):
         """
-        Initializes the state, then parses and validates the instructions
+        Initializes the state from the plan of the instructions
         :param [str] instructions: The user's instructions, like "1d6" or "adv"
         :param dict settings: The settings to use in ths roll
+        :param RollPlan plan: The compiled instructions (fetched from the cache if None)
+        :param RandomSource rng: The generator to use (defaults to the shared one)
         """
+        if plan is None:
+            plan = get_roll_plan(instructions)
+        self.plan = plan
         self.instructions = instructions
         self.settings = {**DEFAULT_USER_SETTINGS, **settings}
+        if rng is None:
+            rng = get_rng(FAIR_RNG_BACKEND if self.settings["fair"] else None)
+        self.rng = rng
         # Roll parameters
-        self.dice = []
+        self.dice = DicePool()
         self.modifier = None
         self.action = None
         self.check = None
@@ -471,10 +422,9 @@ class DiceRoll:
         self.action_counter = 0
         self.check_counter = 0
         self.modifier_counter = 0
-        self._errors = []
-        # Parsing
-        self._parse_instructions()
-        self._validate()
+        self._errors = list(plan.errors)
+        for token in plan.tokens:
+            self._add_token(token)
 
     # ----------------------------------------
     # API properties
@@ -508,148 +458,81 @@ class DiceRoll:
             component_errors.extend(component.errors)
         return self._errors + component_errors
 
-    @property
-    def errors_as_embed(self):
-        """
-        :return: Formats the errors into a Discord Embed
-        :rtype: Embed
-        """
-        description = "\n".join(self.errors)
-        return create_error_embed(description=description)
-
-    @property
-    def result_as_embed(self):
-        """
-        :return: Formats our instance's result into a Discord Embed
-        :rtype: Embed
-        """
-        title = f"You rolled {self.total}"
-        embed = create_embed(title=title)
-        if self.settings["verbose"]:
-            self._update_embed_with_dice_rolls(embed)
-        for component in self.components:
-            # "verbose" is handled individually in each component
-            component.update_embed(embed)
-        return embed
-
     # ----------------------------------------
     # API methods
     # ----------------------------------------
     def roll(self):
         """
-        If valid: rolls the dice, applies all components, and returns the results
-        Else: returns the errors
-        :return: The embed results or errors
-        :rtype: Embed
+        If valid: rolls the dice and applies all components. Else: does nothing.
+        Nothing is formatted here, see `utils.renderer` to display the result.
         """
         # Maybe skip
         if self.rolled:
             raise RuntimeError("This DiceRoll has already been rolled")
         if not self.is_valid:
-            return self.errors_as_embed
+            return
         # Do roll
-        for die in self.dice:
-            self.total += die.roll()
+        self.total += self.dice.roll(self.rng)
         for component in self.components:
             component.apply()
         self.rolled = True
-        return self.result_as_embed
+
+    def estimate_cost(self):
+        """
+        Estimates the work of rolling and rendering the roll, without rolling it
+        Histogram groups cost what our generator needs to count their faces, while
+        listed dice cost more when verbose, as each of them is turned into text
+        (twice with keep/drop actions)
+        :return: The estimated cost, in listed dice (0 if the roll is invalid)
+        :rtype: int
+        """
+        if not self.is_valid:
+            return 0
+        histogram_min_dice = get_dice_limits()["histogram_min_dice"]
+        cost = 0
+        listed_dice = 0
+        for qty, sides, _values in self.dice.groups:
+            cost += GROUP_COST
+            if qty >= histogram_min_dice:
+                cost += self.rng.face_counts_cost(qty, sides)
+            else:
+                listed_dice += qty
+        cost += listed_dice
+        if self.settings["verbose"]:
+            text_count = 2 if isinstance(self.action, KeepDropAction) else 1
+            cost += listed_dice * VERBOSE_DIE_COST * text_count
+        return cost
 
     def copy(self):
         """
-        :return: A new DiceRoll using our instance's instructions and settings
+        :return: A new DiceRoll using our instance's instructions, settings, and RNG
         :rtype: DiceRoll
         """
-        return DiceRoll(self.instructions, self.settings)
+        return DiceRoll(self.instructions, self.settings, self.plan, self.rng)
 
     # ----------------------------------------
     # Helpers: parsing
     # ----------------------------------------
-    def _parse_instructions(self):
-        """Tries to parse all instruction using our regexes"""
-        parsing_functions = [
-            self._maybe_parse_dice,
-            self._maybe_parse_action,
-            self._maybe_parse_modifier,
-            self._maybe_parse_check,
-        ]
-        for instruction in self.instructions:
-            for parsing_func in parsing_functions:
-                if parsing_func(instruction):
-                    break
-            else:
-                message = (
-                    f"[Instruction] Did not understand the instruction: `{instruction}`"
-                )
-                self._errors.append(message)
-
-    def _maybe_parse_dice(self, instruction):
-        """
-        Checks if the instruction is a dice roll
-        :param str instruction: String to parse
-        :return: Whether it was a match
-        :rtype: bool
-        """
-        match = re.fullmatch(DICE_REGEX, instruction)
-        if match is not None:
-            qty = int(match.group("qty"))
-            sides = int(match.group("sides"))
-            for i in range(qty):
-                self.dice.append(Die(sides))
-            return True
-        return False
-
-    def _maybe_parse_action(self, instruction):
-        """
-        Checks if the instruction is an action call
-        :param str instruction: String to parse
-        :return: Whether it was a match
-        :rtype: bool
-        """
-        match = re.fullmatch(SIMPLE_ACTION_REGEX, instruction)
-        if match is not None:
-            self.action = create_roll_action(self, instruction)
+    def _add_token(self, token):
+        """
+        Updates the roll parameters based on a parsed instruction
+        :param tuple token: A token created by `parse_instruction`
+        """
+        kind = token[0]
+        if kind == "dice":
+            _, qty, sides = token
+            self.dice.add(qty, sides)
+        elif kind == "action":
+            _, name, value = token
+            self.action = create_roll_action(self, name, value)
             self.action_counter += 1
-            return True
-        match = re.fullmatch(COMPLEX_ACTION_REGEX, instruction)
-        if match is not None:
-            action_text = match.group("action")
-            value = int(match.group("value"))
-            self.action = create_roll_action(self, action_text, value)
-            self.action_counter += 1
-            return True
-        return False
-
-    def _maybe_parse_modifier(self, instruction):
-        """
-        Checks if the instruction is to apply a modifier
-        :param str instruction: String to parse
-        :return: Whether it was a match
-        :rtype: bool
-        """
-        match = re.fullmatch(MODIFIER_REGEX, instruction)
-        if match is not None:
-            value = int(instruction)
-            self.modifier = RollModifier(self, value)
+        elif kind == "modifier":
+            self.modifier = RollModifier(self, token[1])
             self.modifier_counter += 1
-            return True
-        return False
-
-    def _maybe_parse_check(self, instruction):
-        """
-        Checks if the instruction is roll check/condition
-        :param str instruction: String to parse
-        :return: Whether it was a match
-        :rtype: bool
-        """
-        match = re.fullmatch(CHECK_REGEX, instruction)
-        if match is not None:
-            comparator = match.group("comparator")
-            value = int(match.group("value"))
+        elif kind == "check":
+            _, comparator, value = token
             self.check = RollCheck(self, comparator, value)
             self.check_counter += 1
-            return True
-        return False
 
     # ----------------------------------------
     # Helpers: validation
@@ -660,6 +543,11 @@ class DiceRoll:
         if len(self.dice) == 0:
             message = "[Dice] You must provide at least one die (example: `1d6`)"
             self._errors.append(message)
+        # Not too many dice
+        max_dice = get_dice_limits()["max_dice"]
+        if len(self.dice) > max_dice:
+            message = f"[Dice] You cannot roll more than `{max_dice}` dice (provided: `{len(self.dice)}`)"
+            self._errors.append(message)
         # Has 1 component of each max
         for text, counter in zip(
             ["Action", "Modifier", "Check"],
@@ -674,31 +562,93 @@ class DiceRoll:
         for component in self.components:
             component.validate()
 
-    # ----------------------------------------
-    # Helpers: output
-    # ----------------------------------------
-    def _update_embed_with_dice_rolls(self, embed):
-        """
-        Adds a `Dice` recap to the embed
-        :param Embed embed: The embed to update
-        """
-        dice_per_sides = {}
-        for die in self.dice:
-            existing_list = dice_per_sides.get(die.sides, [])
-            existing_list.append(die.value)
-            dice_per_sides[die.sides] = existing_list
-        lines = []
-        total_score = 0
-        for sides, values in dice_per_sides.items():
-            line_score = sum(values)
-            total_score += line_score
-            string_values = [str(v) for v in values]
-            line = f"[{len(values)}d{sides}]({', '.join(string_values)}) = {line_score}"
-            lines.append(line)
-        lines.append(f"# {total_score}")
-        text = generate_discord_markdown_string(lines)
-        embed.add_field(
-            name="Dice rolls",
-            value=text,
-            inline=False,
-        )
+
+# --------------------------------------------------------------------------------
+# > Roll Plan
+# --------------------------------------------------------------------------------
+class RollPlan(namedtuple("RollPlan", ["instructions", "tokens", "errors"])):
+    """
+    The parsed and validated instructions of a roll, immutable and hashable
+    The same plan can be executed any number of times, with any settings
+    """
+
+    __slots__ = ()
+
+    @property
+    def is_valid(self):
+        """
+        :return: Whether the plan can be executed
+        :rtype: bool
+        """
+        return len(self.errors) == 0
+
+    def execute(self, settings, rng=None):
+        """
+        :param dict settings: The settings to use in the roll
+        :param RandomSource rng: The generator to use (defaults to the shared one)
+        :return: A new DiceRoll for this plan, ready to be rolled
+        :rtype: DiceRoll
+        """
+        return DiceRoll(list(self.instructions), settings, self, rng)
+
+
+def create_roll_plan(instructions, tokens=None):
+    """
+    Parses and validates the instructions, bypassing the cache
+    :param [str] instructions: The user's instructions, like "1d6" or "adv"
+    :param [tuple] tokens: The already parsed instructions, to skip the parsing
+    :return: The compiled plan
+    :rtype: RollPlan
+    """
+    errors = []
+    if tokens is None:
+        tokens = []
+        for instruction in instructions:
+            token = parse_instruction(instruction)
+            if token is not None:
+                tokens.append(token)
+            else:
+                message = (
+                    f"[Instruction] Did not understand the instruction: `{instruction}`"
+                )
+                errors.append(message)
+    # The validation only depends on the tokens, so we check them on a blank roll
+    unchecked_plan = RollPlan(tuple(instructions), tuple(tokens), tuple(errors))
+    dice_roll = DiceRoll(list(instructions), {}, unchecked_plan)
+    dice_roll._validate()
+    return unchecked_plan._replace(errors=tuple(dice_roll.errors))
+
+
+@functools.lru_cache(maxsize=ROLL_PLAN_CACHE_SIZE)
+def _get_cached_roll_plan(instructions):
+    """
+    :param (str) instructions: The normalized instructions
+    :return: The compiled plan
+    :rtype: RollPlan
+    """
+    return create_roll_plan(instructions)
+
+
+def get_roll_plan(instructions):
+    """
+    :param [str] instructions: The user's instructions, like "1d6" or "adv"
+    :return: The compiled plan, from the LRU cache if those instructions were seen before
+    :rtype: RollPlan
+    """
+    return _get_cached_roll_plan(tuple(instructions))
+
+
+def get_roll_plan_cache_stats():
+    """
+    :return: The size and hit rate of the roll plan cache
+    :rtype: dict
+    """
+    info = _get_cached_roll_plan.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups > 0 else 0,
+    }
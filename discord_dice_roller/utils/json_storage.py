@@ -0,0 +1,490 @@
+"""JSON storage backends for our settings"""
+
+# Built-in
+import atexit
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+
+# --------------------------------------------------------------------------------
+# > Cache
+# --------------------------------------------------------------------------------
+class JSONFileCache:
+    """
+    Process-wide cache for our JSON settings files
+    Each file is parsed once and kept in memory until its mtime or size changes
+    Files with unsaved changes are always served from memory
+    """
+
+    def __init__(self):
+        """Initializes an empty cache and its counters"""
+        self._entries = {}
+        self._dirty = set()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        """
+        :return: The cache counters and the number of cached files
+        :rtype: dict
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total > 0 else 0.0,
+            "files": len(self._entries),
+        }
+
+    def read(self, filepath):
+        """
+        Returns the content of the file, reloading it only if it changed on disk
+        A missing file is considered empty
+        The returned dict is shared and must not be mutated
+        :param str filepath: The path to the file
+        :return: The parsed content of the file
+        :rtype: dict
+        """
+        entry = self._entries.get(filepath)
+        if entry is not None and filepath in self._dirty:
+            self.hits += 1
+            return entry[1]
+        signature = self._get_signature(filepath)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        if signature is None:
+            file_content = {}
+        else:
+            with open(filepath, "r") as f:
+                file_content = json.load(f)
+        self._entries[filepath] = (signature, file_content)
+        return file_content
+
+    def set_key(self, filepath, key, value):
+        """
+        Updates a key in memory only and marks the file as dirty
+        :param str filepath: The path to the file
+        :param str key: The key to update
+        :param value: The value for said key
+        """
+        file_content = self.read(filepath)
+        file_content[key] = value
+        self._dirty.add(filepath)
+
+    def take_snapshot(self, filepath):
+        """
+        Marks the file as clean and returns a copy of its content, ready to be written
+        :param str filepath: The path to the file
+        :return: A shallow copy of the content, or None if the file was not dirty
+        :rtype: dict or None
+        """
+        if filepath not in self._dirty:
+            return None
+        self._dirty.discard(filepath)
+        return dict(self._entries[filepath][1])
+
+    def mark_dirty(self, filepath):
+        """
+        Flags a cached file as having unsaved changes
+        :param str filepath: The path to the file
+        """
+        if filepath in self._entries:
+            self._dirty.add(filepath)
+
+    def write(self, filepath, file_content):
+        """
+        Atomically writes the content to the file, then refreshes its signature
+        The content is written in a temporary file which then replaces the real one
+        :param str filepath: The path to the file
+        :param dict file_content: The full content of the file
+        """
+        folder, filename = os.path.split(filepath)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=folder, prefix=f".{filename}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(file_content, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        entry = self._entries.get(filepath)
+        content = entry[1] if entry is not None else file_content
+        self._entries[filepath] = (self._get_signature(filepath), content)
+
+    def invalidate(self, filepath=None):
+        """
+        Drops a file from the cache, or the whole cache if no filepath is given
+        Unsaved changes of the dropped files are lost
+        :param str filepath: The path to the file
+        """
+        if filepath is None:
+            self._entries.clear()
+            self._dirty.clear()
+        else:
+            self._entries.pop(filepath, None)
+            self._dirty.discard(filepath)
+
+    @staticmethod
+    def _get_signature(filepath):
+        """
+        :param str filepath: The path to the file
+        :return: The mtime and size of the file (None if missing), used to detect changes
+        :rtype: (int, int) or None
+        """
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+SETTINGS_CACHE = JSONFileCache()
+
+
+# --------------------------------------------------------------------------------
+# > JSON storage
+# --------------------------------------------------------------------------------
+class JSONStorage:
+    """
+    Stores each settings file as a single JSON file, read through our cache
+    Updates are applied in memory at once and written to disk in coalesced batches,
+    either after `flush_interval` seconds or once `flush_threshold` updates are pending
+    """
+
+    def __init__(self, cache=None, flush_interval=0, flush_threshold=1):
+        """
+        Initializes the storage and its write-behind buffer
+        :param JSONFileCache cache: The cache to use (defaults to the global one)
+        :param float flush_interval: Max delay before pending updates are written (0 to write at once)
+        :param int flush_threshold: Number of pending updates that triggers a flush
+        """
+        self.cache = cache if cache is not None else SETTINGS_CACHE
+        self.flush_interval = flush_interval
+        self.flush_threshold = max(1, flush_threshold)
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._pending = {}
+        # Stats
+        self.flush_count = 0
+        self.flushed_updates = 0
+        self.max_batch_size = 0
+        self.total_flush_duration = 0.0
+        self.max_flush_duration = 0.0
+        atexit.register(self.flush)
+
+    @property
+    def flush_stats(self):
+        """
+        :return: The write-behind counters, durations are in seconds
+        :rtype: dict
+        """
+        with self._lock:
+            pending = sum(self._pending.values())
+        count = max(self.flush_count, 1)
+        return {
+            "flush_count": self.flush_count,
+            "pending_updates": pending,
+            "flushed_updates": self.flushed_updates,
+            "avg_batch_size": self.flushed_updates / count,
+            "max_batch_size": self.max_batch_size,
+            "avg_flush_duration": self.total_flush_duration / count,
+            "max_flush_duration": self.max_flush_duration,
+        }
+
+    @staticmethod
+    def init_files(filepaths):
+        """
+        Creates the missing JSON files
+        :param [str] filepaths: The paths of the settings files
+        """
+        for path in filepaths:
+            if os.path.exists(path):
+                continue
+            with open(path, "w") as f:
+                json.dump({}, f)
+
+    def get(self, filepath, key, default=None):
+        """
+        :param str filepath: The path to the file
+        :param str key: The key to fetch
+        :param default: The value to return if no key is found
+        :return: A copy of the value at the key (or the default value)
+        """
+        path = self._get_path(filepath, key)
+        with self._lock:
+            file_content = self.cache.read(path)
+            return copy.deepcopy(file_content.get(key, default))
+
+    def get_many(self, requests):
+        """
+        :param requests: List of (filepath, key, default) tuples
+        :return: A copy of the value of each request, in the same order
+        :rtype: list
+        """
+        with self._lock:
+            return [self.get(*request) for request in requests]
+
+    def items(self, filepath):
+        """
+        :param str filepath: The path to the file
+        :return: A copy of every (key, value) pair of the file
+        :rtype: [(str, object)]
+        """
+        with self._lock:
+            file_content = self.cache.read(filepath)
+            return list(copy.deepcopy(file_content).items())
+
+    def update(self, filepath, key, value):
+        """
+        Updates the key in memory and schedules the write of the file
+        :param str filepath: The path to the file
+        :param str key: The key to update
+        :param value: The value for said key
+        """
+        path = self._get_path(filepath, key)
+        with self._lock:
+            self.cache.set_key(path, key, copy.deepcopy(value))
+            self._pending[path] = self._pending.get(path, 0) + 1
+            pending = sum(self._pending.values())
+            if pending < self.flush_threshold and self.flush_interval > 0:
+                self._maybe_start_timer()
+                return
+        self.flush()
+
+    def flush(self):
+        """Writes every file with pending updates to disk"""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                pending, self._pending = self._pending, {}
+                snapshots = {
+                    filepath: self.cache.take_snapshot(filepath) for filepath in pending
+                }
+            if len(pending) == 0:
+                return
+            start = time.perf_counter()
+            for filepath, snapshot in snapshots.items():
+                if snapshot is None:
+                    continue
+                try:
+                    self.cache.write(filepath, snapshot)
+                except Exception:
+                    self._restore_pending(filepath, pending[filepath])
+                    raise
+            duration = time.perf_counter() - start
+            self._record_flush(sum(pending.values()), duration)
+
+    def close(self):
+        """Writes the pending updates to disk"""
+        self.flush()
+        atexit.unregister(self.flush)
+
+    # ----------------------------------------
+    # Helpers
+    # ----------------------------------------
+    @staticmethod
+    def _get_path(filepath, key):
+        """
+        :param str filepath: The path to the settings file
+        :param str key: The key to read or write
+        :return: The path of the JSON file that holds the key
+        :rtype: str
+        """
+        return filepath
+
+    def _maybe_start_timer(self):
+        """Starts the flush timer if none is running"""
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(self.flush_interval, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _restore_pending(self, filepath, count):
+        """
+        Puts back the updates of a file whose flush failed, so they are retried later
+        :param str filepath: The path to the file
+        :param int count: Number of updates that were not written
+        """
+        with self._lock:
+            self.cache.mark_dirty(filepath)
+            self._pending[filepath] = self._pending.get(filepath, 0) + count
+            self._maybe_start_timer()
+
+    def _record_flush(self, batch_size, duration):
+        """
+        Updates the flush counters
+        :param int batch_size: Number of updates written by this flush
+        :param float duration: Duration of the flush, in seconds
+        """
+        self.flush_count += 1
+        self.flushed_updates += batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.total_flush_duration += duration
+        self.max_flush_duration = max(self.max_flush_duration, duration)
+        logging.debug(
+            f"Flushed {batch_size} settings updates in {duration * 1000:.2f}ms"
+        )
+
+
+# --------------------------------------------------------------------------------
+# > Sharded JSON storage
+# --------------------------------------------------------------------------------
+class ShardedJSONStorage(JSONStorage):
+    """
+    Splits each settings file into hash-bucketed shards stored in a folder
+    "user_settings.json" becomes "user_settings/0042.json", so an update only
+    rewrites the few entities that share its shard, no matter the total count
+    """
+
+    META_FILENAME = "shards.json"
+
+    def __init__(self, shard_count, **kwargs):
+        """
+        Initializes the storage
+        :param int shard_count: Number of shards for new folders (existing ones keep theirs)
+        :param kwargs: The JSONStorage options
+        """
+        super().__init__(**kwargs)
+        self.shard_count = shard_count
+        self._shard_counts = {}
+
+    def init_files(self, filepaths):
+        """
+        Creates the missing shard folders. Shard files are created on first write.
+        :param [str] filepaths: The paths of the settings files
+        """
+        for filepath in filepaths:
+            self._load_shard_count(filepath)
+
+    def items(self, filepath):
+        """
+        :param str filepath: The path to the settings file
+        :return: A copy of every (key, value) pair of every shard
+        :rtype: [(str, object)]
+        """
+        folder = get_shard_folder(filepath)
+        items = []
+        with self._lock:
+            for shard in range(self._load_shard_count(filepath)):
+                path = get_shard_path(folder, shard)
+                items.extend(copy.deepcopy(self.cache.read(path)).items())
+        return items
+
+    # ----------------------------------------
+    # Helpers
+    # ----------------------------------------
+    def _get_path(self, filepath, key):
+        """
+        :param str filepath: The path to the settings file
+        :param str key: The key to read or write
+        :return: The path of the shard that holds the key
+        :rtype: str
+        """
+        shard_count = self._load_shard_count(filepath)
+        return get_shard_path(get_shard_folder(filepath), get_shard(key, shard_count))
+
+    def _load_shard_count(self, filepath):
+        """
+        Reads the shard count of a folder, or creates the folder with our own count
+        :param str filepath: The path to the settings file
+        :return: The number of shards in the folder
+        :rtype: int
+        """
+        shard_count = self._shard_counts.get(filepath)
+        if shard_count is not None:
+            return shard_count
+        folder = get_shard_folder(filepath)
+        shard_count = init_shard_folder(folder, self.shard_count)
+        self._shard_counts[filepath] = shard_count
+        return shard_count
+
+
+def get_shard(key, shard_count):
+    """
+    :param str key: The user/guild id
+    :param int shard_count: The number of shards
+    :return: The index of the shard holding the key, stable across processes
+    :rtype: int
+    """
+    return zlib.crc32(key.encode()) % shard_count
+
+
+def get_shard_folder(filepath):
+    """
+    :param str filepath: The path to a settings file, like ".../user_settings.json"
+    :return: The path to its shard folder, like ".../user_settings"
+    :rtype: str
+    """
+    return os.path.splitext(filepath)[0]
+
+
+def get_shard_path(folder, shard):
+    """
+    :param str folder: The shard folder
+    :param int shard: The index of the shard
+    :return: The path to the shard file
+    :rtype: str
+    """
+    return os.path.join(folder, f"{shard:04d}.json")
+
+
+def init_shard_folder(folder, shard_count):
+    """
+    Creates the shard folder and its metadata if missing
+    :param str folder: The shard folder
+    :param int shard_count: The number of shards to use if the folder is new
+    :return: The number of shards of the folder
+    :rtype: int
+    """
+    meta_path = os.path.join(folder, ShardedJSONStorage.META_FILENAME)
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            return json.load(f)["shard_count"]
+    os.makedirs(folder, exist_ok=True)
+    with open(meta_path, "w") as f:
+        json.dump({"shard_count": shard_count}, f)
+    return shard_count
+
+
+def split_json_file(filepath, shard_count):
+    """
+    Splits a monolithic JSON settings file into its shard folder
+    The original file is left untouched
+    :param str filepath: The path to the settings file
+    :param int shard_count: The number of shards to use if the folder is new
+    :return: The number of migrated entities
+    :rtype: int
+    """
+    if not os.path.exists(filepath):
+        return 0
+    with open(filepath, "r") as f:
+        file_content = json.load(f)
+    folder = get_shard_folder(filepath)
+    shard_count = init_shard_folder(folder, shard_count)
+    shards = {}
+    for key, value in file_content.items():
+        shards.setdefault(get_shard(key, shard_count), {})[key] = value
+    cache = JSONFileCache()
+    for shard, shard_content in shards.items():
+        path = get_shard_path(folder, shard)
+        existing_content = cache.read(path)
+        cache.write(path, {**existing_content, **shard_content})
+    return len(file_content)
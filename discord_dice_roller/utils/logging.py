@@ -1,26 +1,131 @@
-"""Utilities for logging"""
+"""
+Utilities for logging
+Records are pushed to a bounded queue, and a background thread writes them to the handlers,
+so that logging never does any file I/O on the event loop thread
+"""
 
 # Built-in
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # --------------------------------------------------------------------------------
-# > Main
+# > Constants
 # --------------------------------------------------------------------------------
 LOG_FILE = os.path.join(os.getcwd(), "console.log")
+LOG_FORMATS = ["text", "json"]
+# Attributes of every LogRecord, the others come from the `extra` argument
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+# --------------------------------------------------------------------------------
+# > Handlers
+# --------------------------------------------------------------------------------
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops the record instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        """
+        Initializes the handler and its counters
+        :param Queue log_queue: The bounded queue read by the listener
+        """
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+
+    def enqueue(self, record):
+        """
+        Adds the record to the queue, or counts it as dropped if the queue is full
+        :param LogRecord record: The prepared record
+        """
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+class CommandCallSampler(logging.Filter):
+    """Only keeps a ratio of the command call records, which are the most frequent ones"""
+
+    def __init__(self, rate):
+        """
+        Initializes the filter and its counter
+        :param float rate: The ratio of command calls to keep, between 0 and 1
+        """
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record):
+        """
+        :param LogRecord record: Any record
+        :return: Whether the record should be logged
+        :rtype: bool
+        """
+        if not getattr(record, "command_call", False) or self.rate >= 1:
+            return True
+        if random.random() < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats each record as a single JSON line, with its `extra` fields"""
+
+    def format(self, record):
+        """
+        :param LogRecord record: The record to format
+        :return: The JSON line
+        :rtype: str
+        """
+        data = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "location": f"{record.module}.{record.funcName}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+# --------------------------------------------------------------------------------
+# > Main
+# --------------------------------------------------------------------------------
+_listener = None
+_queue_handler = None
+_sampler = None
 
 
 def setup_logging():
     """
-    Setups 2 loggers for INFO+ message:
+    Setups 2 handlers for INFO+ message, fed by a background queue listener:
         1 RotatingFileHandler
         1 StreamHandler which outputs in the console
+    The format ("text" or "json"), the queue size, and the ratio of command calls
+    to log come from the LOG_FORMAT, LOG_QUEUE_SIZE, and LOG_COMMAND_SAMPLE_RATE env variables
     """
-    formatter = logging.Formatter(
-        "%(asctime)s | %(levelname)s | %(module)s.%(funcName)s:%(lineno)d | %(message)s",
-        "%Y-%m-%d %H:%M:%S",
-    )
+    global _listener, _queue_handler, _sampler
+    log_format = os.getenv("LOG_FORMAT", "text")
+    if log_format not in LOG_FORMATS:
+        raise ValueError(
+            f"LOG_FORMAT must be one of {LOG_FORMATS} (got '{log_format}')"
+        )
+    if log_format == "json":
+        formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s | %(levelname)s | %(module)s.%(funcName)s:%(lineno)d | %(message)s",
+            "%Y-%m-%d %H:%M:%S",
+        )
     # RotatingFileHandler
     rotating_file_handler = RotatingFileHandler(
         LOG_FILE, maxBytes=100000, backupCount=10
@@ -31,8 +136,42 @@ def setup_logging():
     stream_handler = logging.StreamHandler()
     stream_handler.setLevel(logging.INFO)
     stream_handler.setFormatter(formatter)
+    # Queue
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+    _queue_handler = DroppingQueueHandler(log_queue)
+    # Only merges the message with its args (and traceback), the listener does the rest
+    _queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    _sampler = CommandCallSampler(float(os.getenv("LOG_COMMAND_SAMPLE_RATE", 1)))
+    _queue_handler.addFilter(_sampler)
+    _listener = QueueListener(
+        log_queue, rotating_file_handler, stream_handler, respect_handler_level=True
+    )
+    _listener.start()
     # Update the config
     logging.basicConfig(
-        handlers=[rotating_file_handler, stream_handler],
+        handlers=[_queue_handler],
         level=logging.INFO,
     )
+
+
+def stop_logging():
+    """Writes the queued records and stops the background listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logging_stats():
+    """
+    :return: The number of queued, enqueued, dropped, and sampled out records
+    :rtype: dict
+    """
+    if _queue_handler is None:
+        return {}
+    return {
+        "queued": _queue_handler.queue.qsize(),
+        "enqueued": _queue_handler.enqueued,
+        "dropped": _queue_handler.dropped,
+        "sampled_out": _sampler.sampled_out,
+    }
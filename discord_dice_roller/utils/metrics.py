@@ -0,0 +1,327 @@
+"""
+In-process metrics for our commands: latency histograms per command and phase, call and
+error counters, and the stats of our other modules, exported in the Prometheus text format
+to a file (for the node_exporter textfile collector) and/or a small HTTP endpoint
+"""
+
+# Built-in
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import time
+from bisect import bisect_left
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+METRIC_PREFIX = "dice_roller"
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = [
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+]
+TOTAL_PHASE = "total"
+
+
+# --------------------------------------------------------------------------------
+# > Histogram
+# --------------------------------------------------------------------------------
+class Histogram:
+    """Counts the observed values per bucket, like a Prometheus histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Initializes empty buckets
+        :param [float] buckets: The sorted upper bounds of the buckets
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        """:param float value: The value to add"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """
+        :return: The (upper bound, number of values below it) of each bucket, +Inf included
+        :rtype: [(str, int)]
+        """
+        bounds = [_format_value(bucket) for bucket in self.buckets] + ["+Inf"]
+        cumulated = 0
+        results = []
+        for bound, count in zip(bounds, self.counts):
+            cumulated += count
+            results.append((bound, cumulated))
+        return results
+
+
+# --------------------------------------------------------------------------------
+# > Command tracking
+# --------------------------------------------------------------------------------
+_current_command = contextvars.ContextVar("metrics_command", default=None)
+_phase_histograms = {}
+_command_counters = {}
+
+
+def start_command_timer(command_name):
+    """
+    Starts timing the current command and counts its call
+    Each command runs in its own task, so the timer is isolated through a contextvar
+    :param str command_name: Name of the command being executed
+    """
+    _get_command_counters(command_name)["calls"] += 1
+    _current_command.set((command_name, time.perf_counter()))
+
+
+def stop_command_timer():
+    """Stops timing the current command and records its total duration"""
+    tracker = _current_command.get()
+    if tracker is None:
+        return
+    _current_command.set(None)
+    command_name, start = tracker
+    _observe(command_name, TOTAL_PHASE, time.perf_counter() - start)
+
+
+def record_command_error(command_name):
+    """:param str command_name: Name of the command that failed"""
+    _get_command_counters(command_name)["errors"] += 1
+
+
+def record_phase(phase, duration):
+    """
+    Records the duration of a phase of the current command, if tracked
+    :param str phase: Name of the phase, like "storage" or "render"
+    :param float duration: Its duration in seconds
+    """
+    tracker = _current_command.get()
+    if tracker is not None:
+        _observe(tracker[0], phase, duration)
+
+
+@contextlib.contextmanager
+def track_phase(phase):
+    """
+    Times the enclosed block as a phase of the current command
+    :param str phase: Name of the phase, like "parse" or "roll"
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - start)
+
+
+def get_command_stats():
+    """
+    :return: The calls, errors, error rate, and average duration of each phase, per command
+    :rtype: dict
+    """
+    stats = {}
+    for command_name, counters in _command_counters.items():
+        calls = counters["calls"]
+        stats[command_name] = {
+            **counters,
+            "error_rate": counters["errors"] / calls if calls > 0 else 0,
+        }
+    for (command_name, phase), histogram in _phase_histograms.items():
+        command_stats = stats.setdefault(command_name, {})
+        command_stats[f"avg_{phase}_duration"] = histogram.sum / histogram.count
+    return stats
+
+
+# --------------------------------------------------------------------------------
+# > Registered stats
+# --------------------------------------------------------------------------------
+_stats_sources = {}
+
+
+def register_stats(name, func, label=None):
+    """
+    Exports the numbers returned by a stats function as gauges
+    Nested dicts are flattened, or become labels if `label` is provided
+    :param str name: Name of the source, used in the metric names
+    :param callable func: Function without arguments returning a dict
+    :param str label: Label name for the top-level keys (like "command"), if any
+    """
+    _stats_sources[name] = (func, label)
+
+
+# --------------------------------------------------------------------------------
+# > Export
+# --------------------------------------------------------------------------------
+def export_metrics():
+    """
+    :return: Every metric in the Prometheus text format
+    :rtype: str
+    """
+    lines = []
+    # Histograms
+    name = f"{METRIC_PREFIX}_command_phase_seconds"
+    lines.append(f"# HELP {name} Duration of each phase of our commands")
+    lines.append(f"# TYPE {name} histogram")
+    for (command_name, phase), histogram in sorted(_phase_histograms.items()):
+        labels = f'command="{command_name}",phase="{phase}"'
+        for bound, count in histogram.cumulative_counts():
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f"{name}_sum{{{labels}}} {_format_value(histogram.sum)}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    # Counters
+    for counter in ["calls", "errors"]:
+        name = f"{METRIC_PREFIX}_command_{counter}_total"
+        lines.append(f"# HELP {name} Number of command {counter}")
+        lines.append(f"# TYPE {name} counter")
+        for command_name, counters in sorted(_command_counters.items()):
+            lines.append(f'{name}{{command="{command_name}"}} {counters[counter]}')
+    # Gauges
+    for source_name, (func, label) in sorted(_stats_sources.items()):
+        try:
+            stats = func()
+        except Exception as error:
+            logging.warning(f"Could not collect the '{source_name}' stats: {error}")
+            continue
+        gauges = {}
+        _collect_gauges(gauges, f"{METRIC_PREFIX}_{source_name}", stats, label)
+        for name, samples in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(filepath):
+    """
+    Writes the metrics through a temporary file, so readers never see a partial file
+    :param str filepath: The destination, usually read by the node_exporter
+    """
+    _write_atomically(filepath, export_metrics())
+
+
+async def run_metrics_exporter():
+    """
+    Exports the metrics based on the env variables, until cancelled:
+        METRICS_PORT        Serves them over HTTP on this port (on METRICS_HOST)
+        METRICS_FILE        Writes them to this file every METRICS_INTERVAL seconds
+    """
+    port = os.getenv("METRICS_PORT")
+    filepath = os.getenv("METRICS_FILE")
+    if port:
+        host = os.getenv("METRICS_HOST", "127.0.0.1")
+        await asyncio.start_server(_serve_metrics, host, int(port))
+        logging.info(f"Serving the metrics on port {port}")
+    if filepath:
+        interval = float(os.getenv("METRICS_INTERVAL", 15))
+        loop = asyncio.get_event_loop()
+        while True:
+            # Collected in the loop, as the counters are only updated from there
+            content = export_metrics()
+            await loop.run_in_executor(None, _write_atomically, filepath, content)
+            await asyncio.sleep(interval)
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _get_command_counters(command_name):
+    """
+    :param str command_name: Name of the command
+    :return: The (mutable) call and error counters of the command
+    :rtype: dict
+    """
+    return _command_counters.setdefault(command_name, {"calls": 0, "errors": 0})
+
+
+def _observe(command_name, phase, duration):
+    """
+    :param str command_name: Name of the command
+    :param str phase: Name of the phase
+    :param float duration: Its duration in seconds
+    """
+    key = (command_name, phase)
+    if key not in _phase_histograms:
+        _phase_histograms[key] = Histogram()
+    _phase_histograms[key].observe(duration)
+
+
+def _collect_gauges(gauges, name, stats, label=None, labels=""):
+    """
+    Flattens the stats into gauge samples, grouped by metric name
+    :param dict gauges: The samples per metric name, updated in place
+    :param str name: The metric name for this level of the stats
+    :param dict stats: The stats returned by a registered function
+    :param str label: Label name for the keys of this level, if any
+    :param str labels: The labels of the parent levels
+    """
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            if label is not None:
+                child_labels = f'{labels},{label}="{key}"'.lstrip(",")
+                _collect_gauges(gauges, name, value, labels=child_labels)
+            else:
+                _collect_gauges(gauges, f"{name}_{key}", value, labels=labels)
+        elif isinstance(value, (int, float)):
+            sample_labels = f"{{{labels}}}" if labels else ""
+            sample = f"{name}_{key}{sample_labels} {_format_value(value)}"
+            gauges.setdefault(f"{name}_{key}", []).append(sample)
+
+
+def _write_atomically(filepath, content):
+    """
+    :param str filepath: The destination file
+    :param str content: The text to write
+    """
+    temporary_filepath = f"{filepath}.tmp"
+    with open(temporary_filepath, "w") as f:
+        f.write(content)
+    os.replace(temporary_filepath, filepath)
+
+
+def _format_value(value):
+    """
+    :param value: A number (or bool)
+    :return: The number as Prometheus expects it
+    :rtype: str
+    """
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+async def _serve_metrics(reader, writer):
+    """
+    Answers any HTTP request with the metrics, then closes the connection
+    :param StreamReader reader: The incoming stream
+    :param StreamWriter writer: The outgoing stream
+    """
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = export_metrics().encode()
+        headers = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        writer.write(headers.encode() + body)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, OSError):
+        pass
+    finally:
+        writer.close()
@@ -0,0 +1,212 @@
+"""
+Rolls and renders the expensive DiceRolls in a pool of worker processes, off the event loop
+Cheap rolls stay inline, as a round trip to a worker would cost more than the roll itself
+Workers receive the plan and the settings, and send back the embed as a plain dict
+"""
+
+# Built-in
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Third-party
+from discord import Embed
+
+# Local
+from .dice_roll import DiceRoll
+from .metrics import track_phase
+from .renderer import render_dice_roll, render_errors
+from .rng import reset_rngs
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+TIMEOUT_ERROR = "[Dice] Your roll took too long, please try again with fewer dice"
+BUSY_ERROR = "[Dice] Too many large rolls are in progress, please try again later"
+CRASH_ERROR = "[Dice] Your roll could not be finished, please try again"
+
+
+# --------------------------------------------------------------------------------
+# > Limits
+# --------------------------------------------------------------------------------
+_limits = None
+
+
+def get_offload_limits():
+    """
+    :return: The worker processes, the cost from which rolls are offloaded, the time
+        budget, and the max number of offloaded rolls waiting or running
+    :rtype: dict
+    """
+    global _limits
+    if _limits is None:
+        _limits = {
+            "processes": int(os.getenv("ROLL_PROCESSES", 2)),
+            "threshold": int(os.getenv("ROLL_OFFLOAD_THRESHOLD", 50000)),
+            "timeout": float(os.getenv("ROLL_TIMEOUT", 5)),
+            "queue_size": int(os.getenv("ROLL_QUEUE_SIZE", 8)),
+        }
+    return _limits
+
+
+# --------------------------------------------------------------------------------
+# > Process pool
+# --------------------------------------------------------------------------------
+_process_pool = None
+
+
+def get_roll_pool():
+    """
+    :return: The pool of worker processes, created on first use from the env variables
+    :rtype: ProcessPoolExecutor
+    """
+    global _process_pool
+    if _process_pool is None:
+        processes = get_offload_limits()["processes"]
+        _process_pool = ProcessPoolExecutor(
+            max_workers=processes, initializer=reset_rngs
+        )
+    return _process_pool
+
+
+def shutdown_roll_pool():
+    """Stops the worker processes, cancelling the rolls that have not started"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True)
+        _process_pool = None
+
+
+# --------------------------------------------------------------------------------
+# > Rolls
+# --------------------------------------------------------------------------------
+_stats = {
+    "inline": 0,
+    "offloaded": 0,
+    "timed_out": 0,
+    "refused": 0,
+    "queued": 0,
+    "max_queued": 0,
+    "broken_pools": 0,
+}
+# Rolls leave the queue from the thread of the pool
+_stats_lock = threading.Lock()
+
+
+async def roll_and_render(dice_roll):
+    """
+    Rolls the DiceRoll and renders it, in the process pool if its estimated cost is
+    above the threshold. Offloaded rolls leave `dice_roll` itself unrolled.
+    Timed out rolls keep their worker until they finish, so they stay in the queue,
+    and new rolls are refused while the queue is full.
+    If a worker died, the pool is replaced for the next rolls.
+    :param DiceRoll dice_roll: A DiceRoll that has not been rolled yet
+    :return: The embed with the results, or with the errors
+    :rtype: Embed
+    """
+    limits = get_offload_limits()
+    if dice_roll.estimate_cost() < limits["threshold"]:
+        with _stats_lock:
+            _stats["inline"] += 1
+        with track_phase("roll"):
+            dice_roll.roll()
+        with track_phase("render"):
+            return render_dice_roll(dice_roll)
+    with _stats_lock:
+        is_full = _stats["queued"] >= limits["queue_size"]
+        if is_full:
+            _stats["refused"] += 1
+        else:
+            _stats["offloaded"] += 1
+            _stats["queued"] += 1
+            _stats["max_queued"] = max(_stats["max_queued"], _stats["queued"])
+    if is_full:
+        return render_errors([BUSY_ERROR])
+    pool = get_roll_pool()
+    try:
+        future = pool.submit(
+            roll_and_render_in_worker,
+            dice_roll.instructions,
+            dice_roll.settings,
+            dice_roll.plan,
+        )
+    except BrokenProcessPool:
+        # Never submitted, so no callback will count it out of the queue
+        with _stats_lock:
+            _stats["queued"] -= 1
+        _discard_roll_pool(pool)
+        return render_errors([CRASH_ERROR])
+    # Called once the worker is done, or once the roll is cancelled before starting
+    future.add_done_callback(_on_offloaded_roll_done)
+    try:
+        with track_phase("offload"):
+            embed_data = await asyncio.wait_for(
+                asyncio.wrap_future(future), limits["timeout"]
+            )
+    except asyncio.TimeoutError:
+        with _stats_lock:
+            _stats["timed_out"] += 1
+        return render_errors([TIMEOUT_ERROR])
+    except BrokenProcessPool:
+        _discard_roll_pool(pool)
+        return render_errors([CRASH_ERROR])
+    return Embed.from_dict(embed_data)
+
+
+def roll_and_render_in_worker(instructions, settings, plan):
+    """
+    Rolls and renders a DiceRoll. Runs in a worker process.
+    :param [str] instructions: The user's instructions
+    :param dict settings: The settings to use in the roll
+    :param RollPlan plan: The compiled instructions
+    :return: The rendered embed, as a dict
+    :rtype: dict
+    """
+    dice_roll = DiceRoll(instructions, settings, plan)
+    dice_roll.roll()
+    return render_dice_roll(dice_roll).to_dict()
+
+
+def get_offload_stats():
+    """
+    :return: The inline, offloaded, timed out, and refused rolls, the rolls waiting
+        or running in the pool, and the pools replaced after a worker died
+    :rtype: dict
+    """
+    limits = get_offload_limits()
+    with _stats_lock:
+        stats = dict(_stats)
+    return {
+        **stats,
+        "threshold": limits["threshold"],
+        "queue_size": limits["queue_size"],
+    }
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _discard_roll_pool(pool):
+    """
+    Forgets a pool whose worker died, as it refuses every new roll, so that the next
+    roll creates a new one. Rolls of the same pool failing together count it once.
+    :param ProcessPoolExecutor pool: The broken pool
+    """
+    global _process_pool
+    if _process_pool is pool:
+        _process_pool = None
+        with _stats_lock:
+            _stats["broken_pools"] += 1
+    pool.shutdown(wait=False)
+
+
+def _on_offloaded_roll_done(_future):
+    """
+    Counts the roll out of the queue once its worker is done, or once it is cancelled
+    Runs in the thread of the pool
+    :param concurrent.futures.Future _future: The future of the offloaded roll
+    """
+    with _stats_lock:
+        _stats["queued"] -= 1
@@ -0,0 +1,279 @@
+"""
+Exact outcome distributions of roll instructions, without any simulation
+A distribution is stored as the number of ways to reach each total, starting from its lowest total
+"""
+
+# Built-in
+import functools
+import operator
+from collections import namedtuple
+from math import comb
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+# Rough number of operations above which we refuse to compute the odds
+MAX_ODDS_COST = 5000000
+PERCENTILES = [10, 25, 50, 75, 90]
+COMPARATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+}
+
+Distribution = namedtuple("Distribution", ["offset", "weights"])
+Odds = namedtuple("Odds", ["distribution", "mean", "percentiles", "success"])
+
+
+# --------------------------------------------------------------------------------
+# > Distributions
+# --------------------------------------------------------------------------------
+@functools.lru_cache(maxsize=256)
+def get_dice_distribution(qty, sides):
+    """
+    Convolves `qty` uniform dice, one die at a time, using a sliding window sum
+    :param int qty: Number of dice
+    :param int sides: Number of sides of each die
+    :return: The distribution of the sum of the dice
+    :rtype: Distribution
+    """
+    weights = [1] * sides
+    for _ in range(qty - 1):
+        new_weights = []
+        window = 0
+        for index in range(len(weights) + sides - 1):
+            if index < len(weights):
+                window += weights[index]
+            if index >= sides:
+                window -= weights[index - sides]
+            new_weights.append(window)
+        weights = new_weights
+    return Distribution(qty, tuple(weights))
+
+
+@functools.lru_cache(maxsize=256)
+def get_highest_dice_distribution(qty, sides, amount):
+    """
+    Distribution of the sum of the `amount` highest dice out of `qty`
+    Goes through the faces from highest to lowest and counts how many dice land on each
+    :param int qty: Number of dice
+    :param int sides: Number of sides of each die
+    :param int amount: Number of highest dice to add up
+    :return: The distribution of the sum of the kept dice
+    :rtype: Distribution
+    """
+    # (dice already placed, sum of the kept ones) -> number of ways
+    states = {(0, 0): 1}
+    for face in range(sides, 0, -1):
+        new_states = {}
+        for (placed, kept_sum), ways in states.items():
+            remaining = qty - placed
+            lowest_count = remaining if face == 1 else 0
+            for count in range(lowest_count, remaining + 1):
+                kept = min(count, max(amount - placed, 0))
+                key = (placed + count, kept_sum + kept * face)
+                new_ways = ways * comb(remaining, count)
+                new_states[key] = new_states.get(key, 0) + new_ways
+        states = new_states
+    weights = [0] * (amount * (sides - 1) + 1)
+    for (_placed, kept_sum), ways in states.items():
+        weights[kept_sum - amount] += ways
+    return Distribution(amount, tuple(weights))
+
+
+def get_lowest_dice_distribution(qty, sides, amount):
+    """
+    By symmetry, the lowest dice are the highest dice with their faces flipped (v -> sides + 1 - v)
+    :param int qty: Number of dice
+    :param int sides: Number of sides of each die
+    :param int amount: Number of lowest dice to add up
+    :return: The distribution of the sum of the kept dice
+    :rtype: Distribution
+    """
+    highest = get_highest_dice_distribution(qty, sides, amount)
+    return Distribution(highest.offset, tuple(reversed(highest.weights)))
+
+
+def convolve(first, second):
+    """
+    :param Distribution first: Distribution of a first independent total
+    :param Distribution second: Distribution of a second independent total
+    :return: The distribution of the sum of both totals
+    :rtype: Distribution
+    """
+    weights = [0] * (len(first.weights) + len(second.weights) - 1)
+    for i, first_ways in enumerate(first.weights):
+        if first_ways == 0:
+            continue
+        for j, second_ways in enumerate(second.weights):
+            weights[i + j] += first_ways * second_ways
+    return Distribution(first.offset + second.offset, tuple(weights))
+
+
+def shift(distribution, value):
+    """
+    :param Distribution distribution: The distribution of a total
+    :param int value: The value added to the total
+    :return: The distribution of the new total
+    :rtype: Distribution
+    """
+    return distribution._replace(offset=distribution.offset + value)
+
+
+def scale(distribution, factor):
+    """
+    :param Distribution distribution: The distribution of a total
+    :param int factor: The positive integer the total is multiplied by
+    :return: The distribution of the new total
+    :rtype: Distribution
+    """
+    weights = [0] * ((len(distribution.weights) - 1) * factor + 1)
+    for index, ways in enumerate(distribution.weights):
+        weights[index * factor] = ways
+    return Distribution(distribution.offset * factor, tuple(weights))
+
+
+# --------------------------------------------------------------------------------
+# > Odds
+# --------------------------------------------------------------------------------
+def estimate_odds_cost(plan):
+    """
+    Roughly estimates the number of operations needed by `get_odds`
+    :param RollPlan plan: A valid roll plan
+    :return: The estimated cost
+    :rtype: int
+    """
+    groups, action, _modifier, _check = split_tokens(plan.tokens)
+    cost = 0
+    support = 1
+    for qty, sides in groups:
+        group_support = qty * (sides - 1) + 1
+        cost += qty * group_support + support * group_support
+        support += group_support - 1
+    if action is not None and action[0] in {"kh", "kl", "dh", "dl"}:
+        qty = sum(qty for qty, _sides in groups)
+        sides = groups[0][1]
+        cost += sides * qty * qty * qty * sides
+    return cost
+
+
+def get_odds(plan):
+    """
+    Computes the exact distribution of the final total of a valid plan,
+    applying the components in the same order as DiceRoll
+    :param RollPlan plan: A valid roll plan
+    :return: The distribution, mean, percentiles, and check probability (None if no check)
+    :rtype: Odds
+    """
+    groups, action, modifier, check = split_tokens(plan.tokens)
+    distribution = _get_action_distribution(groups, action)
+    if modifier is not None:
+        distribution = shift(distribution, modifier)
+    total_ways = sum(distribution.weights)
+    values = range(distribution.offset, distribution.offset + len(distribution.weights))
+    mean = sum(v * w for v, w in zip(values, distribution.weights)) / total_ways
+    percentiles = get_percentiles(values, distribution.weights)
+    success = None
+    if check is not None:
+        comparator, target = check
+        compare = COMPARATORS[comparator]
+        success_ways = sum(
+            w for v, w in zip(values, distribution.weights) if compare(v, target)
+        )
+        success = success_ways / total_ways
+    return Odds(distribution, mean, percentiles, success)
+
+
+def get_percentiles(values, weights):
+    """
+    :param [int] values: The possible totals, sorted
+    :param [int] weights: The number of ways (or of occurrences) of each total
+    :return: The smallest total reaching each of the PERCENTILES
+    :rtype: dict
+    """
+    total_weight = sum(weights)
+    percentiles = {}
+    cumulated_weight = 0
+    remaining_percentiles = list(PERCENTILES)
+    for value, weight in zip(values, weights):
+        cumulated_weight += weight
+        while remaining_percentiles and cumulated_weight * 100 >= (
+            remaining_percentiles[0] * total_weight
+        ):
+            percentiles[remaining_percentiles.pop(0)] = value
+    return percentiles
+
+
+def get_keep_drop_selection(name, qty, amount):
+    """
+    Mirrors the slices of KeepDropAction, which sorts the dice then splits them at `amount`
+    :param str name: The keep/drop action, like "kh"
+    :param int qty: The number of dice
+    :param int amount: The value of the action
+    :return: Whether the highest (or lowest) dice are kept, and how many
+    :rtype: bool, int
+    """
+    if name == "kh":
+        return True, amount
+    if name == "kl":
+        return True, qty - amount
+    if name == "dh":
+        return False, qty - amount
+    return False, amount
+
+
+def split_tokens(tokens):
+    """
+    :param [tuple] tokens: The tokens of a valid plan
+    :return: The (qty, sides) groups, and the action, modifier, and check (or None)
+    :rtype: [(int, int)], tuple, int, tuple
+    """
+    groups = []
+    action, modifier, check = None, None, None
+    for token in tokens:
+        kind = token[0]
+        if kind == "dice":
+            groups.append(token[1:])
+        elif kind == "action":
+            action = token[1:]
+        elif kind == "modifier":
+            modifier = token[1]
+        elif kind == "check":
+            check = token[1:]
+    return groups, action, modifier, check
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _get_action_distribution(groups, action):
+    """
+    :param [(int, int)] groups: The (qty, sides) of each dice group
+    :param tuple action: The (name, value) of the action, if any
+    :return: The distribution of the total once the action is applied
+    :rtype: Distribution
+    """
+    name, amount = action if action is not None else (None, 0)
+    if name in {"adv", "dis"}:
+        # Validated to have a single die, rerolled once
+        sides = groups[0][1]
+        if name == "adv":
+            return get_highest_dice_distribution(2, sides, 1)
+        return get_lowest_dice_distribution(2, sides, 1)
+    if name in {"kh", "kl", "dh", "dl"}:
+        # Validated to have a single die type
+        qty = sum(qty for qty, _sides in groups)
+        sides = groups[0][1]
+        highest, count = get_keep_drop_selection(name, qty, amount)
+        if highest:
+            return get_highest_dice_distribution(qty, sides, count)
+        return get_lowest_dice_distribution(qty, sides, count)
+    distribution = Distribution(0, (1,))
+    for qty, sides in groups:
+        distribution = convolve(distribution, get_dice_distribution(qty, sides))
+    if name == "crit":
+        distribution = scale(distribution, 2)
+    return distribution
@@ -0,0 +1,209 @@
+"""
+Token buckets limiting how many points each user and each guild can spend per minute
+Each command costs points, and dice rolls also cost points per rolled die
+Buckets are only kept for active users and guilds: idle buckets are full, so they are evicted
+"""
+
+# Built-in
+import time
+from collections import OrderedDict
+
+# Third-party
+from discord.ext import commands
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+# Limits are expressed in points per period, which is also the bucket capacity
+RATE_LIMIT_PERIOD = 60
+DEFAULT_COMMAND_COST = 1
+COMMAND_COSTS = {
+    "clear": 5,
+    "odds": 5,
+    "simulate": 10,
+}
+# Dice rolls cost one extra point per DICE_PER_POINT dice
+DICE_PER_POINT = 100
+
+
+# --------------------------------------------------------------------------------
+# > Errors
+# --------------------------------------------------------------------------------
+class RateLimited(commands.CheckFailure):
+    """Raised before a command when its user or guild has run out of points"""
+
+    def __init__(self, retry_after):
+        """:param float retry_after: Seconds before the command can be called again"""
+        super().__init__(f"Rate limited, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+# --------------------------------------------------------------------------------
+# > Buckets
+# --------------------------------------------------------------------------------
+class TokenBucket:
+    """Points refilled continuously up to the capacity, which can go into debt"""
+
+    __slots__ = ["capacity", "tokens", "updated_at"]
+
+    def __init__(self, capacity, now):
+        """
+        Initializes a full bucket
+        :param float capacity: The max number of points, refilled every RATE_LIMIT_PERIOD
+        :param float now: The current time
+        """
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def refill(self, now):
+        """:param float now: The current time"""
+        rate = self.capacity / RATE_LIMIT_PERIOD
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+
+    def is_full(self, now):
+        """
+        :param float now: The current time
+        :return: Whether the bucket would be full after a refill
+        :rtype: bool
+        """
+        rate = self.capacity / RATE_LIMIT_PERIOD
+        return self.tokens + (now - self.updated_at) * rate >= self.capacity
+
+    def get_wait_time(self, cost):
+        """
+        :param float cost: The points to spend (capped to the capacity)
+        :return: Seconds before the bucket has enough points, 0 if it already does
+        :rtype: float
+        """
+        missing = min(cost, self.capacity) - self.tokens
+        if missing <= 0:
+            return 0
+        return missing * RATE_LIMIT_PERIOD / self.capacity
+
+
+class RateLimiter:
+    """Keeps one bucket per user and per guild, in least recently used order"""
+
+    def __init__(self):
+        """Initializes the limiter without any bucket"""
+        self._buckets = OrderedDict()
+        self._stats = {"allowed": 0, "throttled": 0, "evicted": 0}
+
+    @property
+    def stats(self):
+        """
+        :return: The number of buckets, and of allowed, throttled, and evicted requests
+        :rtype: dict
+        """
+        return {**self._stats, "buckets": len(self._buckets)}
+
+    def acquire(self, limits, cost, now=None):
+        """
+        Spends the points in every bucket, or in none of them if one lacks points
+        :param dict limits: The limit (in points per period) of each bucket key, 0 to ignore it
+        :param float cost: The points to spend
+        :param float now: The current time (defaults to the monotonic clock)
+        :return: Seconds before retrying, or 0 if the points were spent
+        :rtype: float
+        """
+        now = time.monotonic() if now is None else now
+        buckets = self._get_buckets(limits, now)
+        wait_time = max([bucket.get_wait_time(cost) for bucket in buckets], default=0)
+        if wait_time > 0:
+            self._stats["throttled"] += 1
+            return wait_time
+        for bucket in buckets:
+            bucket.tokens -= cost
+        self._stats["allowed"] += 1
+        self._evict_idle_buckets(now)
+        return 0
+
+    def charge(self, limits, cost, now=None):
+        """
+        Spends the points without checking them first, for costs only known afterwards
+        The buckets can go into debt (up to their capacity), which delays the next commands
+        :param dict limits: The limit (in points per period) of each bucket key, 0 to ignore it
+        :param float cost: The points to spend
+        :param float now: The current time (defaults to the monotonic clock)
+        """
+        now = time.monotonic() if now is None else now
+        for bucket in self._get_buckets(limits, now):
+            bucket.tokens = max(bucket.tokens - cost, -bucket.capacity)
+
+    def _get_buckets(self, limits, now):
+        """
+        :param dict limits: The limit (in points per period) of each bucket key, 0 to ignore it
+        :param float now: The current time
+        :return: The refilled buckets, created if missing, and moved to the end of the LRU
+        :rtype: [TokenBucket]
+        """
+        buckets = []
+        for key, limit in limits.items():
+            if not limit:
+                continue
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(limit, now)
+            else:
+                self._buckets.move_to_end(key)
+                bucket.refill(now)
+                bucket.capacity = limit
+            buckets.append(bucket)
+        return buckets
+
+    def _evict_idle_buckets(self, now):
+        """
+        Removes the least recently used buckets as long as they are full again
+        :param float now: The current time
+        """
+        while len(self._buckets) > 0:
+            key, bucket = next(iter(self._buckets.items()))
+            if not bucket.is_full(now):
+                break
+            del self._buckets[key]
+            self._stats["evicted"] += 1
+
+
+# --------------------------------------------------------------------------------
+# > Shared limiter
+# --------------------------------------------------------------------------------
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    """
+    :return: The process-wide rate limiter, created on first use
+    :rtype: RateLimiter
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+
+def get_rate_limit_stats():
+    """
+    :return: The counters of the shared rate limiter
+    :rtype: dict
+    """
+    return get_rate_limiter().stats
+
+
+def get_command_cost(command_name):
+    """
+    :param str command_name: Name of the command
+    :return: The points spent before running the command
+    :rtype: int
+    """
+    return COMMAND_COSTS.get(command_name, DEFAULT_COMMAND_COST)
+
+
+def get_dice_cost(dice_count):
+    """
+    :param int dice_count: The number of rolled dice
+    :return: The points spent after rolling those dice
+    :rtype: float
+    """
+    return dice_count / DICE_PER_POINT
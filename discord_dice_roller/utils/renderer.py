@@ -0,0 +1,212 @@
+"""
+Renders the result of a DiceRoll into a discord embed, only once it is about to be sent
+Everything that does not depend on the roll (colors, skeletons, field names) is built once
+"""
+
+# Third-party
+from discord import Color, Embed
+
+# Local
+from .dice_engine import format_values, total
+from .dice_roll import (
+    Advantage,
+    CriticalHit,
+    Disadvantage,
+    KeepDropAction,
+    RollModifier,
+    generate_discord_markdown_string,
+)
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+RESULT_SKELETON = {"type": "rich", "color": Color.blue().value}
+ERROR_SKELETON = {"type": "rich", "title": "Error", "color": Color.red().value}
+SUCCESS_COLOR = Color.green()
+FAILURE_COLOR = Color.orange()
+DICE_FIELD_NAME = "Dice rolls"
+CRITICAL_HIT_FIRST_LINE = "All your dice scores are multiplied by 2"
+
+
+# --------------------------------------------------------------------------------
+# > API
+# --------------------------------------------------------------------------------
+def render_dice_roll(dice_roll):
+    """
+    :param DiceRoll dice_roll: A rolled DiceRoll, or an invalid one
+    :return: The embed with the results, or with the errors
+    :rtype: Embed
+    """
+    if not dice_roll.is_valid:
+        return render_errors(dice_roll.errors)
+    embed = Embed.from_dict(
+        {**RESULT_SKELETON, "title": f"You rolled {dice_roll.total}"}
+    )
+    template = VERBOSE_TEMPLATE if dice_roll.settings["verbose"] else COMPACT_TEMPLATE
+    for step in template:
+        step(embed, dice_roll)
+    return embed
+
+
+def render_errors(errors):
+    """
+    :param [str] errors: The error messages
+    :return: The embed listing the errors
+    :rtype: Embed
+    """
+    return Embed.from_dict({**ERROR_SKELETON, "description": "\n".join(errors)})
+
+
+# --------------------------------------------------------------------------------
+# > Template steps
+# --------------------------------------------------------------------------------
+def _add_dice_field(embed, dice_roll):
+    """
+    Adds a `Dice` recap to the embed
+    :param Embed embed: The embed to update
+    :param DiceRoll dice_roll: The rolled DiceRoll
+    """
+    lines = []
+    total_score = 0
+    for sides, values in dice_roll.dice.values_per_sides().items():
+        line_score = total(values)
+        total_score += line_score
+        lines.append(f"[{len(values)}d{sides}]({format_values(values)}) = {line_score}")
+    lines.append(f"# {total_score}")
+    _add_field(embed, DICE_FIELD_NAME, lines)
+
+
+def _add_component_fields(embed, dice_roll):
+    """
+    Adds one field per component that has a field renderer (the check has none)
+    :param Embed embed: The embed to update
+    :param DiceRoll dice_roll: The rolled DiceRoll
+    """
+    for component in dice_roll.components:
+        field_renderer = FIELD_RENDERERS.get(type(component))
+        if field_renderer is not None:
+            name, lines = field_renderer(component)
+            _add_field(embed, name, lines)
+
+
+def _apply_check(embed, dice_roll):
+    """
+    Updates the title and color of the embed based on the check results, if any
+    :param Embed embed: The embed to update
+    :param DiceRoll dice_roll: The rolled DiceRoll
+    """
+    check = dice_roll.check
+    if check is None:
+        return
+    if check.success:
+        embed.title = f"Success with {dice_roll.total}!"
+        embed.color = SUCCESS_COLOR
+    else:
+        embed.title = f"Failure with {dice_roll.total}!"
+        embed.color = FAILURE_COLOR
+
+
+VERBOSE_TEMPLATE = [_add_dice_field, _add_component_fields, _apply_check]
+COMPACT_TEMPLATE = [_apply_check]
+
+
+# --------------------------------------------------------------------------------
+# > Field renderers
+# --------------------------------------------------------------------------------
+def _render_modifier(modifier):
+    """
+    :param RollModifier modifier: An applied modifier
+    :return: The field name, and the new total after the modifier
+    :rtype: str, [str]
+    """
+    sign = "+" if modifier.value > 0 else "-"
+    abs_value = abs(modifier.value)
+    new_total = modifier.dice_roll.total
+    previous_total = new_total - modifier.value
+    return (
+        f"Modifier {sign}{abs_value}",
+        [f"# {previous_total} {sign} {abs_value} = {new_total}"],
+    )
+
+
+def _render_advantage(action):
+    """
+    :param Advantage action: An applied advantage
+    :return: The field name, and whether the new die was kept
+    :rtype: str, [str]
+    """
+    kept = action.die.value > action.existing_die.value
+    return action.name, [_get_reroll_line(action.die.value, kept)]
+
+
+def _render_disadvantage(action):
+    """
+    :param Disadvantage action: An applied disadvantage
+    :return: The field name, and whether the new die was kept
+    :rtype: str, [str]
+    """
+    kept = action.die.value < action.existing_die.value
+    return action.name, [_get_reroll_line(action.die.value, kept)]
+
+
+def _render_critical_hit(action):
+    """
+    :param CriticalHit action: An applied critical hit
+    :return: The field name, and the new total
+    :rtype: str, [str]
+    """
+    lines = [
+        CRITICAL_HIT_FIRST_LINE,
+        f"# {action.before_total} x 2 = {action.after_total}",
+    ]
+    return action.name, lines
+
+
+def _render_keep_drop(action):
+    """
+    :param KeepDropAction action: An applied keep/drop action
+    :return: The field name, and the discarded and remaining dice
+    :rtype: str, [str]
+    """
+    lines = [
+        f"[Discarded dice]({format_values(action.discarded_values)})",
+        f"[Remaining dice]({format_values(action.remaining_values)})",
+        f"Went down from {action.before_total} to {action.after_total}",
+    ]
+    return action.name, lines
+
+
+FIELD_RENDERERS = {
+    RollModifier: _render_modifier,
+    Advantage: _render_advantage,
+    Disadvantage: _render_disadvantage,
+    CriticalHit: _render_critical_hit,
+    KeepDropAction: _render_keep_drop,
+}
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _add_field(embed, name, lines):
+    """
+    Adds a full-width field with the lines wrapped in a markdown block
+    :param Embed embed: The embed to update
+    :param str name: The name of the field
+    :param [str] lines: The content of the field
+    """
+    embed.add_field(
+        name=name, value=generate_discord_markdown_string(lines), inline=False
+    )
+
+
+def _get_reroll_line(value, kept):
+    """
+    :param int value: The value of the rerolled die
+    :param bool kept: Whether the new value replaced the previous one
+    :return: The line describing the reroll
+    :rtype: str
+    """
+    if kept:
+        return f"Rolled {value} and kept it!"
+    return f"Rolled {value} and discarded it!"
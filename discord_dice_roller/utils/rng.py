@@ -0,0 +1,276 @@
+"""
+Random number generators used to roll the dice
+Every backend can be instantiated on its own (and seeded, for audits or tests),
+or shared process-wide through `get_rng`
+"""
+
+# Built-in
+import os
+import random
+from collections import Counter
+
+try:
+    # Third-party
+    import numpy
+except ImportError:
+    numpy = None
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+# Below this amount of dice, NumPy's per-call overhead outweighs its speed
+NUMPY_MIN_DICE = 32
+# Without NumPy, face counts are computed in chunks to bound the memory usage
+FACE_COUNTS_CHUNK_SIZE = 100000
+FAIR_RNG_BACKEND = "system"
+WORD_BITS = 32
+
+
+# --------------------------------------------------------------------------------
+# > Backends
+# --------------------------------------------------------------------------------
+class RandomSource:
+    """Base class for our generators, which only need to implement `randint` and `roll`"""
+
+    name = None
+
+    def randint(self, low, high):
+        """
+        :param int low: The lowest possible value
+        :param int high: The highest possible value
+        :return: A random integer between low and high, both included
+        :rtype: int
+        """
+        raise NotImplementedError()
+
+    def roll(self, qty, sides):
+        """
+        :param int qty: Number of dice to roll
+        :param int sides: Number of sides of each die
+        :return: The value of each die
+        :rtype: list or numpy.ndarray
+        """
+        raise NotImplementedError()
+
+    def face_counts(self, qty, sides):
+        """
+        Rolls the dice in chunks and only keeps how many dice landed on each face
+        :param int qty: Number of dice to roll
+        :param int sides: Number of sides of each die
+        :return: The number of dice per face, starting from the face 1
+        :rtype: [int]
+        """
+        counter = Counter()
+        for start in range(0, qty, FACE_COUNTS_CHUNK_SIZE):
+            counter.update(self.roll(min(FACE_COUNTS_CHUNK_SIZE, qty - start), sides))
+        return [counter[face] for face in range(1, sides + 1)]
+
+    def face_counts_cost(self, qty, sides):
+        """
+        :param int qty: Number of dice to roll
+        :param int sides: Number of sides of each die
+        :return: The work of `face_counts`, in dice: each die is rolled here
+        :rtype: int
+        """
+        return qty
+
+
+class StdlibRandom(RandomSource):
+    """The Mersenne Twister from the `random` module, with its own state"""
+
+    name = "stdlib"
+
+    def __init__(self, seed=None):
+        """:param seed: Optional seed, for reproducible rolls"""
+        self._random = random.Random(seed)
+
+    def randint(self, low, high):
+        """Same as `random.randint`"""
+        return self._random.randint(low, high)
+
+    def roll(self, qty, sides):
+        """Draws all the dice with a single `choices` call"""
+        if qty == 1:
+            return [self._random.randint(1, sides)]
+        return self._random.choices(range(1, sides + 1), k=qty)
+
+
+class SystemRandomSource(RandomSource):
+    """Cryptographically secure and unbiased values from the OS, for the "fair" mode"""
+
+    name = "system"
+
+    def __init__(self, seed=None):
+        """:param seed: Must be None, the OS entropy cannot be seeded"""
+        if seed is not None:
+            raise ValueError("The system RNG cannot be seeded")
+        self._random = random.SystemRandom()
+
+    def randint(self, low, high):
+        """Same as `secrets.randbelow`, shifted"""
+        return low + self._random.randrange(high - low + 1)
+
+    def roll(self, qty, sides):
+        """Rejection sampling for each die, so that no face is favored"""
+        randrange = self._random.randrange
+        return [randrange(sides) + 1 for _ in range(qty)]
+
+
+class BufferedRandom(RandomSource):
+    """
+    Draws thousands of 32-bit words at once, then serves unbiased bounded integers
+    from that buffer, using rejection sampling to avoid the modulo bias
+    """
+
+    name = "buffered"
+
+    def __init__(self, seed=None, buffer_size=4096):
+        """
+        :param seed: Optional seed, for reproducible rolls
+        :param int buffer_size: Number of words drawn at once
+        """
+        self._random = random.Random(seed)
+        self.buffer_size = buffer_size
+        self._words = []
+        self._index = 0
+
+    def randint(self, low, high):
+        """Rejection sampling on a single word"""
+        bound = high - low + 1
+        limit = _get_rejection_limit(bound)
+        while True:
+            if self._index >= len(self._words):
+                self._refill(1)
+            word = self._words[self._index]
+            self._index += 1
+            if word < limit:
+                return low + word % bound
+
+    def roll(self, qty, sides):
+        """Rejection sampling on a slice of the buffer"""
+        limit = _get_rejection_limit(sides)
+        values = []
+        while len(values) < qty:
+            words = self._take(qty - len(values))
+            values.extend([word % sides + 1 for word in words if word < limit])
+        return values
+
+    def _take(self, count):
+        """
+        :param int count: Max number of words to take
+        :return: Between 1 and `count` words from the buffer, refilled if empty
+        :rtype: [int]
+        """
+        if self._index >= len(self._words):
+            self._refill(count)
+        words = self._words[self._index : self._index + count]
+        self._index += len(words)
+        return words
+
+    def _refill(self, count):
+        """
+        Replaces the buffer with new words, drawn in a single call
+        :param int count: Min number of words to draw
+        """
+        size = max(self.buffer_size, count)
+        data = self._random.getrandbits(WORD_BITS * size).to_bytes(4 * size, "little")
+        self._words = memoryview(data).cast("I").tolist()
+        self._index = 0
+
+
+class NumpyRandom(RandomSource):
+    """NumPy's PCG64 generator, for large groups. Small groups use a seeded `random`."""
+
+    name = "numpy"
+
+    def __init__(self, seed=None):
+        """:param seed: Optional seed, for reproducible rolls"""
+        if numpy is None:
+            raise RuntimeError("The numpy RNG requires NumPy to be installed")
+        self._generator = numpy.random.default_rng(seed)
+        self._random = random.Random(int(self._generator.integers(1 << 63)))
+
+    def randint(self, low, high):
+        """Same as `random.randint`"""
+        return self._random.randint(low, high)
+
+    def roll(self, qty, sides):
+        """A single vectorized call for large groups"""
+        if qty >= NUMPY_MIN_DICE:
+            return self._generator.integers(1, sides + 1, size=qty)
+        if qty == 1:
+            return [self._random.randint(1, sides)]
+        return self._random.choices(range(1, sides + 1), k=qty)
+
+    def face_counts(self, qty, sides):
+        """A single multinomial draw, in O(sides)"""
+        return self._generator.multinomial(qty, [1 / sides] * sides).tolist()
+
+    def face_counts_cost(self, qty, sides):
+        """The multinomial draw only depends on the number of faces"""
+        return sides
+
+
+RNG_BACKENDS = {
+    backend.name: backend
+    for backend in [StdlibRandom, SystemRandomSource, BufferedRandom, NumpyRandom]
+}
+
+
+# --------------------------------------------------------------------------------
+# > Shared generators
+# --------------------------------------------------------------------------------
+_generators = {}
+
+
+def create_rng(name, seed=None):
+    """
+    :param str name: The name of the backend, like "stdlib"
+    :param seed: Optional seed, for reproducible rolls
+    :return: A new generator with its own state
+    :rtype: RandomSource
+    """
+    if name not in RNG_BACKENDS:
+        raise ValueError(f"Unknown RNG backend: '{name}'")
+    return RNG_BACKENDS[name](seed=seed)
+
+
+def get_default_rng_backend():
+    """
+    :return: The backend from the RNG_BACKEND env variable, else numpy if installed
+    :rtype: str
+    """
+    return os.getenv("RNG_BACKEND") or ("numpy" if numpy is not None else "stdlib")
+
+
+def get_rng(name=None):
+    """
+    :param str name: The name of the backend (defaults to `get_default_rng_backend`)
+    :return: The process-wide generator of that backend, created on first use
+    :rtype: RandomSource
+    """
+    if name is None:
+        name = get_default_rng_backend()
+    if name not in _generators:
+        _generators[name] = create_rng(name)
+    return _generators[name]
+
+
+def reset_rngs():
+    """
+    Forgets the shared generators, so that a forked process seeds its own
+    Otherwise, worker processes would inherit the same state and roll the same values
+    """
+    _generators.clear()
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _get_rejection_limit(bound):
+    """
+    :param int bound: The number of possible values
+    :return: The largest multiple of `bound` that fits in a word. Words above are rejected.
+    :rtype: int
+    """
+    return (1 << WORD_BITS) - (1 << WORD_BITS) % bound
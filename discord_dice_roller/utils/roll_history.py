@@ -0,0 +1,455 @@
+"""
+State of the last valid roll of each user, used by `reroll`
+Recent rolls are kept in a bounded in-memory store, and every roll is also appended
+to a log file so that `reroll` keeps working after a restart
+"""
+
+# Built-in
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# --------------------------------------------------------------------------------
+# > Store
+# --------------------------------------------------------------------------------
+LastRoll = namedtuple("LastRoll", ["instructions", "settings"])
+
+
+class RollHistory:
+    """
+    LRU store of the last rolls, where entries also expire after `ttl` seconds without use
+    Only the instructions and settings are kept, not the rolled dice
+    Users known to have no roll are stored too, so that repeated misses are free
+    """
+
+    def __init__(self, max_size, ttl, clock=time.monotonic):
+        """
+        Initializes an empty store
+        :param int max_size: Max number of users to remember
+        :param float ttl: Seconds after which an unused entry expires (0 to disable)
+        :param callable clock: Function returning the current time in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def stats(self):
+        """
+        :return: The size of the store and its counters
+        :rtype: dict
+        """
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def get(self, user_id):
+        """
+        :param str user_id: The discord user id as string
+        :return: The last roll of the user, if any and not expired
+        :rtype: LastRoll or None
+        """
+        return self.lookup(user_id)[1]
+
+    def lookup(self, user_id):
+        """
+        :param str user_id: The discord user id as string
+        :return: Whether the user is known (with or without roll), and its last roll
+        :rtype: bool, LastRoll or None
+        """
+        with self._lock:
+            now = self.clock()
+            self._purge_expired(now)
+            if user_id not in self._entries:
+                self.misses += 1
+                return False, None
+            last_roll = self._entries[user_id][1]
+            if last_roll is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            self._entries[user_id] = (self._get_expiry(now), last_roll)
+            self._entries.move_to_end(user_id)
+            return True, last_roll
+
+    def set(self, user_id, instructions, settings):
+        """
+        Stores the last roll of the user, evicting the least recently used ones if full
+        :param str user_id: The discord user id as string
+        :param [str] instructions: The instructions of the roll
+        :param dict settings: The settings of the roll
+        """
+        self._store(user_id, LastRoll(tuple(instructions), dict(settings)))
+
+    def set_missing(self, user_id):
+        """
+        Remembers that the user has no roll, with the same LRU and TTL as the rolls
+        :param str user_id: The discord user id as string
+        """
+        self._store(user_id, None)
+
+    def clear(self):
+        """Removes every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    # ----------------------------------------
+    # Helpers
+    # ----------------------------------------
+    def _store(self, user_id, last_roll):
+        """
+        Stores the entry, evicting the least recently used ones if full
+        :param str user_id: The discord user id as string
+        :param LastRoll last_roll: The last roll of the user (None if it has none)
+        """
+        with self._lock:
+            now = self.clock()
+            self._purge_expired(now)
+            self._entries[user_id] = (self._get_expiry(now), last_roll)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _get_expiry(self, now):
+        """
+        :param float now: The current time
+        :return: When an entry used now will expire (None if no TTL)
+        :rtype: float or None
+        """
+        return now + self.ttl if self.ttl > 0 else None
+
+    def _purge_expired(self, now):
+        """
+        Removes the expired entries. Since the expiry is refreshed on use,
+        the least recently used entries are always the first to expire.
+        :param float now: The current time
+        """
+        if self.ttl <= 0:
+            return
+        while len(self._entries) > 0:
+            user_id, (expires_at, _last_roll) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[user_id]
+            self.expirations += 1
+
+
+# --------------------------------------------------------------------------------
+# > Persistent log
+# --------------------------------------------------------------------------------
+class RollHistoryLog:
+    """
+    Append-only file of JSON lines like `["<user_id>", ["1d20", "adv"]]`
+    Appends are buffered and written by a background timer. The file is only scanned
+    for the user missing from memory, so nothing but its line count stays in memory,
+    and it is compacted (one line per user) once it holds `compaction_ratio` times
+    more lines than users.
+    """
+
+    def __init__(
+        self,
+        filepath,
+        flush_interval=5,
+        compaction_ratio=2.0,
+        min_compaction_lines=10000,
+    ):
+        """
+        Initializes the log, only counting the lines of the file
+        :param str filepath: Path to the log file
+        :param float flush_interval: Max delay before buffered appends are written
+        :param float compaction_ratio: Lines/users ratio above which we compact
+        :param int min_compaction_lines: Never compact files with fewer lines
+        """
+        self.filepath = filepath
+        self.flush_interval = flush_interval
+        self.compaction_ratio = compaction_ratio
+        self.min_compaction_lines = min_compaction_lines
+        # The file lock is held during I/O, the buffer lock only for quick updates
+        self._file_lock = threading.Lock()
+        self._buffer_lock = threading.Lock()
+        self._timer = None
+        self._pending = []
+        self._line_count = self._count_lines()
+        # Number of users found by the last compaction check, unknown until then
+        self._user_count = None
+        # Stats
+        self.lookups = 0
+        self.compactions = 0
+        atexit.register(self.flush)
+
+    @property
+    def stats(self):
+        """
+        :return: The state of the log and its counters
+        :rtype: dict
+        """
+        with self._buffer_lock:
+            return {
+                "lines": self._line_count,
+                "users": self._user_count,
+                "pending_appends": len(self._pending),
+                "lookups": self.lookups,
+                "compactions": self.compactions,
+            }
+
+    def append(self, user_id, instructions):
+        """
+        Buffers a new roll for the user. The file is written later by the timer.
+        Never waits for file I/O, so it is safe to call from the event loop.
+        :param str user_id: The discord user id as string
+        :param [str] instructions: The instructions of the roll
+        """
+        instructions = tuple(instructions)
+        with self._buffer_lock:
+            self._pending.append((user_id, instructions))
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def get(self, user_id):
+        """
+        Scans the file for the last roll of the user (blocking), without keeping
+        the other users in memory. The caller stores it in the bounded RollHistory.
+        The locks are only held to snapshot the file and the buffer, not for the scan,
+        so appends and compactions are not blocked behind it.
+        :param str user_id: The discord user id as string
+        :return: The instructions of the last roll of the user, if any
+        :rtype: (str) or None
+        """
+        # Only parse the lines of the user, like `["<user_id>", [...]]`
+        prefix = (json.dumps([user_id])[:-1] + ",").encode()
+        f, size = None, 0
+        with self._file_lock:
+            # Appends are only moved to the file under the file lock, so the first
+            # `size` bytes are older than the buffer. A compaction replaces the file,
+            # which our handle keeps reading.
+            if os.path.exists(self.filepath):
+                f = open(self.filepath, "rb")
+                size = os.fstat(f.fileno()).st_size
+            with self._buffer_lock:
+                pending = list(self._pending)
+                self.lookups += 1
+        instructions = None
+        if f is not None:
+            with f:
+                for line_user_id, line_instructions in _read_entries(f, size, prefix):
+                    if line_user_id == user_id:
+                        instructions = line_instructions
+        for pending_user_id, pending_instructions in pending:
+            if pending_user_id == user_id:
+                instructions = pending_instructions
+        return instructions
+
+    def flush(self):
+        """Writes the buffered appends, then compacts the file if needed"""
+        with self._file_lock:
+            with self._buffer_lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                pending, self._pending = self._pending, []
+            if len(pending) > 0:
+                lines = [json.dumps([user_id, list(i)]) for user_id, i in pending]
+                with open(self.filepath, "a") as f:
+                    f.write("\n".join(lines) + "\n")
+                self._line_count += len(pending)
+            if self._line_count < self.min_compaction_lines:
+                return
+            # Users are never removed, so the last count is a lower bound
+            user_count = self._user_count
+            if user_count is not None:
+                if self._line_count <= self.compaction_ratio * user_count:
+                    return
+            self._compact()
+
+    def close(self):
+        """Writes the buffered appends"""
+        self.flush()
+        atexit.unregister(self.flush)
+
+    # ----------------------------------------
+    # Helpers
+    # ----------------------------------------
+    def _count_lines(self):
+        """
+        :return: The number of lines in the file, so compactions account for them
+        :rtype: int
+        """
+        if not os.path.exists(self.filepath):
+            return 0
+        with open(self.filepath, "rb") as f:
+            return sum(1 for _line in f)
+
+    def _compact(self):
+        """
+        Atomically rewrites the file with only the last roll of each user, if it
+        still holds `compaction_ratio` times more lines than users
+        Must be called while holding the file lock
+        """
+        last_rolls = {}
+        if os.path.exists(self.filepath):
+            with open(self.filepath, "rb") as f:
+                for user_id, instructions in _read_entries(f):
+                    last_rolls[user_id] = instructions
+        self._user_count = len(last_rolls)
+        if self._line_count <= self.compaction_ratio * self._user_count:
+            return
+        folder, filename = os.path.split(self.filepath)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=folder, prefix=f".{filename}.", suffix=".tmp"
+        )
+        with os.fdopen(fd, "w") as f:
+            for user_id, instructions in last_rolls.items():
+                f.write(json.dumps([user_id, list(instructions)]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.filepath)
+        self._line_count = len(last_rolls)
+        self.compactions += 1
+        logging.info(f"Compacted the roll history to {self._line_count} lines")
+
+
+# --------------------------------------------------------------------------------
+# > Global store
+# --------------------------------------------------------------------------------
+_roll_history = None
+
+
+def get_roll_history():
+    """
+    :return: The process-wide store, created on first use from the env variables
+    :rtype: RollHistory
+    """
+    global _roll_history
+    if _roll_history is None:
+        _roll_history = RollHistory(
+            max_size=int(os.getenv("ROLL_HISTORY_MAX_SIZE", 10000)),
+            ttl=float(os.getenv("ROLL_HISTORY_TTL", 86400)),
+        )
+    return _roll_history
+
+
+_roll_history_log = None
+
+
+def init_roll_history_log(filepath):
+    """
+    Enables the persistence of the last rolls. The file is not read until needed.
+    :param str filepath: Path to the log file
+    """
+    global _roll_history_log
+    close_roll_history_log()
+    _roll_history_log = RollHistoryLog(
+        filepath,
+        flush_interval=float(os.getenv("ROLL_HISTORY_FLUSH_INTERVAL", 5)),
+        compaction_ratio=float(os.getenv("ROLL_HISTORY_COMPACTION_RATIO", 2)),
+    )
+
+
+def close_roll_history_log():
+    """Writes the buffered rolls to the log file, if persistence is enabled"""
+    global _roll_history_log
+    if _roll_history_log is not None:
+        _roll_history_log.close()
+        _roll_history_log = None
+
+
+def get_last_roll(user_id):
+    """
+    Memory-only lookup, safe to call from the event loop
+    :param str user_id: The discord user id as string
+    :return: The instructions and settings of the last valid roll of the user, if any
+    :rtype: LastRoll or None
+    """
+    return get_roll_history().get(user_id)
+
+
+def load_last_roll(user_id, settings):
+    """
+    Same as `get_last_roll` but falls back to the log file, which is blocking I/O
+    Rolls restored from the file did not keep their settings and use the given ones
+    :param str user_id: The discord user id as string
+    :param dict settings: The current settings of the user
+    :return: The instructions and settings of the last valid roll of the user, if any
+    :rtype: LastRoll or None
+    """
+    roll_history = get_roll_history()
+    is_known, last_roll = roll_history.lookup(user_id)
+    if is_known or _roll_history_log is None:
+        return last_roll
+    instructions = _roll_history_log.get(user_id)
+    if instructions is None:
+        roll_history.set_missing(user_id)
+        return None
+    roll_history.set(user_id, instructions, settings)
+    return roll_history.get(user_id)
+
+
+def set_last_roll(user_id, dice_roll):
+    """
+    Stores a compact version of the last valid DiceRoll of the user
+    :param str user_id: The discord user id as string
+    :param DiceRoll dice_roll: The roll to remember
+    """
+    get_roll_history().set(user_id, dice_roll.instructions, dice_roll.settings)
+    if _roll_history_log is not None:
+        _roll_history_log.append(user_id, dice_roll.instructions)
+
+
+def get_roll_history_stats():
+    """
+    :return: The size and counters of the store and of the log file
+    :rtype: dict
+    """
+    stats = get_roll_history().stats
+    if _roll_history_log is not None:
+        stats["log"] = _roll_history_log.stats
+    return stats
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _read_entries(f, size=None, prefix=b""):
+    """
+    :param BufferedReader f: The log file, opened in binary mode
+    :param int size: Only read the first `size` bytes (None for the whole file)
+    :param bytes prefix: Only parse the lines starting with it
+    :return: The user id and instructions of each valid line, in order
+    :rtype: generator of (str, (str))
+    """
+    position = 0
+    for line in f:
+        position += len(line)
+        if size is not None and position > size:
+            break
+        if not line.startswith(prefix):
+            continue
+        try:
+            user_id, instructions = json.loads(line)
+        except ValueError:
+            continue  # Partially written line after a crash
+        yield user_id, tuple(instructions)
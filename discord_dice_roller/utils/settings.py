@@ -1,9 +1,13 @@
 """Utilities for our files and folders"""
 
 # Built-in
-import json
 import os
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+
+# Local
+from .json_storage import SETTINGS_CACHE, JSONStorage, ShardedJSONStorage
+from .roll_history import get_last_roll, init_roll_history_log, load_last_roll
+from .sqlite_storage import SQLiteStorage
 
 # --------------------------------------------------------------------------------
 # > Global
@@ -12,49 +16,145 @@ dir_name = os.path.dirname(os.path.abspath(__file__))
 SETTINGS_FOLDER = os.path.join(dir_name, "../../settings")
 
 
+SQLITE_FILEPATH = os.path.join(SETTINGS_FOLDER, "settings.sqlite3")
+ROLL_HISTORY_FILEPATH = os.path.join(SETTINGS_FOLDER, "roll_history.jsonl")
+SETTINGS_BACKENDS = ["json", "sharded", "sqlite"]
+DEFAULT_SHARD_COUNT = 4096
+_storage = None
+
+
 def init_settings_files():
-    """If missing, creates the settings folder and the empty JSON files"""
+    """
+    If missing, creates the settings folder and the storage of the backend
+    The backend is chosen through the SETTINGS_BACKEND env variable (json, sharded, or sqlite)
+    """
     if not os.path.exists(SETTINGS_FOLDER):
         os.makedirs(SETTINGS_FOLDER)
-    for path in [
-        GUILD_SETTINGS_FILEPATH,
-        USER_SHORTCUTS_FILEPATH,
-        USER_SETTINGS_FILEPATH,
-    ]:
-        if os.path.exists(path):
-            continue
-        with open(path, "w") as f:
-            json.dump({}, f)
+    backend = os.getenv("SETTINGS_BACKEND", "json")
+    if backend not in SETTINGS_BACKENDS:
+        raise ValueError(
+            f"SETTINGS_BACKEND must be one of {SETTINGS_BACKENDS} (got '{backend}')"
+        )
+    flush_options = {
+        "flush_interval": float(os.getenv("SETTINGS_FLUSH_INTERVAL", 1)),
+        "flush_threshold": int(os.getenv("SETTINGS_FLUSH_THRESHOLD", 100)),
+    }
+    if backend == "sqlite":
+        storage = SQLiteStorage(SQLITE_FILEPATH)
+    elif backend == "sharded":
+        shard_count = int(os.getenv("SETTINGS_SHARDS", DEFAULT_SHARD_COUNT))
+        storage = ShardedJSONStorage(shard_count, **flush_options)
+    else:
+        storage = JSONStorage(**flush_options)
+    storage.init_files(SETTINGS_FILEPATHS)
+    set_storage(storage)
+    init_roll_history_log(ROLL_HISTORY_FILEPATH)
+
+
+def get_storage():
+    """
+    :return: The active storage backend (defaults to the JSON one)
+    :rtype: JSONStorage or ShardedJSONStorage or SQLiteStorage
+    """
+    global _storage
+    if _storage is None:
+        _storage = JSONStorage()
+    return _storage
+
+
+def set_storage(storage):
+    """
+    Replaces the active storage backend, closing the previous one
+    :param storage: A JSONStorage, ShardedJSONStorage, or SQLiteStorage instance
+    """
+    global _storage
+    if _storage is not None and _storage is not storage:
+        _storage.close()
+    _storage = storage
+
+
+def close_storage():
+    """Flushes the pending writes and closes the active storage backend"""
+    global _storage
+    if _storage is not None:
+        _storage.close()
+        _storage = None
 
 
 def get_key(filepath, key, default=None):
     """
-    Opens the file and fetches the value at said key
+    Fetches the value at said key from the active storage
+    The returned value is a copy and can be safely mutated by the caller
     :param str filepath: The path to the file
     :param str key: The key to fetch
     :param default: The value to return if no key is found
     :return: The value at the key (or the default value)
     """
-    with open(filepath, "r") as f:
-        file_content = json.load(f)
-    return file_content.get(key, default)
+    return get_storage().get(filepath, key, default)
 
 
 def update_key(filepath, key, value):
     """
-    Updates the key in a given JSON file. Dict values are sorted alphabetically.
+    Updates the key in the active storage. Dict values are sorted alphabetically.
     :param str filepath: The path to the file
     :param str key: The key to update
     :param value: The value for said key
     """
-    with open(filepath, "r") as f:
-        file_content = json.load(f)
-    if type(value) == dict:
-        file_content[key] = OrderedDict(sorted(value.items(), key=lambda t: t[0]))
-    else:
-        file_content[key] = value
-    with open(filepath, "w") as f:
-        json.dump(file_content, f, indent=2)
+    get_storage().update(filepath, key, _sort_dict(value))
+
+
+def get_keys(requests):
+    """
+    Fetches several keys from the active storage in a single round trip
+    :param requests: List of (filepath, key, default) tuples
+    :return: The value of each request, in the same order
+    :rtype: list
+    """
+    return get_storage().get_many(requests)
+
+
+def modify_key(filepath, key, modifier, default=None):
+    """
+    Reads the value at said key, lets the modifier compute the new one, then saves it
+    The modifier receives a copy of the value and returns a (new_value, result) tuple
+    If `new_value` is None, nothing is saved
+    With SQLite, both happen in one transaction, as other clusters may share the file
+    :param str filepath: The path to the file
+    :param str key: The key to modify
+    :param callable modifier: The function computing the new value
+    :param default: The value to give the modifier if no key is found
+    :return: The result returned by the modifier
+    """
+    storage = get_storage()
+    if isinstance(storage, SQLiteStorage):
+
+        def sorted_modifier(value):
+            new_value, result = modifier(value)
+            return _sort_dict(new_value), result
+
+        return storage.modify(filepath, key, sorted_modifier, default)
+    value = get_key(filepath, key, default)
+    new_value, result = modifier(value)
+    if new_value is not None:
+        update_key(filepath, key, new_value)
+    return result
+
+
+def get_cache_stats():
+    """
+    :return: The hit/miss counters of the settings cache
+    :rtype: dict
+    """
+    return SETTINGS_CACHE.stats
+
+
+def get_flush_stats():
+    """
+    :return: The write-behind counters of the JSON storages (empty for other backends)
+    :rtype: dict
+    """
+    storage = get_storage()
+    return storage.flush_stats if isinstance(storage, JSONStorage) else {}
 
 
 # --------------------------------------------------------------------------------
@@ -82,11 +182,21 @@ def update_user_shortcuts(user_id, user_data):
     update_key(USER_SHORTCUTS_FILEPATH, user_id, user_data)
 
 
+def modify_user_shortcuts(user_id, modifier):
+    """
+    Reads, modifies, and saves the user's shortcuts (see `modify_key`)
+    :param str user_id: The discord user id
+    :param callable modifier: Receives the shortcuts, returns (new_shortcuts, result)
+    :return: The result returned by the modifier
+    """
+    return modify_key(USER_SHORTCUTS_FILEPATH, user_id, modifier, {})
+
+
 # --------------------------------------------------------------------------------
 # > User settings
 # --------------------------------------------------------------------------------
 USER_SETTINGS_FILEPATH = os.path.join(SETTINGS_FOLDER, "user_settings.json")
-DEFAULT_USER_SETTINGS = {"verbose": True}
+DEFAULT_USER_SETTINGS = {"verbose": True, "fair": False}
 
 
 def get_user_settings(user_id):
@@ -108,24 +218,120 @@ def update_user_settings(user_id, user_data):
     update_key(USER_SETTINGS_FILEPATH, user_id, user_data)
 
 
+def modify_user_settings(user_id, modifier):
+    """
+    Reads, modifies, and saves the user's settings (see `modify_key`)
+    :param str user_id: The discord user id
+    :param callable modifier: Receives the settings, returns (new_settings, result)
+    :return: The result returned by the modifier
+    """
+    return modify_key(USER_SETTINGS_FILEPATH, user_id, modifier, {})
+
+
+# --------------------------------------------------------------------------------
+# > User profile
+# --------------------------------------------------------------------------------
+UserProfile = namedtuple("UserProfile", ["settings", "shortcuts", "last_roll"])
+
+
+def get_user_profile(user_id, load_history=False):
+    """
+    Gets the user's settings and shortcuts in a single storage round trip,
+    along with the user's last valid roll
+    :param str user_id: The discord user id as string
+    :param bool load_history: Whether to look for the last roll in the persisted history
+    :return: The user's profile
+    :rtype: UserProfile
+    """
+    user_settings, user_shortcuts = get_keys(
+        [
+            (USER_SETTINGS_FILEPATH, user_id, {}),
+            (USER_SHORTCUTS_FILEPATH, user_id, {}),
+        ]
+    )
+    if load_history:
+        last_roll = load_last_roll(user_id, user_settings)
+    else:
+        last_roll = get_last_roll(user_id)
+    return UserProfile(user_settings, user_shortcuts, last_roll)
+
+
 # --------------------------------------------------------------------------------
 # > Guild settings
 # --------------------------------------------------------------------------------
 GUILD_SETTINGS_FILEPATH = os.path.join(SETTINGS_FOLDER, "guild_settings.json")
-DEFAULT_GUILD_SETTINGS = {"prefix": "!"}
+# Rate limits are in points per minute, 0 disables them (see `utils.rate_limit`)
+DEFAULT_GUILD_SETTINGS = {"prefix": "!", "user_rate_limit": 20, "guild_rate_limit": 200}
+RATE_LIMIT_SETTINGS = ["user_rate_limit", "guild_rate_limit"]
+
+
+_guild_prefixes = {}
+_guild_rate_limits = {}
 
 
 def get_command_prefix(_bot, message):
     """
     Gets the command prefix based on the guild sending the message
+    Reads from the in-memory prefix index, so no I/O is done per message
     :param Bot _bot: Our bot instance
     :param Message message: Discord message
-    :return: The prefix for the current guild
+    :return: The prefix for the current guild (or the default one for DMs)
     :rtype: str
     """
-    guild_id = str(message.guild.id)
-    guild_settings = get_guild_settings(guild_id)
-    return guild_settings.get("prefix", DEFAULT_GUILD_SETTINGS["prefix"])
+    guild = message.guild
+    if guild is None:
+        return DEFAULT_GUILD_SETTINGS["prefix"]
+    return _guild_prefixes.get(guild.id, DEFAULT_GUILD_SETTINGS["prefix"])
+
+
+def build_guild_settings_index():
+    """Loads the prefix and rate limits of every guild from the storage into the in-memory indexes"""
+    _guild_prefixes.clear()
+    _guild_rate_limits.clear()
+    for guild_id, guild_settings in get_storage().items(GUILD_SETTINGS_FILEPATH):
+        set_guild_prefix(guild_id, guild_settings.get("prefix"))
+        set_guild_rate_limits(guild_id, guild_settings)
+
+
+def set_guild_prefix(guild_id, prefix):
+    """
+    Updates the in-memory prefix index for a single guild
+    :param str guild_id: The discord guild/server id
+    :param str prefix: The new prefix (None to fallback to the default one)
+    """
+    if prefix is None or prefix == DEFAULT_GUILD_SETTINGS["prefix"]:
+        _guild_prefixes.pop(int(guild_id), None)
+    else:
+        _guild_prefixes[int(guild_id)] = prefix
+
+
+def get_guild_rate_limits(guild_id):
+    """
+    Reads from the in-memory index, so no I/O is done per command
+    :param int guild_id: The discord guild/server id (None for DMs)
+    :return: The user and guild rate limits, in points per minute
+    :rtype: dict
+    """
+    rate_limits = _guild_rate_limits.get(guild_id)
+    if rate_limits is None:
+        return {name: DEFAULT_GUILD_SETTINGS[name] for name in RATE_LIMIT_SETTINGS}
+    return rate_limits
+
+
+def set_guild_rate_limits(guild_id, guild_data):
+    """
+    Updates the in-memory rate limit index for a single guild
+    :param str guild_id: The discord guild/server id
+    :param dict guild_data: The guild's settings, which may have custom rate limits
+    """
+    rate_limits = {
+        name: guild_data.get(name, DEFAULT_GUILD_SETTINGS[name])
+        for name in RATE_LIMIT_SETTINGS
+    }
+    if all(rate_limits[name] == DEFAULT_GUILD_SETTINGS[name] for name in rate_limits):
+        _guild_rate_limits.pop(int(guild_id), None)
+    else:
+        _guild_rate_limits[int(guild_id)] = rate_limits
 
 
 def get_guild_settings(guild_id):
@@ -141,7 +347,52 @@ def get_guild_settings(guild_id):
 def update_guild_settings(guild_id, guild_data):
     """
     Updates the JSON file with the new guild's settings (sorted alphabetically)
+    Also keeps the in-memory prefix and rate limit indexes up to date
     :param str guild_id: The discord guild/server id
     :param dict guild_data: The new shortcuts for the user
     """
     update_key(GUILD_SETTINGS_FILEPATH, guild_id, guild_data)
+    set_guild_prefix(guild_id, guild_data.get("prefix"))
+    set_guild_rate_limits(guild_id, guild_data)
+
+
+def modify_guild_settings(guild_id, modifier):
+    """
+    Reads, modifies, and saves the guild's settings (see `modify_key`)
+    Also keeps the in-memory prefix and rate limit indexes up to date
+    :param str guild_id: The discord guild/server id
+    :param callable modifier: Receives the settings, returns (new_settings, result)
+    :return: The result returned by the modifier
+    """
+
+    def indexed_modifier(guild_data):
+        new_guild_data, result = modifier(guild_data)
+        return new_guild_data, (new_guild_data, result)
+
+    new_guild_data, result = modify_key(
+        GUILD_SETTINGS_FILEPATH, guild_id, indexed_modifier, {}
+    )
+    if new_guild_data is not None:
+        set_guild_prefix(guild_id, new_guild_data.get("prefix"))
+        set_guild_rate_limits(guild_id, new_guild_data)
+    return result
+
+
+SETTINGS_FILEPATHS = [
+    GUILD_SETTINGS_FILEPATH,
+    USER_SHORTCUTS_FILEPATH,
+    USER_SETTINGS_FILEPATH,
+]
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _sort_dict(value):
+    """
+    :param value: The value to save
+    :return: The value, with its keys sorted alphabetically if it is a dict
+    """
+    if type(value) == dict:
+        return OrderedDict(sorted(value.items(), key=lambda t: t[0]))
+    return value
@@ -0,0 +1,60 @@
+"""
+Utilities for the user shortcuts
+A shortcut is saved as {"instructions": "1d20 adv", "plan": [tokens], "engine": 2}
+so that `use` can skip the parsing and validation.
+Older shortcuts are plain instruction strings.
+"""
+
+# Local
+from .dice_roll import ENGINE_VERSION, DiceRoll, RollPlan
+
+
+# --------------------------------------------------------------------------------
+# > Utilities
+# --------------------------------------------------------------------------------
+def create_shortcut(dice_roll):
+    """
+    Creates the shortcut data from a valid DiceRoll
+    :param DiceRoll dice_roll: The validated roll
+    :return: The instructions along with their compiled plan
+    :rtype: dict
+    """
+    return {
+        "instructions": " ".join(dice_roll.instructions),
+        "plan": [list(token) for token in dice_roll.plan.tokens],
+        "engine": ENGINE_VERSION,
+    }
+
+
+def get_shortcut_text(shortcut):
+    """
+    :param shortcut: The saved shortcut (dict or legacy string)
+    :return: The instructions of the shortcut, as typed by the user
+    :rtype: str
+    """
+    if isinstance(shortcut, dict):
+        return shortcut["instructions"]
+    return shortcut
+
+
+def create_shortcut_dice_roll(shortcut, args, settings):
+    """
+    Creates the DiceRoll of a shortcut with additional instructions
+    Without additional instructions, an up-to-date plan is used as is, since it was
+    validated when saved. Otherwise, the plan comes from the cache.
+    :param shortcut: The saved shortcut (dict or legacy string)
+    :param [str] args: The additional instructions
+    :param dict settings: The settings to use in the roll
+    :return: The DiceRoll, ready to be rolled
+    :rtype: DiceRoll
+    """
+    instructions = get_shortcut_text(shortcut).split(" ") + list(args)
+    is_up_to_date = (
+        isinstance(shortcut, dict) and shortcut.get("engine") == ENGINE_VERSION
+    )
+    if len(args) > 0 or not is_up_to_date:
+        # Parsed through the roll plan cache
+        return DiceRoll(instructions, settings)
+    tokens = tuple(tuple(token) for token in shortcut["plan"])
+    plan = RollPlan(tuple(instructions), tokens, ())
+    return DiceRoll(instructions, settings, plan)
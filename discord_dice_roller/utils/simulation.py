@@ -0,0 +1,286 @@
+"""
+Monte Carlo simulation of roll instructions, spread over a pool of worker processes
+Workers only receive the plan tokens, and send back the number of occurrences of each total
+"""
+
+# Built-in
+import asyncio
+import math
+import os
+import random
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    # Third-party
+    import numpy
+except ImportError:
+    numpy = None
+
+# Local
+from .probability import (
+    COMPARATORS,
+    get_keep_drop_selection,
+    get_percentiles,
+    split_tokens,
+)
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+# Max number of dice rolled by a single batch, to bound the memory of the workers
+BATCH_DICE = 1000000
+# Max number of dice rolled between 2 checks of the deadline, to bound the overrun
+CHUNK_DICE = 100000
+HISTOGRAM_BINS = 10
+HISTOGRAM_BAR_WIDTH = 20
+
+Simulation = namedtuple(
+    "Simulation", ["count", "requested", "occurrences", "successes", "timed_out"]
+)
+
+# --------------------------------------------------------------------------------
+# > Limits
+# --------------------------------------------------------------------------------
+_limits = None
+
+
+def get_simulation_limits():
+    """
+    :return: The worker processes, the max rolls and dice per request, and the time budget
+    :rtype: dict
+    """
+    global _limits
+    if _limits is None:
+        _limits = {
+            "processes": int(os.getenv("SIMULATION_PROCESSES") or os.cpu_count() or 1),
+            "max_count": int(os.getenv("SIMULATION_MAX_COUNT", 1000000)),
+            "max_dice": int(os.getenv("SIMULATION_MAX_DICE", 100000000)),
+            "timeout": float(os.getenv("SIMULATION_TIMEOUT", 10)),
+        }
+    return _limits
+
+
+# --------------------------------------------------------------------------------
+# > Process pool
+# --------------------------------------------------------------------------------
+_process_pool = None
+
+
+def get_process_pool():
+    """
+    :return: The pool of worker processes, created on first use from the env variables
+    :rtype: ProcessPoolExecutor
+    """
+    global _process_pool
+    if _process_pool is None:
+        processes = get_simulation_limits()["processes"]
+        _process_pool = ProcessPoolExecutor(max_workers=processes)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    """Stops the worker processes, cancelling the batches that have not started"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True)
+        _process_pool = None
+
+
+# --------------------------------------------------------------------------------
+# > Simulation
+# --------------------------------------------------------------------------------
+def get_dice_count(plan):
+    """
+    :param RollPlan plan: A valid roll plan
+    :return: The number of dice rolled by the plan (rerolls excluded)
+    :rtype: int
+    """
+    return sum(token[1] for token in plan.tokens if token[0] == "dice")
+
+
+def simulate_batch(tokens, count, deadline=None):
+    """
+    Rolls the instructions `count` times, by chunks. Runs in a worker process.
+    Stops early once the deadline is passed, so that timed out batches free the worker.
+    :param [tuple] tokens: The tokens of a valid plan
+    :param int count: Number of rolls
+    :param float deadline: The `time.time()` after which no chunk is started, if any
+    :return: The occurrences of each final total, and the number of successful checks
+    :rtype: dict, int
+    """
+    groups, action, modifier, check = split_tokens(tokens)
+    dice_count = sum(qty for qty, _sides in groups)
+    chunk_size = max(1, CHUNK_DICE // dice_count)
+    occurrences = Counter()
+    for start in range(0, count, chunk_size):
+        if deadline is not None and time.time() > deadline:
+            break
+        chunk_count = min(chunk_size, count - start)
+        if numpy is not None:
+            totals = _simulate_totals_with_numpy(groups, action, chunk_count)
+            values, chunk_occurrences = numpy.unique(totals, return_counts=True)
+            occurrences.update(dict(zip(values.tolist(), chunk_occurrences.tolist())))
+        else:
+            occurrences.update(_simulate_totals(groups, action, chunk_count))
+    if modifier is not None:
+        occurrences = {v + modifier: n for v, n in occurrences.items()}
+    successes = 0
+    if check is not None:
+        comparator, target = check
+        compare = COMPARATORS[comparator]
+        successes = sum(n for v, n in occurrences.items() if compare(v, target))
+    return dict(occurrences), successes
+
+
+async def simulate(plan, count):
+    """
+    Splits the rolls into batches and runs them in the process pool
+    Batches stop rolling once the time budget is exceeded, late ones are discarded
+    If a worker died, the pool is replaced for the next call and BrokenProcessPool raised
+    :param RollPlan plan: A valid roll plan
+    :param int count: Number of rolls
+    :return: The aggregated results of the finished batches (successes are None without check)
+    :rtype: Simulation
+    """
+    pool = get_process_pool()
+    limits = get_simulation_limits()
+    dice_count = get_dice_count(plan)
+    batch_size = math.ceil(count / limits["processes"])
+    batch_size = max(1, min(BATCH_DICE // dice_count, batch_size))
+    deadline = time.time() + limits["timeout"]
+    loop = asyncio.get_event_loop()
+    try:
+        futures = [
+            loop.run_in_executor(
+                pool,
+                simulate_batch,
+                plan.tokens,
+                min(batch_size, count - start),
+                deadline,
+            )
+            for start in range(0, count, batch_size)
+        ]
+        done, pending = await asyncio.wait(futures, timeout=limits["timeout"])
+        for future in pending:
+            future.cancel()
+        results = [future.result() for future in done]
+    except BrokenProcessPool:
+        # A killed worker breaks the whole pool, which then refuses every batch
+        _discard_process_pool(pool)
+        raise
+    occurrences = Counter()
+    successes = 0
+    for batch_occurrences, batch_successes in results:
+        occurrences.update(batch_occurrences)
+        successes += batch_successes
+    if not any(token[0] == "check" for token in plan.tokens):
+        successes = None
+    simulated_count = sum(occurrences.values())
+    # Finished batches may also have stopped at the deadline
+    timed_out = len(pending) > 0 or simulated_count < count
+    return Simulation(simulated_count, count, occurrences, successes, timed_out)
+
+
+def summarize(simulation):
+    """
+    :param Simulation simulation: The results of a simulation
+    :return: The mean, the percentiles, and a histogram with HISTOGRAM_BINS lines
+    :rtype: float, dict, [str]
+    """
+    values = sorted(simulation.occurrences)
+    occurrences = [simulation.occurrences[v] for v in values]
+    mean = sum(v * n for v, n in zip(values, occurrences)) / simulation.count
+    percentiles = get_percentiles(values, occurrences)
+    lowest, highest = values[0], values[-1]
+    bin_width = math.ceil((highest - lowest + 1) / HISTOGRAM_BINS)
+    bins = Counter()
+    for value, n in zip(values, occurrences):
+        bins[(value - lowest) // bin_width] += n
+    max_bin = max(bins.values())
+    lines = []
+    for index in range(max(bins) + 1):
+        start = lowest + index * bin_width
+        end = min(start + bin_width - 1, highest)
+        label = f"{start}" if start == end else f"{start}-{end}"
+        ratio = bins[index] / simulation.count
+        bar = "#" * round(HISTOGRAM_BAR_WIDTH * bins[index] / max_bin)
+        lines.append(f"{label:>13} {bar:<{HISTOGRAM_BAR_WIDTH}} {ratio:.1%}")
+    return mean, percentiles, lines
+
+
+# --------------------------------------------------------------------------------
+# > Helpers
+# --------------------------------------------------------------------------------
+def _discard_process_pool(pool):
+    """
+    Forgets a pool whose worker died, so that the next simulation creates a new one
+    :param ProcessPoolExecutor pool: The broken pool
+    """
+    global _process_pool
+    if _process_pool is pool:
+        _process_pool = None
+    pool.shutdown(wait=False)
+
+
+def _simulate_totals_with_numpy(groups, action, count):
+    """
+    Vectorized rolls: each group is a (count, qty) matrix of dice
+    A new generator is seeded from the OS for each batch, so that forked workers differ.
+    :param [(int, int)] groups: The (qty, sides) of each dice group
+    :param tuple action: The (name, value) of the action, if any
+    :param int count: Number of rolls
+    :return: The total of each roll, before the modifier
+    :rtype: numpy.ndarray
+    """
+    generator = numpy.random.default_rng()
+    name, amount = action if action is not None else (None, 0)
+    if name in {"adv", "dis"}:
+        sides = groups[0][1]
+        rolls = generator.integers(1, sides + 1, size=(count, 2))
+        return rolls.max(axis=1) if name == "adv" else rolls.min(axis=1)
+    if name in {"kh", "kl", "dh", "dl"}:
+        qty = sum(qty for qty, _sides in groups)
+        sides = groups[0][1]
+        highest, kept = get_keep_drop_selection(name, qty, amount)
+        rolls = numpy.sort(generator.integers(1, sides + 1, size=(count, qty)), axis=1)
+        kept_rolls = rolls[:, qty - kept :] if highest else rolls[:, :kept]
+        return kept_rolls.sum(axis=1)
+    totals = numpy.zeros(count, dtype=numpy.int64)
+    for qty, sides in groups:
+        totals += generator.integers(1, sides + 1, size=(count, qty)).sum(axis=1)
+    if name == "crit":
+        totals *= 2
+    return totals
+
+
+def _simulate_totals(groups, action, count):
+    """
+    Same as `_simulate_totals_with_numpy` but one roll at a time, with the `random` module
+    :param [(int, int)] groups: The (qty, sides) of each dice group
+    :param tuple action: The (name, value) of the action, if any
+    :param int count: Number of rolls
+    :return: The total of each roll, before the modifier
+    :rtype: [int]
+    """
+    generator = random.Random()
+    name, amount = action if action is not None else (None, 0)
+    faces = [range(1, sides + 1) for _qty, sides in groups]
+    totals = []
+    for _ in range(count):
+        if name in {"adv", "dis"}:
+            rolls = generator.choices(faces[0], k=2)
+            totals.append(max(rolls) if name == "adv" else min(rolls))
+            continue
+        rolls = []
+        for (qty, _sides), group_faces in zip(groups, faces):
+            rolls.extend(generator.choices(group_faces, k=qty))
+        if name in {"kh", "kl", "dh", "dl"}:
+            highest, kept = get_keep_drop_selection(name, len(rolls), amount)
+            rolls.sort()
+            rolls = rolls[len(rolls) - kept :] if highest else rolls[:kept]
+        total = sum(rolls)
+        totals.append(total * 2 if name == "crit" else total)
+    return totals
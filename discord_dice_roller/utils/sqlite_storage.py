@@ -0,0 +1,222 @@
+"""SQLite storage backend for our settings"""
+
+# Built-in
+import json
+import os
+import re
+import sqlite3
+import threading
+
+# --------------------------------------------------------------------------------
+# > Constants
+# --------------------------------------------------------------------------------
+NAMESPACE_REGEX = re.compile(r"[a-z_]+")
+# Seconds to wait for the write lock, which the other clusters of the bot may hold
+LOCK_TIMEOUT = 30
+
+
+# --------------------------------------------------------------------------------
+# > Storage
+# --------------------------------------------------------------------------------
+class SQLiteStorage:
+    """
+    Stores each settings file as its own table, with one row per user/guild
+    Rows are indexed by their primary key so an update only touches a single entity
+    """
+
+    def __init__(self, path):
+        """
+        Opens the database in WAL mode
+        :param str path: Path to the SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._tables = set()
+        self.connection = sqlite3.connect(
+            path, timeout=LOCK_TIMEOUT, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+    def init_files(self, filepaths):
+        """
+        Creates the missing tables
+        :param [str] filepaths: The paths of the settings files
+        """
+        for filepath in filepaths:
+            self._ensure_table(filepath)
+
+    def get(self, filepath, key, default=None):
+        """
+        :param str filepath: The path to the settings file (used as table name)
+        :param str key: The user/guild id to fetch
+        :param default: The value to return if no row is found
+        :return: The value of the row (or the default value)
+        """
+        table = self._ensure_table(filepath)
+        with self._lock:
+            row = self.connection.execute(
+                f"SELECT data FROM {table} WHERE id = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def get_many(self, requests):
+        """
+        Fetches several rows, possibly from different tables, with a single query
+        :param requests: List of (filepath, key, default) tuples
+        :return: The value of each request, in the same order
+        :rtype: list
+        """
+        selects = []
+        params = []
+        for index, (filepath, key, _default) in enumerate(requests):
+            table = self._ensure_table(filepath)
+            selects.append(f"SELECT {index}, data FROM {table} WHERE id = ?")
+            params.append(key)
+        with self._lock:
+            rows = self.connection.execute(" UNION ALL ".join(selects), params)
+            found = {index: data for index, data in rows.fetchall()}
+        return [
+            json.loads(found[index]) if index in found else default
+            for index, (_filepath, _key, default) in enumerate(requests)
+        ]
+
+    def update(self, filepath, key, value):
+        """
+        Inserts or replaces the row of a single user/guild
+        :param str filepath: The path to the settings file (used as table name)
+        :param str key: The user/guild id to update
+        :param value: The value for said key
+        """
+        self.update_many(filepath, [(key, value)])
+
+    def update_many(self, filepath, items):
+        """
+        Inserts or replaces several rows within a single transaction
+        :param str filepath: The path to the settings file (used as table name)
+        :param items: Iterable of (key, value) tuples
+        """
+        table = self._ensure_table(filepath)
+        rows = ((key, json.dumps(value)) for key, value in items)
+        with self._lock:
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)", rows
+                )
+
+    def modify(self, filepath, key, modifier, default=None):
+        """
+        Reads the row, lets the modifier compute the new value, then saves it
+        Both happen in a single write transaction, so that the other processes sharing
+        the database cannot update the row in between
+        :param str filepath: The path to the settings file (used as table name)
+        :param str key: The user/guild id to modify
+        :param callable modifier: Receives the value, returns a (new_value, result)
+            tuple. If `new_value` is None, nothing is saved.
+        :param default: The value to give the modifier if no row is found
+        :return: The result returned by the modifier
+        """
+        table = self._ensure_table(filepath)
+        with self._lock:
+            with self.connection:
+                # Takes the write lock before reading, instead of when first writing
+                self.connection.execute("BEGIN IMMEDIATE")
+                row = self.connection.execute(
+                    f"SELECT data FROM {table} WHERE id = ?", (key,)
+                ).fetchone()
+                value = default if row is None else json.loads(row[0])
+                new_value, result = modifier(value)
+                if new_value is not None:
+                    self.connection.execute(
+                        f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)",
+                        (key, json.dumps(new_value)),
+                    )
+        return result
+
+    def items(self, filepath):
+        """
+        :param str filepath: The path to the settings file (used as table name)
+        :return: Every (key, value) pair of the table
+        :rtype: [(str, object)]
+        """
+        table = self._ensure_table(filepath)
+        with self._lock:
+            rows = self.connection.execute(f"SELECT id, data FROM {table}").fetchall()
+        return [(key, json.loads(data)) for key, data in rows]
+
+    def count(self, filepath):
+        """
+        :param str filepath: The path to the settings file (used as table name)
+        :return: The number of rows in the table
+        :rtype: int
+        """
+        table = self._ensure_table(filepath)
+        with self._lock:
+            row = self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        return row[0]
+
+    def close(self):
+        """Closes the connection to the database"""
+        with self._lock:
+            self.connection.close()
+
+    # ----------------------------------------
+    # Helpers
+    # ----------------------------------------
+    def _ensure_table(self, filepath):
+        """
+        Creates the table matching the settings file if it does not exist yet
+        :param str filepath: The path to the settings file
+        :return: The name of the table
+        :rtype: str
+        """
+        table = get_namespace(filepath)
+        if table in self._tables:
+            return table
+        with self._lock:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(id TEXT PRIMARY KEY, data TEXT NOT NULL) WITHOUT ROWID"
+            )
+            self._tables.add(table)
+        return table
+
+
+# --------------------------------------------------------------------------------
+# > Utilities
+# --------------------------------------------------------------------------------
+def get_namespace(filepath):
+    """
+    Converts the path of a settings file into a safe namespace name
+    :param str filepath: The path to the settings file, like ".../user_settings.json"
+    :return: The namespace, like "user_settings"
+    :rtype: str
+    """
+    namespace = os.path.splitext(os.path.basename(filepath))[0]
+    if NAMESPACE_REGEX.fullmatch(namespace) is None:
+        raise ValueError(f"Invalid settings namespace: '{namespace}'")
+    return namespace
+
+
+def import_json_files(storage, filepaths):
+    """
+    One-shot import of existing JSON settings files into the SQLite storage
+    Existing rows with the same keys are replaced
+    :param SQLiteStorage storage: The target storage
+    :param [str] filepaths: The JSON files to import
+    :return: The number of imported entries per file
+    :rtype: dict
+    """
+    imported = {}
+    for filepath in filepaths:
+        if not os.path.exists(filepath):
+            imported[filepath] = 0
+            continue
+        with open(filepath, "r") as f:
+            file_content = json.load(f)
+        storage.update_many(filepath, file_content.items())
+        imported[filepath] = len(file_content)
+    return imported